@@ -0,0 +1,176 @@
+"""Columnar mirror of every session for cohort analytics.
+
+``Cohort`` keeps one NumPy array per numeric ``SessionState`` field and a
+packed bit matrix per bitset field (completed quests, selected and
+completed goals), one row per session. A committed change rewrites only
+that session's row, so histograms, percentiles and completion counts are
+vectorized reductions over the columns instead of a loop over sessions.
+Bit ``i`` of a row's bitset is bit ``i`` of the session's mask, i.e. the
+``i``-th id of the ``StateLayout`` list.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+NUMERIC_FIELDS = (
+    "level",
+    "xp",
+    "coins",
+    "daily_streak",
+    "total_quests_completed",
+    "total_xp_earned",
+    "total_coins_earned",
+)
+# Bitset field -> the StateLayout list it indexes
+BITSET_FIELDS = {
+    "completed_quests": "quest_ids",
+    "selected_goals": "goal_ids",
+    "completed_goals": "goal_ids",
+}
+PERCENTILES = (50, 90, 99)
+# Value ranges up to this size get percentiles from one bincount instead of a partial sort
+COUNTING_RANGE = 1 << 22
+# BIT_TABLE[b, i] is bit i of byte value b; a byte column's value counts times it give per-bit counts
+BIT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little").astype(np.int64)
+
+
+def percentiles(values: np.ndarray, low: int, high: int) -> List[int]:
+    """NumPy's "lower" percentiles of integer ``values`` spanning ``low..high``."""
+    if high - low >= COUNTING_RANGE:
+        return [int(point) for point in np.percentile(values, PERCENTILES, method="lower")]
+    cumulative = np.cumsum(np.bincount(values - low))
+    # The element at floor(p% of (n - 1)) in sorted order
+    positions = [int(p / 100 * (len(values) - 1)) for p in PERCENTILES]
+    return [low + int(index) for index in np.searchsorted(cumulative, positions, side="right")]
+
+
+class Cohort:
+    def __init__(self, layout, capacity: int = 1024):
+        self.layout = layout
+        self.rows: Dict[str, int] = {}
+        self.careers: List[str] = []
+        self._career_codes: Dict[str, int] = {}
+        self._widths = {
+            field: max(1, (len(getattr(layout, ids)) + 7) // 8) for field, ids in BITSET_FIELDS.items()
+        }
+        self._numeric = {field: np.zeros(capacity, dtype=np.int64) for field in NUMERIC_FIELDS}
+        self._career = np.full(capacity, -1, dtype=np.int32)
+        self._bits = {field: np.zeros((capacity, width), dtype=np.uint8) for field, width in self._widths.items()}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self.rows), "capacity": len(self._career)}
+
+    def _grow(self):
+        capacity = len(self._career) * 2
+        for field, column in self._numeric.items():
+            self._numeric[field] = np.resize(column, capacity)
+        self._career = np.concatenate([self._career, np.full(len(self._career), -1, dtype=np.int32)])
+        for field, matrix in self._bits.items():
+            grown = np.zeros((capacity, matrix.shape[1]), dtype=np.uint8)
+            grown[:len(matrix)] = matrix
+            self._bits[field] = grown
+
+    def _write(self, member: str, state):
+        row = self.rows.get(member)
+        if row is None:
+            row = self.rows[member] = len(self.rows)
+            if row == len(self._career):
+                self._grow()
+        for field in NUMERIC_FIELDS:
+            self._numeric[field][row] = getattr(state, field)
+        career = state.career_path
+        if career is None:
+            self._career[row] = -1
+        else:
+            code = self._career_codes.get(career)
+            if code is None:
+                code = self._career_codes[career] = len(self.careers)
+                self.careers.append(career)
+            self._career[row] = code
+        for field, width in self._widths.items():
+            mask = getattr(state, field) & ((1 << (width * 8)) - 1)
+            self._bits[field][row] = np.frombuffer(mask.to_bytes(width, "little"), dtype=np.uint8)
+
+    def update(self, member: str, state):
+        with self._lock:
+            self._write(member, state)
+
+    def add_stored(self, member: str, state):
+        """Add a session read from storage unless a live change already added a newer copy."""
+        with self._lock:
+            if member not in self.rows:
+                self._write(member, state)
+
+    def column(self, field: str) -> np.ndarray:
+        """A copy of the numeric column ``field`` for every session."""
+        with self._lock:
+            return self._numeric[field][:len(self.rows)].copy()
+
+    def summary(self) -> dict:
+        with self._lock:
+            count = len(self.rows)
+            fields = {}
+            for field in NUMERIC_FIELDS:
+                values = self._numeric[field][:count]
+                if count:
+                    low, high = int(values.min()), int(values.max())
+                    fields[field] = {
+                        "min": low,
+                        "max": high,
+                        "mean": round(int(values.sum()) / count, 2),
+                        **{f"p{p}": point for p, point in zip(PERCENTILES, percentiles(values, low, high))},
+                    }
+                else:
+                    fields[field] = None
+            careers = self._career[:count]
+            chosen = np.bincount(careers[careers >= 0], minlength=len(self.careers))
+            career_paths = {career: int(n) for career, n in zip(self.careers, chosen)}
+            no_career = int(count - chosen.sum())
+        return {
+            "sessions": count,
+            "fields": fields,
+            "career_paths": dict(sorted(career_paths.items(), key=lambda item: -item[1])),
+            "no_career_path": no_career,
+        }
+
+    def histogram(self, field: str, bins: int) -> dict:
+        values = self.column(field)
+        if not len(values):
+            return {"field": field, "sessions": 0, "edges": [], "counts": []}
+        low, high = int(values.min()), int(values.max())
+        # Integer-aligned bins, so that every bin covers the same whole values
+        width = max(1, -(-(high - low + 1) // bins))
+        counts = np.bincount((values - low) // width)
+        edges = range(low, low + width * (len(counts) + 1), width)
+        return {"field": field, "sessions": len(values), "edges": list(edges), "counts": counts.tolist()}
+
+    def bit_counts(self, field: str) -> np.ndarray:
+        """How many sessions have each bit of ``field`` set, indexed like the layout list."""
+        ids = getattr(self.layout, BITSET_FIELDS[field])
+        with self._lock:
+            matrix = self._bits[field][:len(self.rows)]
+            totals = np.concatenate([
+                np.bincount(matrix[:, byte], minlength=256) @ BIT_TABLE for byte in range(matrix.shape[1])
+            ])
+        return totals[:len(ids)]
+
+    def completion(self, quest_names: Optional[Dict[int, str]] = None) -> dict:
+        count = len(self)
+        rate = (lambda n: round(n / count, 4)) if count else (lambda n: 0.0)
+        quest_names = quest_names or {}
+        quests = [
+            {"id": quest_id, "name": quest_names.get(quest_id), "completed": int(n), "rate": rate(int(n))}
+            for quest_id, n in zip(self.layout.quest_ids, self.bit_counts("completed_quests"))
+        ]
+        goals = [
+            {"id": goal_id, "selected": int(selected), "completed": int(completed), "rate": rate(int(completed))}
+            for goal_id, selected, completed in zip(
+                self.layout.goal_ids, self.bit_counts("selected_goals"), self.bit_counts("completed_goals")
+            )
+        ]
+        return {"sessions": count, "quests": quests, "goals": goals}
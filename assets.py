@@ -0,0 +1,59 @@
+"""Static assets served from disk under content-hashed URLs.
+
+At startup every asset is read once, fingerprinted and pre-compressed into
+an ``EncodedPayload``. The manifest maps each logical name to its hashed
+URL (``style.css`` -> ``/static/style.3f9c2a1b7d4e.css``) and ``render``
+rewrites ``href``/``src`` references in the HTML shell to those URLs.
+
+A hashed URL never changes meaning, so assets are served ``immutable``:
+browsers keep them until a new build changes the hash in the shell.
+"""
+import mimetypes
+import os
+import re
+from typing import Dict, Iterable, Optional
+
+from responses import EncodedPayload
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASH_LENGTH = 12
+
+MEDIA_TYPES = {
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".html": "text/html",
+    ".svg": "image/svg+xml",
+}
+
+
+def media_type_for(name: str) -> str:
+    ext = os.path.splitext(name)[1].lower()
+    return MEDIA_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class AssetPipeline:
+    def __init__(self, directory: str, names: Iterable[str], prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix.rstrip("/")
+        self.manifest: Dict[str, str] = {}
+        self._payloads: Dict[str, EncodedPayload] = {}
+        for name in names:
+            with open(os.path.join(directory, name), "rb") as source:
+                body = source.read()
+            payload = EncodedPayload(body, media_type_for(name), encodings=("gzip", "deflate"))
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{payload.etag[1:1 + HASH_LENGTH]}{ext}"
+            self.manifest[name] = f"{self.prefix}/{hashed}"
+            self._payloads[hashed] = payload
+
+    def payload(self, hashed_name: str) -> Optional[EncodedPayload]:
+        return self._payloads.get(hashed_name)
+
+    def render(self, html: str) -> str:
+        """Point ``href``/``src`` attributes naming a known asset at its hashed URL."""
+        def replace(match):
+            url = self.manifest.get(match.group(3))
+            if url is None:
+                return match.group(0)
+            return f"{match.group(1)}={match.group(2)}{url}{match.group(2)}"
+        return re.sub(r'\b(href|src)=(["\'])([^"\']+)\2', replace, html)
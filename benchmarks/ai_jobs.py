@@ -0,0 +1,102 @@
+"""/api/ai_chat under a slow reply generator: inline on the event loop vs. the job queue.
+
+Fires ``--chats`` concurrent chat requests while probing ``/health`` every
+few milliseconds and recording how late each answer is, once with the
+generator called inline (the old handler), once through ``ai_jobs`` and
+once as ``?stream=true``, which goes through ``ai_jobs`` as well.
+Reports the probe delays, chat throughput, and how many chats the bounded
+queue turned away with 503. Fails if probes routinely wait behind the
+generator with the queue, or if a rejection lacks Retry-After.
+
+    AI_GENERATOR_DELAY_MS=50 python -m benchmarks.ai_jobs --chats 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+os.environ.setdefault("AI_GENERATOR_DELAY_MS", "50")
+
+import main as server
+from benchmarks.asgi import call
+from benchmarks.session_store import percentile
+
+HEADERS = {"content-type": "application/json"}
+
+
+async def inline_chat(session_id: str, message: str):
+    # What the handler did before: produce the reply on the event loop
+    return 200, {}, json.dumps(server.generate_reply(session_id, message)).encode()
+
+
+async def queued_chat(session_id: str, message: str):
+    body = json.dumps({"message": message}).encode()
+    return await call(server.app, "POST", f"/api/ai_chat?session_id={session_id}", HEADERS, body)
+
+
+async def streamed_chat(session_id: str, message: str):
+    body = json.dumps({"message": message}).encode()
+    return await call(server.app, "POST", f"/api/ai_chat?stream=true&session_id={session_id}", HEADERS, body)
+
+
+async def measure(label, chat, args) -> list:
+    failures = []
+    done = asyncio.Event()
+    probes = []
+
+    async def probe():
+        # How late each /health answer is compared to when it was due
+        while not done.is_set():
+            due = time.perf_counter() + args.probe_ms / 1000
+            await asyncio.sleep(args.probe_ms / 1000)
+            await call(server.app, "GET", "/health")
+            probes.append((time.perf_counter() - due) * 1000)
+
+    prober = asyncio.ensure_future(probe())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(chat(f"{label}-{i}", f"Plan number {i}") for i in range(args.chats)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+
+    served = sum(status == 200 and b"event: error" not in body for status, _, body in results)
+    rejected = [headers for status, headers, _ in results if status == 503]
+    print(f"{label:<7} {served} served, {len(rejected)} rejected, {served / elapsed:6.1f} chats/s  "
+          f"/health late by p50 {percentile(probes, 50):7.2f} ms  p95 {percentile(probes, 95):8.2f} ms  "
+          f"max {max(probes):8.2f} ms ({len(probes)} probes)")
+    if any("retry-after" not in headers for headers in rejected):
+        failures.append(f"{label}: 503 without Retry-After")
+    # Parsing the burst of chats itself holds the loop briefly; the generator must not
+    if label != "inline" and percentile(probes, 95) > server.AI_GENERATOR_DELAY * 1000:
+        failures.append(f"{label}: /health p95 waited {percentile(probes, 95):.1f} ms behind the generator")
+    return failures
+
+
+async def run(args) -> list:
+    failures = await measure("inline", inline_chat, args)
+    failures += await measure("queued", queued_chat, args)
+    failures += await measure("stream", streamed_chat, args)
+    print(f"queue: {server.ai_jobs.stats()}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--probe-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
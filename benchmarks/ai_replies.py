@@ -0,0 +1,92 @@
+"""AI assistant replies: ReplyCache vs. choosing and rendering every reply.
+
+Replays chat traffic where most messages are the options the assistant
+offers (with varying case and punctuation) and the rest is free text drawn
+from a skewed pool. Every cached reply must equal the uncached one,
+otherwise the run fails. ``--model-us`` adds a busy wait to every reply
+choice, standing in for a local model behind the matcher.
+
+    python -m benchmarks.ai_replies --messages 50000 --max-entries 1000 --model-us 200
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+from dialogue import Dialogue, ReplyCache
+from main import dialogue as shipped
+from benchmarks.dialogue import WORDS
+from benchmarks.session_store import percentile
+
+
+def slow_dialogue(model_us):
+    dialogue = copy.copy(shipped)
+
+    def choose(message):
+        deadline = time.perf_counter_ns() + model_us * 1000
+        while time.perf_counter_ns() < deadline:
+            pass
+        return Dialogue.choose(dialogue, message)
+
+    dialogue.choose = choose
+    return dialogue
+
+
+def traffic(count, option_share, pool, rng):
+    options = shipped.options()
+    free_text = [" ".join(rng.choices(WORDS, k=rng.randint(2, 12))) for _ in range(pool)]
+    weights = [1 / (rank + 1) for rank in range(pool)]
+    messages = []
+    for _ in range(count):
+        if rng.random() < option_share:
+            message = rng.choice(options)
+            message = rng.choice([message, message.lower(), message.upper(), f"{message}!", f" {message} "])
+        else:
+            message = rng.choices(free_text, weights)[0]
+        messages.append(message)
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--option-share", type=float, default=0.7)
+    parser.add_argument("--pool", type=int, default=5000, help="distinct free-text messages")
+    parser.add_argument("--max-entries", type=int, default=1000)
+    parser.add_argument("--model-us", type=int, default=0, help="simulated cost of choosing a reply")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = traffic(args.messages, args.option_share, args.pool, rng)
+    dialogue = slow_dialogue(args.model_us) if args.model_us else shipped
+    cache = ReplyCache(dialogue, max_entries=args.max_entries)
+    cache.prerender(dialogue.options())
+
+    timings = {"uncached": [], "cached": []}
+    for message in messages:
+        start = time.perf_counter_ns()
+        dialogue.respond(message)
+        timings["uncached"].append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        cache.respond(message)
+        timings["cached"].append(time.perf_counter_ns() - start)
+    stats = cache.stats()
+    mismatches = sum(cache.respond(message) != shipped.respond(message) for message in messages)
+
+    for label, times in timings.items():
+        print(f"{label:<9} p50 {percentile(times, 50) / 1000:6.2f} us  p99 {percentile(times, 99) / 1000:6.2f} us  "
+              f"total {sum(times) / 1e6:8.1f} ms")
+    print(f"cache: {stats}, hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.1%}")
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
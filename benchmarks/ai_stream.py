@@ -0,0 +1,126 @@
+"""/api/ai_chat time to first byte and total latency: JSON vs. ?stream=true.
+
+``--section-ms`` stands in for a generator behind the assistant that takes
+that long per section of the reply. Both modes wait for it on the
+``ai_jobs`` worker pool; the streaming mode sends its first byte before the
+reply exists and the sections as soon as it does. The streamed text must
+join into the JSON reply's text, otherwise the run fails.
+
+    python -m benchmarks.ai_stream --section-ms 0 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+import main as server
+from dialogue import sections
+from benchmarks.session_store import percentile
+
+MESSAGES = ["I'm interested in Product Management", "Hi there", "3-5 years"]
+
+
+async def post(url: str, message: str):
+    """Send one chat request; return (first byte ms, first text ms, total ms, body)."""
+    body = json.dumps({"message": message}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/ai_chat",
+        "raw_path": b"/api/ai_chat",
+        "query_string": url.encode(),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    chunks = []
+    first_byte = first_text = None
+    streaming = "stream=true" in url
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            await asyncio.sleep(3600)
+        requested = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal first_byte, first_text
+        if message["type"] == "http.response.body" and message.get("body"):
+            now = time.perf_counter()
+            first_byte = first_byte or now
+            if first_text is None and (b"event: text" in message["body"] or not streaming):
+                first_text = now
+            chunks.append(message["body"])
+
+    started = time.perf_counter()
+    await server.app(scope, receive, send)
+    total = time.perf_counter()
+    return ((first_byte - started) * 1000, (first_text - started) * 1000, (total - started) * 1000, b"".join(chunks))
+
+
+def streamed_text(body: bytes) -> str:
+    text = []
+    for frame in body.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines() if not line.startswith(":"))
+        if lines.get("event") == "text":
+            text.append(json.loads(lines["data"])["text"])
+    return "".join(text)
+
+
+def simulate_generator(section_ms: float):
+    """Make both modes pay ``section_ms`` per reply section, as a real generator would."""
+    respond = server.reply_cache.respond
+
+    def ai_assistant_response(message, user_data):
+        response = respond(message, server.reply_context(user_data))
+        time.sleep(section_ms * len(sections(response.get("text", ""))) / 1000)
+        return response
+
+    server.ai_assistant_response = ai_assistant_response
+
+
+async def run(args) -> int:
+    mismatches = 0
+    for section_ms in args.section_ms:
+        simulate_generator(section_ms)
+        results = {"json": [], "stream": []}
+        for i in range(args.requests):
+            message = MESSAGES[i % len(MESSAGES)]
+            *json_times, json_body = await post(f"session_id=bench-{i}", message)
+            *stream_times, stream_body = await post(f"stream=true&session_id=bench-{i}", message)
+            results["json"].append(json_times)
+            results["stream"].append(stream_times)
+            if streamed_text(stream_body) != json.loads(json_body)["text"]:
+                mismatches += 1
+        for mode, times in results.items():
+            first_byte, first_text, total = zip(*times)
+            print(f"section={section_ms:>4}ms {mode:<6} first byte p50 {percentile(first_byte, 50):7.2f} ms  "
+                  f"first text p50 {percentile(first_text, 50):7.2f} ms  total p50 {percentile(total, 50):7.2f} ms  "
+                  f"p99 {percentile(total, 99):7.2f} ms")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--section-ms", type=float, nargs="+", default=[0, 20])
+    parser.add_argument("--requests", type=int, default=60)
+    args = parser.parse_args()
+
+    mismatches = asyncio.run(run(args))
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
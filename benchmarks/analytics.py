@@ -0,0 +1,108 @@
+"""Cohort analytics over a million sessions: columnar Cohort vs. a loop over sessions.
+
+Fills a ``Cohort`` with ``--sessions`` synthetic sessions through the same
+``update`` the engine calls, times the analytics endpoints' computations
+and a plain Python pass over the sessions for the same numbers, and exits
+non-zero if the two disagree.
+
+    python -m benchmarks.analytics --sessions 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from analytics import NUMERIC_FIELDS, Cohort
+from main import CAREER_PATHS
+from state import SessionState
+from benchmarks.session_store import percentile
+
+
+def random_session(rng: random.Random, quests: int, goals: int) -> SimpleNamespace:
+    done = int(rng.expovariate(1 / 3))
+    level = 1 + done // 2
+    return SimpleNamespace(
+        level=level, xp=rng.randint(0, 999), coins=rng.randint(0, 5000), daily_streak=int(rng.expovariate(1 / 4)) + 1,
+        total_quests_completed=done, total_xp_earned=done * rng.randint(50, 150),
+        total_coins_earned=done * rng.randint(20, 80),
+        career_path=rng.choice([None, *CAREER_PATHS]),
+        completed_quests=rng.getrandbits(quests) if done else 0,
+        selected_goals=rng.getrandbits(goals), completed_goals=rng.getrandbits(goals) & rng.getrandbits(goals),
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def python_pass(sessions, layout):
+    """What an endpoint without the columns would do: visit every session."""
+    levels = sorted(session.level for session in sessions)
+    careers = Counter(session.career_path for session in sessions if session.career_path is not None)
+    quests = [sum(session.completed_quests >> bit & 1 for session in sessions) for bit in range(len(layout.quest_ids))]
+    return levels, careers, quests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--python-sessions", type=int, default=100000, help="sessions visited by the Python pass")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=4)
+    args = parser.parse_args()
+
+    layout = SessionState.layout
+    rng = random.Random(args.seed)
+    cohort = Cohort(layout)
+    sessions = []
+    update_ns = []
+    for i in range(args.sessions):
+        session = random_session(rng, len(layout.quest_ids), len(layout.goal_ids))
+        start = time.perf_counter_ns()
+        cohort.update(f"s{i}", session)
+        update_ns.append(time.perf_counter_ns() - start)
+        if i < args.python_sessions:
+            sessions.append(session)
+    print(f"{len(cohort)} sessions; update p50 {percentile(update_ns, 50) / 1000:.1f} us "
+          f"p99 {percentile(update_ns, 99) / 1000:.1f} us")
+
+    for label, func, call_args in (
+        ("summary (7 fields + careers)", cohort.summary, ()),
+        ("histogram total_xp_earned", cohort.histogram, ("total_xp_earned", 20)),
+        ("completion (quests + goals)", cohort.completion, ()),
+    ):
+        times = [timed(func, *call_args)[0] for _ in range(args.rounds)]
+        print(f"{label:<30} p50 {percentile(times, 50):8.1f} ms")
+    python_ms, (levels, careers, quests) = timed(python_pass, sessions, layout)
+    print(f"{'python pass (level, careers, quests)':<30} {python_ms * args.sessions / len(sessions):8.1f} ms "
+          f"(extrapolated from {len(sessions)} sessions)")
+
+    # The same numbers from the columns, over the sessions the Python pass saw
+    check = Cohort(layout)
+    for i, session in enumerate(sessions):
+        check.update(f"s{i}", session)
+    summary = check.summary()
+    completion = check.completion()
+    mismatches = 0
+    mismatches += summary["fields"]["level"]["p50"] != levels[percentile_index(len(levels), 50)]
+    mismatches += summary["fields"]["level"]["max"] != levels[-1]
+    mismatches += summary["career_paths"] != dict(careers)
+    mismatches += [quest["completed"] for quest in completion["quests"]] != quests
+    mismatches += check.histogram("level", 200)["counts"] != [levels.count(v) for v in range(levels[0], levels[-1] + 1)]
+    mismatches += len(NUMERIC_FIELDS) != len(summary["fields"])
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+def percentile_index(count: int, p: float) -> int:
+    # NumPy's "lower" method: the element at floor(p% of (count - 1))
+    return int(p / 100 * (count - 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Minimal in-process ASGI driver, so benchmarks measure the app rather than an HTTP client."""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+async def call(app, method: str, url: str, headers: Optional[Dict[str, str]] = None, body: bytes = b""):
+    """Send one request; return ``(status, headers, body)``."""
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    sent = False
+    response: Dict = {"body": []}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = [(k.decode(), v.decode()) for k, v in message["headers"]]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], dict(response["headers"]), b"".join(response["body"])
+
+
+def requests_per_second(app, requests: List[Tuple[str, str, Dict[str, str], bytes]], duration: float = 2.0):
+    """Replay ``requests`` round-robin for ``duration`` seconds; return (req/s, bytes/request)."""
+
+    async def run():
+        done = 0
+        total_bytes = 0
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            for method, url, headers, body in requests:
+                _, _, content = await call(app, method, url, headers, body)
+                total_bytes += len(content)
+                done += 1
+        return done / (time.perf_counter() - started), total_bytes / done
+
+    return asyncio.run(run())
@@ -0,0 +1,104 @@
+"""Award latency against catalog size: indexed catalog vs. the old linear scan.
+
+    python -m benchmarks.catalog --sizes 6 1000 10000 50000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from catalog import Catalog, load_catalog
+from engine import MutationEngine
+from main import BADGES, CAREER_PATHS, DEFAULT_SKILLS_PROGRESS, RULES, new_user_data
+from rules import RuleSet
+from state import SessionState, StateLayout
+from storage import MemoryBackend, SessionStore
+from benchmarks.session_store import percentile
+
+SKILLS = ["Python", "SQL", "Agile", "React", "Communication", "Presentations"]
+TYPES = ["education", "reading", "social", "practice"]
+
+
+def write_catalog(directory, size, rng):
+    quests_csv = os.path.join(directory, "quests.csv")
+    goals_csv = os.path.join(directory, "goals.csv")
+    with open(quests_csv, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["id", "name", "xp", "coins", "skill", "type"])
+        for i in range(1, size + 1):
+            writer.writerow([i, f"Quest {i}", rng.randint(50, 150), rng.randint(20, 80),
+                             rng.choice(SKILLS), rng.choice(TYPES)])
+    with open(goals_csv, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["id", "name", "xp_reward", "coins_reward", "category", "term"])
+        for i in range(1, size + 1):
+            writer.writerow([f"goal_{i}", f"Goal {i}", rng.randint(100, 400), rng.randint(50, 200),
+                             rng.choice(["progress", "quests", "career"]),
+                             rng.choice(["short_term", "medium_term"])])
+    return quests_csv, goals_csv
+
+
+def linear_quest(quests, quest_id):
+    return next((q for q in quests if q["id"] == quest_id), None)
+
+
+def linear_goal(goals, goal_id):
+    for category in goals.values():
+        for g in category:
+            if g["id"] == goal_id:
+                return g
+    return None
+
+
+def measure(size, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        quests_csv, goals_csv = write_catalog(directory, size, rng)
+        started = time.perf_counter()
+        catalog = load_catalog(Catalog(CAREER_PATHS, [], {}, RULES), quests_csv=quests_csv, goals_csv=goals_csv)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    SessionState.layout = StateLayout(
+        list(catalog.quest_by_id), list(catalog.goal_by_id), BADGES,
+        [*DEFAULT_SKILLS_PROGRESS, *catalog.skills()],
+    )
+    store = SessionStore(MemoryBackend(), factory=new_user_data, dumps=lambda s: s, loads=lambda s: s)
+    engine = MutationEngine(store, catalog, RuleSet(catalog.rules, catalog, SessionState.layout))
+
+    picks = [
+        (f"cat-{rng.randrange(args.sessions)}", rng.randint(1, size), f"goal_{rng.randint(1, size)}")
+        for _ in range(args.ops)
+    ]
+    award, scan = [], []
+    for session_id, quest_id, goal_id in picks:
+        start = time.perf_counter_ns()
+        engine.apply(session_id, "complete_quest", quest_id)
+        engine.apply(session_id, "toggle_goal", goal_id, True)
+        award.append(time.perf_counter_ns() - start)
+    for _, quest_id, goal_id in picks[:args.scan_ops]:
+        start = time.perf_counter_ns()
+        linear_quest(catalog.quests, quest_id)
+        linear_goal(catalog.goals, goal_id)
+        scan.append(time.perf_counter_ns() - start)
+
+    print(f"size={size:<7} load={load_ms:8.1f}ms  "
+          f"indexed award p50={percentile(award, 50) / 1000:7.2f}us p99={percentile(award, 99) / 1000:7.2f}us  "
+          f"linear lookup alone p50={percentile(scan, 50) / 1000:9.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[6, 1000, 10000, 50000])
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--scan-ops", type=int, default=500, help="lookups timed with the old linear scan")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for size in args.sizes:
+        measure(size, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Requests/sec of the catalog endpoints: pre-encoded cache vs. encoding on every call.
+
+    python -m benchmarks.catalog_endpoints --duration 3
+"""
+import argparse
+import asyncio
+
+from fastapi import FastAPI
+
+from main import CAREER_PATHS, GOALS, QUESTS, app
+from benchmarks.asgi import call, requests_per_second
+
+PATHS = ["/api/career_paths", "/api/quests", "/api/goals"]
+
+
+def uncached_app():
+    # The endpoints as they were: return the module constants every time.
+    baseline = FastAPI()
+
+    @baseline.get("/api/career_paths")
+    async def get_career_paths():
+        return CAREER_PATHS
+
+    @baseline.get("/api/quests")
+    async def get_quests():
+        return QUESTS
+
+    @baseline.get("/api/goals")
+    async def get_goals():
+        return GOALS
+
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    etags = {}
+    for path in PATHS:
+        _, headers, _ = asyncio.run(call(app, "GET", path, {"Accept-Encoding": "gzip"}))
+        etags[path] = headers["etag"]
+
+    scenarios = [
+        ("uncached", uncached_app(), {}),
+        ("cached", app, {}),
+        ("cached+gzip", app, {"Accept-Encoding": "gzip"}),
+    ]
+    for name, target, headers in scenarios:
+        rps, size = requests_per_second(target, [("GET", p, headers, b"") for p in PATHS], args.duration)
+        print(f"{name:<16} {rps:9.0f} req/s  {size:7.0f} bytes/response")
+    conditional = [("GET", p, {"Accept-Encoding": "gzip", "If-None-Match": etags[p]}, b"") for p in PATHS]
+    rps, size = requests_per_second(app, conditional, args.duration)
+    print(f"{'cached 304':<16} {rps:9.0f} req/s  {size:7.0f} bytes/response")
+
+
+if __name__ == "__main__":
+    main()
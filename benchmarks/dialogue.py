@@ -0,0 +1,130 @@
+"""AI assistant reply cost against dialogue size: compiled matcher vs. the old substring chain.
+
+Pads the shipped dialogue with synthetic intents and times a corpus of chat
+messages through the compiled ``Dialogue`` and through a linear chain of
+substring tests like the old ``if``/``elif``. Checks the shipped intents on
+a few fixed messages first and exits non-zero if one is answered wrongly.
+
+    python -m benchmarks.dialogue --sizes 0 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+from dialogue import Dialogue
+from main import DIALOGUE_PATH
+from benchmarks.session_store import percentile
+
+# message -> expected intent (None for the fallback plan)
+CASES = {
+    "Hi there": "greeting",
+    "hello!": "greeting",
+    "I want to become a Team Lead": "team_lead",
+    "I plan to switch to Data Science": "data_science",
+    # The first intent listed wins, as the if/elif order did
+    "HELLO, data science please": "greeting",
+    # Whole words only: the old substring test answered these with the greeting
+    "this is which": None,
+    "They said teamwork matters": None,
+    "I'm interested in Product Management": None,
+}
+WORDS = ["i", "want", "to", "become", "a", "the", "move", "into", "career", "plan", "skills", "my",
+         "next", "year", "role", "learn", "python", "sql", "manager", "senior", "developer", "growth"]
+
+
+def linear_respond(intents, fallback, message):
+    """The old approach: one substring test per pattern, intent after intent."""
+    message_lower = message.lower()
+    for intent in intents:
+        if any(pattern in message_lower for pattern in intent["patterns"]):
+            return intent["response"]
+    return {**fallback, "text": fallback["text"].format(message=message)}
+
+
+def synthetic_intents(count, rng):
+    intents = []
+    for i in range(count):
+        patterns = [f"topic{i}", f"{rng.choice(WORDS)} subject{i}"]
+        intents.append({"name": f"synthetic_{i}", "patterns": patterns,
+                        "response": {"type": "question", "text": f"Tell me more about topic {i}.", "options": []}})
+    return intents
+
+
+def corpus(spec, size, count, rng):
+    phrases = [pattern for intent in spec["intents"] for pattern in intent["patterns"]]
+    phrases += [option for intent in spec["intents"] for option in intent["response"].get("options", [])]
+    messages = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(3, 20))
+        roll = rng.random()
+        if roll < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(phrases))
+        elif roll < 0.6 and size:
+            words.insert(rng.randrange(len(words) + 1), f"topic{rng.randrange(size)}")
+        messages.append(" ".join(words).capitalize())
+    return messages
+
+
+def measure(spec, size, args):
+    rng = random.Random(args.seed)
+    intents = spec["intents"] + synthetic_intents(size, rng)
+    started = time.perf_counter()
+    compiled = Dialogue(intents, spec["fallback"])
+    compile_ms = (time.perf_counter() - started) * 1000
+    messages = corpus(spec, size, args.messages, rng)
+
+    trie, linear = [], []
+    for message in messages:
+        start = time.perf_counter_ns()
+        compiled.respond(message)
+        trie.append(time.perf_counter_ns() - start)
+    for message in messages[:args.linear_messages]:
+        start = time.perf_counter_ns()
+        linear_respond(intents, spec["fallback"], message)
+        linear.append(time.perf_counter_ns() - start)
+    changed = sum(
+        compiled.respond(message) != linear_respond(intents, spec["fallback"], message)
+        for message in messages[:args.linear_messages]
+    )
+    print(f"intents={len(intents):<6} compile={compile_ms:7.1f}ms  "
+          f"compiled p50={percentile(trie, 50) / 1000:6.2f}us p99={percentile(trie, 99) / 1000:6.2f}us  "
+          f"substring chain p50={percentile(linear, 50) / 1000:9.2f}us  "
+          f"answered differently (word boundaries): {changed}/{len(linear)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--linear-messages", type=int, default=1000, help="messages timed with the substring chain")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(DIALOGUE_PATH, encoding="utf-8") as source:
+        spec = json.load(source)
+    shipped = Dialogue(spec["intents"], spec["fallback"])
+    failures = [
+        f"{message!r}: expected {expected}, got {shipped.intent(message)}"
+        for message, expected in CASES.items()
+        if shipped.intent(message) != expected
+    ]
+    plan = shipped.respond("Data Engineering")
+    if "**Data Engineering**" not in plan["text"] or plan["type"] != "final_plan":
+        failures.append("fallback plan does not quote the message")
+
+    for size in args.sizes:
+        measure(spec, size, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
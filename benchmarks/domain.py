@@ -0,0 +1,328 @@
+"""Microbenchmarks of the domain steps behind each request, as user histories grow.
+
+Runs every step against a small catalog (the built-in one) and a huge
+generated one, for sessions with each of ``--history-sizes`` completed
+quests (when that is more quests than the catalog has, they are ids it
+does not know, as after a catalog change). Steps:
+
+- ``get_user_data``: a cached session, and one loaded from storage
+- ``update_daily_streak``
+- ``ai_assistant_response``: a prerendered option, and an unseen message
+- the ``complete_quest`` and ``toggle_goal`` awards, through the engine
+- serialization: ``to_dict``, the response body, the stored row
+
+Reports ops/s (best of ``--rounds``, each sized like ``timeit`` to take
+about ``--min-time`` seconds, at most ``--ops`` calls), and from a separate tracemalloc pass
+the peak bytes allocated within one call and the bytes still held after
+it. Each run is appended to ``--history`` (JSON lines) and compared with
+the previous run there; the summary shows how much slower each step gets
+between the shortest and the longest history.
+
+    python -m benchmarks.domain --history-sizes 0 5000 --huge-quests 20000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+import main as server
+from catalog import Catalog
+from engine import MutationEngine, update_daily_streak
+from responses import fast_json_bytes
+from rules import RuleSet
+from state import SessionState, StateLayout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Quest ids the built-in catalog does not know start here
+UNKNOWN_QUEST_ID = 10**6
+
+
+def huge_catalog(quests: int, goals: int, rng: random.Random) -> Catalog:
+    skills = [skill for path in server.CAREER_PATHS.values() for skill in path["skills"]]
+    types = ("education", "reading", "social", "practice")
+    generated = [
+        {"id": i, "name": f"Quest {i}", "xp": rng.randint(20, 200), "coins": rng.randint(10, 100),
+         "skill": rng.choice(skills), "type": rng.choice(types)}
+        for i in range(1, quests + 1)
+    ]
+    extra_goals = [
+        {"id": f"goal_x{i}", "name": f"Goal {i}", "xp_reward": rng.randint(50, 400),
+         "coins_reward": rng.randint(20, 200), "category": rng.choice(("progress", "quests", "skills", "career"))}
+        for i in range(goals)
+    ]
+    return Catalog(server.CAREER_PATHS, generated, {**server.GOALS, "long_term": extra_goals}, server.RULES)
+
+
+class Scenario:
+    """A catalog with its state layout, rules and engine, and a template session of a given history."""
+
+    def __init__(self, name: str, catalog: Catalog, history: int, rng: random.Random):
+        self.name = name
+        self.catalog = catalog
+        self.history = history
+        badges = list(dict.fromkeys(rule["badge"] for rule in catalog.rules if "badge" in rule))
+        self.layout = StateLayout(
+            quest_ids=list(catalog.quest_by_id),
+            goal_ids=list(catalog.goal_by_id),
+            badges=badges,
+            skills=[*server.DEFAULT_SKILLS_PROGRESS, *catalog.skills()],
+        )
+        self.activate()
+        self.rules = RuleSet(catalog.rules, catalog, self.layout)
+        self.store = server.create_session_store()
+        self.engine = MutationEngine(self.store, catalog, self.rules)
+
+        quest_ids = list(catalog.quest_by_id)
+        if history <= len(quest_ids):
+            done = rng.sample(quest_ids, history)
+        else:
+            # Longer than the catalog: all old ids, so the catalog's own quests are still open
+            done = [UNKNOWN_QUEST_ID + i for i in range(history)]
+        state = server.new_user_data()
+        for quest_id in done:
+            state.add_completed_quest(quest_id)
+            quest = catalog.quest(quest_id)
+            if quest is not None:
+                state.xp += quest["xp"]
+                state.total_xp_earned += quest["xp"]
+                state.coins += quest["coins"]
+                state.total_coins_earned += quest["coins"]
+        state.total_quests_completed = history
+        state.level = 1 + history // 5
+        goal_ids = list(catalog.goal_by_id)
+        for goal_id in goal_ids[:min(len(goal_ids), history // 10)]:
+            state.add_selected_goal(goal_id)
+            state.add_completed_goal(goal_id)
+        self.rules.apply(state, ("quest_completed", "completed_quests", "career_path", "goal_rewarded"))
+        state.last_login = (datetime.now() - timedelta(days=1)).isoformat()
+        self.row = self.store.dumps(state)
+        # Quests the template has not completed, for the complete_quest award
+        completed = set(done)
+        self.open_quests = [quest_id for quest_id in quest_ids if quest_id not in completed]
+
+    def activate(self):
+        # SessionState reads its layout from the class
+        SessionState.layout = self.layout
+
+    def session(self, session_id: str) -> SessionState:
+        """A fresh copy of the template session, cached in the store under ``session_id``."""
+        self.store.backend.save_many([(session_id, self.row)])
+        return self.store.get(session_id)
+
+
+def steps(scenario: Scenario) -> Dict[str, Callable[[int], Callable[[int], object]]]:
+    """Step name -> ``prepare(n)``, which sets up ``n`` calls and returns the call for call ``i``."""
+    options = server.dialogue.options()
+
+    def get_cached(n):
+        # The scenario's own store, with main's codec
+        scenario.session("cached")
+        return lambda i: scenario.store.get("cached")
+
+    def get_from_storage(n):
+        return lambda i: scenario.store.loads(scenario.row)
+
+    def daily_streak(n):
+        state = scenario.session("streak")
+        now = datetime.now()
+        return lambda i: update_daily_streak(state, now)
+
+    def reply_option(n):
+        state = scenario.session("chat")
+        return lambda i: server.ai_assistant_response(options[i % len(options)], state)
+
+    def reply_unseen(n):
+        state = scenario.session("chat")
+        return lambda i: server.ai_assistant_response(f"what next for my plan {i} {time.perf_counter_ns()}", state)
+
+    def complete_quest(n):
+        # Every call awards a quest its session has not completed yet
+        per_session = min(len(scenario.open_quests), 10)
+        calls = []
+        for s in range(-(-n // per_session)):
+            session_id = f"award-{time.perf_counter_ns()}-{s}"
+            scenario.session(session_id)
+            calls += [(session_id, quest_id) for quest_id in scenario.open_quests[:per_session]]
+        return lambda i: scenario.engine.apply(calls[i][0], "complete_quest", calls[i][1])
+
+    def toggle_goal(n):
+        scenario.session("goals")
+        return lambda i: scenario.engine.apply("goals", "toggle_goal", "goal_1", i % 2 == 0)
+
+    def to_dict(n):
+        state = scenario.session("serialize")
+        return lambda i: state.to_dict()
+
+    def response_body(n):
+        state = scenario.session("serialize")
+        return lambda i: fast_json_bytes({"success": True, "user_data": state.to_dict()})
+
+    def stored_row(n):
+        state = scenario.session("serialize")
+        return lambda i: scenario.store.dumps(state)
+
+    return {
+        "get_user_data (cached)": get_cached,
+        "get_user_data (from storage)": get_from_storage,
+        "update_daily_streak": daily_streak,
+        "ai_assistant_response (option)": reply_option,
+        "ai_assistant_response (unseen)": reply_unseen,
+        "complete_quest award": complete_quest,
+        "toggle_goal award": toggle_goal,
+        "UserData to_dict": to_dict,
+        "UserData response body": response_body,
+        "UserData stored row": stored_row,
+    }
+
+
+def timed(prepare, ops: int) -> float:
+    call = prepare(ops)
+    started = time.perf_counter()
+    for i in range(ops):
+        call(i)
+    return time.perf_counter() - started
+
+
+def autorange(prepare, max_ops: int, min_time: float) -> int:
+    """Calls per round: enough to take about ``min_time``, like timeit, but at most ``max_ops``."""
+    ops = 1
+    while ops < max_ops:
+        elapsed = timed(prepare, ops)
+        if elapsed >= min_time / 10:
+            return max(1, min(max_ops, int(ops * min_time / elapsed)))
+        ops *= 10
+    return max_ops
+
+
+def ops_per_second(prepare, ops: int, rounds: int) -> float:
+    return ops / min(timed(prepare, ops) for _ in range(rounds))
+
+
+def allocations(prepare, ops: int):
+    """Median peak bytes allocated within one call, and bytes still held per call afterwards."""
+    call = prepare(ops)
+    peaks = []
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for i in range(ops):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = (tracemalloc.get_traced_memory()[0] - start) / ops
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks)), round(retained, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(path: str, config: dict):
+    """The latest run in the history file made with the same settings."""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as history:
+        for line in history:
+            run = json.loads(line)
+            if run.get("config") == config:
+                previous = run
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[0, 5000], help="completed quests per session")
+    parser.add_argument("--huge-quests", type=int, default=20000)
+    parser.add_argument("--huge-goals", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=2000, help="most calls per round")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds a round should take if --ops allows")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--alloc-ops", type=int, default=200)
+    parser.add_argument("--only", nargs="+", help="run only steps whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--history", default=os.path.join(ROOT, ".benchmarks", "domain.jsonl"))
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to --history")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    config = {key: value for key, value in vars(args).items() if key not in ("history", "no_save")}
+    previous = previous_run(args.history, config)
+    catalogs = [
+        (f"small catalog ({len(server.catalog.quests)} quests)", server.catalog),
+        (f"huge catalog ({args.huge_quests} quests)", huge_catalog(args.huge_quests, args.huge_goals, rng)),
+    ]
+    layout = SessionState.layout
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        for catalog_name, catalog in catalogs:
+            for history in args.history_sizes:
+                scenario = Scenario(f"{catalog_name}, {history} completed", catalog, history, rng)
+                print(f"\n{scenario.name}")
+                print(f"  {'step':<32} {'ops/s':>11} {'peak B/op':>10} {'held B/op':>10} {'vs last':>8}")
+                for step, prepare in steps(scenario).items():
+                    if args.only and not any(part in step for part in args.only):
+                        continue
+                    scenario.activate()
+                    ops = autorange(prepare, args.ops, args.min_time)
+                    rate = ops_per_second(prepare, ops, args.rounds)
+                    peak, held = allocations(prepare, min(ops, args.alloc_ops))
+                    key = f"{scenario.name} | {step}"
+                    results[key] = {
+                        "ops_per_sec": round(rate, 1), "ops": ops, "peak_bytes": peak, "retained_bytes": held,
+                    }
+                    old = (previous or {}).get("results", {}).get(key)
+                    change = f"{(rate / old['ops_per_sec'] - 1) * 100:+7.1f}%" if old else "       -"
+                    print(f"  {step:<32} {rate:>11,.0f} {peak:>10,} {held:>10,.1f} {change:>8}")
+    finally:
+        SessionState.layout = layout
+
+    low, high = min(args.history_sizes), max(args.history_sizes)
+    if low != high:
+        print(f"\nslowdown from {low} to {high} completed quests:")
+        for catalog_name, _ in catalogs:
+            for step in step_names(results, f"{catalog_name}, {low} completed"):
+                fast = results.get(f"{catalog_name}, {low} completed | {step}")
+                slow = results.get(f"{catalog_name}, {high} completed | {step}")
+                if fast and slow:
+                    print(f"  {catalog_name:<28} {step:<32} x{fast['ops_per_sec'] / slow['ops_per_sec']:8.1f}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "config": config,
+            "results": results,
+        }
+        with open(args.history, "a", encoding="utf-8") as history:
+            history.write(json.dumps(record) + "\n")
+        print(f"\nappended to {args.history}" + (f"; compared with the run of {previous['time']}" if previous else ""))
+
+
+def step_names(results: dict, scenario: str) -> List[str]:
+    prefix = f"{scenario} | "
+    return [key[len(prefix):] for key in results if key.startswith(prefix)]
+
+
+if __name__ == "__main__":
+    main()
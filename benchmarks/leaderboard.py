@@ -0,0 +1,91 @@
+"""Leaderboard queries and updates with a million ranked sessions vs. sorting every request.
+
+Seeds a ``Leaderboard`` with ``--sessions`` members whose scores look like
+long-running users, then times award updates, top-K and "my rank" queries
+against sorting all scores as a request would without the index. Checks
+the top-K and sampled ranks against the sort and exits non-zero on any
+difference.
+
+    python -m benchmarks.leaderboard --sessions 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from operator import itemgetter
+from types import SimpleNamespace
+
+from leaderboard import Leaderboard
+from main import LEADERBOARD_METRICS
+from benchmarks.session_store import percentile
+
+
+def random_scores(rng: random.Random) -> dict:
+    quests = int(rng.expovariate(1 / 40))
+    return {
+        "total_xp_earned": quests * rng.randint(50, 150),
+        "total_coins_earned": quests * rng.randint(20, 80),
+        "level": 1 + quests // 5,
+        "daily_streak": int(rng.expovariate(1 / 4)) + 1,
+    }
+
+
+def timed(func, *args) -> int:
+    start = time.perf_counter_ns()
+    func(*args)
+    return time.perf_counter_ns() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--sort-ops", type=int, default=5, help="requests timed with a full sort")
+    parser.add_argument("--seed", type=int, default=9)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    board = Leaderboard(LEADERBOARD_METRICS)
+    started = time.perf_counter()
+    for i in range(args.sessions):
+        board.add_stored(f"s{i}", SimpleNamespace(**random_scores(rng)))
+    print(f"seeded {len(board)} sessions x {len(LEADERBOARD_METRICS)} metrics in {time.perf_counter() - started:.1f} s")
+
+    index = board._indexes["total_xp_earned"]
+    update, top10, top100, rank = [], [], [], []
+    for _ in range(args.ops):
+        member = f"s{rng.randrange(args.sessions)}"
+        state = SimpleNamespace(**{metric: board._indexes[metric].scores[member] for metric in LEADERBOARD_METRICS})
+        state.total_xp_earned += rng.randint(50, 150)
+        state.total_coins_earned += rng.randint(20, 80)
+        update.append(timed(board.update, member, state))
+        top10.append(timed(board.top, "total_xp_earned", 10))
+        top100.append(timed(board.top, "total_xp_earned", 100))
+        rank.append(timed(board.position, "total_xp_earned", state.total_xp_earned))
+
+    by_score = lambda scores: sorted(scores.items(), key=itemgetter(1), reverse=True)
+    sort = [timed(by_score, index.scores) for _ in range(args.sort_ops)]
+    for label, times in (("update (4 metrics)", update), ("top 10", top10), ("top 100", top100),
+                         ("my rank", rank), ("full sort", sort)):
+        print(f"{label:<20} p50 {percentile(times, 50) / 1000:9.1f} us  p99 {percentile(times, 99) / 1000:9.1f} us")
+
+    ordered = sorted(index.scores.values(), reverse=True)
+    mismatches = sum(score != expected for (_, _, score), expected in zip(board.top("total_xp_earned", 1000)[1], ordered))
+    for member in rng.sample(list(index.scores), 200):
+        score = index.scores[member]
+        # Competition rank: 1 + the number of strictly higher scores
+        low, high = 0, len(ordered)
+        while low < high:
+            middle = (low + high) // 2
+            if ordered[middle] > score:
+                low = middle + 1
+            else:
+                high = middle
+        mismatches += index.rank(member) != low + 1
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
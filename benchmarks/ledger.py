@@ -0,0 +1,82 @@
+"""Ledger append overhead on the award path, and replay throughput.
+
+    python -m benchmarks.ledger --ops 200000 --sessions 2000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from engine import OPERATIONS, MutationEngine
+from ledger import Ledger, read_records, replay
+from main import GOALS, QUESTS, catalog, new_user_data, rule_set
+from state import SessionState
+from storage import MemoryBackend, SessionStore
+from benchmarks.session_store import percentile
+
+
+def build_ops(args):
+    rng = random.Random(args.seed)
+    goal_ids = [g["id"] for category in GOALS.values() for g in category]
+    ops = []
+    for _ in range(args.ops):
+        session_id = f"ledger-{rng.randrange(args.sessions)}"
+        roll = rng.random()
+        if roll < 0.4:
+            ops.append((session_id, "complete_quest", (rng.choice(QUESTS)["id"],)))
+        elif roll < 0.8:
+            ops.append((session_id, "toggle_goal", (rng.choice(goal_ids), rng.random() < 0.7)))
+        else:
+            ops.append((session_id, "login", ("2026-01-01T09:00:00",)))
+    return ops
+
+
+def run(ops, ledger):
+    store = SessionStore(MemoryBackend(), factory=new_user_data, dumps=lambda s: s, loads=lambda s: s)
+    engine = MutationEngine(store, catalog, rule_set, ledger=ledger)
+    samples = []
+    for session_id, name, op_args in ops:
+        start = time.perf_counter_ns()
+        engine.apply(session_id, name, *op_args)
+        samples.append(time.perf_counter_ns() - start)
+    return engine, store, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--snapshot-every", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    ops = build_ops(args)
+
+    _, _, plain = run(ops, None)
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(directory, snapshot_every=args.snapshot_every)
+        ledger.start()
+        engine, store, logged = run(ops, ledger)
+        ledger.stop()
+        for name, samples in (("no ledger", plain), ("ledger", logged)):
+            print(f"apply {name:<10} p50={percentile(samples, 50) / 1000:6.2f}us "
+                  f"p99={percentile(samples, 99) / 1000:6.2f}us")
+
+        started = time.perf_counter()
+        records = sum(1 for _ in read_records(directory))
+        decoded = time.perf_counter() - started
+        started = time.perf_counter()
+        sessions = replay(directory, engine, SessionState.from_dict, OPERATIONS)
+        elapsed = time.perf_counter() - started
+        print(f"decode  {records} records in {decoded:.3f}s ({records / decoded:,.0f} records/s)")
+        print(f"replay  {records} records in {elapsed:.3f}s ({records / elapsed:,.0f} records/s)")
+
+        mismatches = sum(
+            1 for session_id, state in sessions.items()
+            if state.to_dict() != store.get(session_id).to_dict()
+            or state.version != store.get(session_id).version
+        )
+        print(f"rebuilt {len(sessions)} sessions, {mismatches} differ from live state")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""End-to-end load test: simulated sessions walking through the app over loopback.
+
+Starts ``python main.py`` (or targets ``--url``) and runs ``--sessions``
+concurrent simulated users, each following a seeded journey the way the
+page does: load ``/``, fetch ``/api/user`` and the catalog, pick a career,
+complete a few quests, select and complete a goal, chat with the assistant,
+with exponential think times between steps. Sessions share a pool of
+keep-alive connections per client process, so thousands of them do not
+need thousands of sockets.
+
+The same ``--seed`` gives every session the same journey, whatever the
+number of client processes. Reports throughput and p50/p95/p99 latency per
+endpoint (time from writing the request to reading the last byte), writes
+them as JSON with ``--output``, and with ``--baseline`` compares against an
+earlier ``--output`` and exits non-zero when an endpoint got worse by more
+than ``--max-regression`` percent.
+
+    python -m benchmarks.load --sessions 2000 --output before.json
+    python -m benchmarks.load --sessions 2000 --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.workers import ROOT, wait_until_ready
+
+CAREERS = ("Data Scientist", "Frontend Developer", "Project Manager", "Team Lead")
+MESSAGES = (
+    "Hi there!",
+    "How do I become a team lead?",
+    "What should I learn for data science?",
+    "Help me plan my week",
+    "Which quests should I do next?",
+)
+# Settings that change the workload, and so the numbers
+WORKLOAD = ("sessions", "journeys", "think_ms", "connections", "clients", "seed", "workers")
+# Higher is better for these; for the latency percentiles lower is better
+HIGHER_IS_BETTER = {"rps"}
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: Tuple[str, ...] = ()):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}", *headers]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        status = int((await self.reader.readline()).split()[1])
+        length, chunked, close = 0, False, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding":
+                chunked = "chunked" in value
+            elif name == "connection":
+                close = value == "close"
+        if chunked:
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                parts.append(await self.reader.readexactly(size + 2))
+                if not size:
+                    break
+            content = b"".join(part[:-2] for part in parts)
+        else:
+            content = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Client:
+    """Runs journeys over a pool of connections and records latencies per endpoint."""
+
+    def __init__(self, host: str, port: int, connections: int, think: float):
+        self.think = think
+        self.pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(connections):
+            self.pool.put_nowait(Connection(host, port))
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, label: str, method: str, path: str, payload=None, headers: Tuple[str, ...] = ()):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        if payload is not None:
+            headers = (*headers, "Content-Type: application/json")
+        connection = await self.pool.get()
+        try:
+            started = time.perf_counter()
+            try:
+                status, content = await connection.request(method, path, body, headers)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                connection.close()
+                status, content = 0, b""
+            self.latencies[label].append(time.perf_counter() - started)
+        finally:
+            self.pool.put_nowait(connection)
+        if not 200 <= status < 300:
+            self.errors[label] += 1
+            return None
+        return content
+
+    async def pause(self, rng: random.Random):
+        if self.think:
+            await asyncio.sleep(rng.expovariate(1 / self.think))
+
+    async def journey(self, rng: random.Random, session_id: str):
+        query = f"session_id={session_id}"
+        await self.call("GET /", "GET", "/", headers=("Accept-Encoding: gzip, deflate",))
+        await self.call("GET /api/user", "GET", f"/api/user?{query}")
+        await self.call("GET /api/career_paths", "GET", "/api/career_paths")
+        quests = await self.call("GET /api/quests", "GET", "/api/quests")
+        goals = await self.call("GET /api/goals", "GET", "/api/goals")
+        quest_ids = [quest["id"] for quest in json.loads(quests)] if quests else [1]
+        goal_ids = [goal["id"] for term in json.loads(goals).values() for goal in term] if goals else ["goal_1"]
+        await self.pause(rng)
+
+        await self.call("POST /api/select_career", "POST", f"/api/select_career?{query}",
+                        {"career_path": rng.choice(CAREERS)})
+        for _ in range(rng.randint(1, 4)):
+            await self.pause(rng)
+            await self.call("POST /api/complete_quest", "POST", f"/api/complete_quest?{query}",
+                            {"quest_id": rng.choice(quest_ids)})
+        await self.pause(rng)
+        goal_id = rng.choice(goal_ids)
+        await self.call("POST /api/select_goal", "POST", f"/api/select_goal?goal_id={goal_id}&{query}")
+        await self.call("POST /api/toggle_goal", "POST", f"/api/toggle_goal?{query}",
+                        {"goal_id": goal_id, "completed": rng.random() < 0.7})
+        for _ in range(rng.randint(0, 2)):
+            await self.pause(rng)
+            await self.call("POST /api/ai_chat", "POST", f"/api/ai_chat?{query}", {"message": rng.choice(MESSAGES)})
+        await self.call("GET /api/user", "GET", f"/api/user?{query}")
+
+    async def session(self, seed: int, index: int, journeys: int):
+        # Seeded per session, so a session's journey does not depend on how sessions are split up
+        rng = random.Random(f"{seed}:{index}")
+        # Stagger the start so that the sessions do not all load the page at once
+        await asyncio.sleep(rng.random() * self.think * 4)
+        for journey in range(journeys):
+            await self.journey(rng, f"load-{seed}-{index}-{journey}")
+
+
+def client_process(host, port, sessions, args, queue):
+    async def run():
+        client = Client(host, port, args.connections, args.think_ms / 1000)
+        started = time.perf_counter()
+        await asyncio.gather(*(client.session(args.seed, index, args.journeys) for index in sessions))
+        elapsed = time.perf_counter() - started
+        while not client.pool.empty():
+            client.pool.get_nowait().close()
+        return dict(client.latencies), dict(client.errors), elapsed
+
+    queue.put(asyncio.run(run()))
+
+
+def ms(samples: List[float], pct: float) -> float:
+    # Nearest-rank over already sorted samples, as benchmarks.session_store.percentile
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000, 3)
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> dict:
+    endpoints = {}
+    for label in sorted(latencies):
+        samples = sorted(latencies[label])
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": errors.get(label, 0),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50": ms(samples, 50),
+            "p95": ms(samples, 95),
+            "p99": ms(samples, 99),
+        }
+    everything = sorted(sample for samples in latencies.values() for sample in samples)
+    total = {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / elapsed, 1),
+        "p50": ms(everything, 50),
+        "p95": ms(everything, 95),
+        "p99": ms(everything, 99),
+    }
+    return {"endpoints": endpoints, "total": total, "seconds": round(elapsed, 2)}
+
+
+def print_report(result: dict):
+    print(f"{'endpoint':<28} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, row in [*result["endpoints"].items(), ("TOTAL", result["total"])]:
+        print(f"{label:<28} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f}")
+
+
+def compare(result: dict, baseline: dict, metrics: List[str], max_regression: float) -> List[str]:
+    """Print the change per endpoint and metric; return the regressions beyond the threshold."""
+    regressions = []
+    print(f"\nvs. baseline ({', '.join(metrics)}; worse by more than {max_regression:.0f}% fails):")
+    # Numbers from a different workload are not comparable
+    for key in WORKLOAD:
+        if baseline.get("config", {}).get(key) != result["config"][key]:
+            print(f"  note: baseline ran with {key}={baseline.get('config', {}).get(key)}, this run with {result['config'][key]}")
+    rows = [*result["endpoints"].items(), ("TOTAL", result["total"])]
+    old_rows = {**baseline["endpoints"], "TOTAL": baseline["total"]}
+    for label, row in rows:
+        old = old_rows.get(label)
+        if old is None:
+            print(f"  {label:<28} new endpoint")
+            continue
+        changes = []
+        for metric in metrics:
+            if not old[metric]:
+                continue
+            change = (row[metric] - old[metric]) / old[metric] * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            changes.append(f"{metric} {old[metric]:.2f} -> {row[metric]:.2f} ({change:+.1f}%)")
+            if worse > max_regression:
+                regressions.append(f"{label} {metric} {old[metric]} -> {row[metric]} ({change:+.1f}%)")
+        if row["errors"] > old["errors"]:
+            regressions.append(f"{label} errors {old['errors']} -> {row['errors']}")
+        print(f"  {label:<28} " + "  ".join(changes))
+    return regressions
+
+
+def start_server(args, tmp: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        WORKERS=str(args.workers),
+        SESSION_DB_PATH=os.path.join(tmp, "sessions.db"),
+        LEDGER_DIR=os.path.join(tmp, "ledger"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(args.port)
+    except Exception:
+        server.terminate()
+        server.wait()
+        raise
+    return server
+
+
+def run(args, host: str, port: int) -> dict:
+    queue = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(
+            target=client_process, args=(host, port, range(i, args.sessions, args.clients), args, queue)
+        )
+        for i in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    elapsed = 0.0
+    for _ in clients:
+        client_latencies, client_errors, client_elapsed = queue.get()
+        for label, samples in client_latencies.items():
+            latencies[label].extend(samples)
+        for label, count in client_errors.items():
+            errors[label] += count
+        elapsed = max(elapsed, client_elapsed)
+    for client in clients:
+        client.join()
+    return summarize(latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000, help="concurrent simulated sessions")
+    parser.add_argument("--journeys", type=int, default=1, help="journeys per session")
+    parser.add_argument("--think-ms", type=float, default=50, help="mean pause between steps of a journey")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connections per client process")
+    parser.add_argument("--clients", type=int, default=1, help="client processes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="target a running server instead of starting python main.py")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--workers", type=int, default=1, help="WORKERS for the started server")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --output to compare against")
+    parser.add_argument("--metrics", nargs="+", default=["p95", "rps"], choices=["p50", "p95", "p99", "rps"])
+    parser.add_argument("--max-regression", type=float, default=15.0, help="percent")
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} sessions={args.sessions} journeys={args.journeys} "
+          f"connections={args.connections * args.clients} seed={args.seed}")
+    if args.url:
+        parts = urlsplit(args.url)
+        result = run(args, parts.hostname, parts.port or 80)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_server(args, tmp)
+            try:
+                result = run(args, "127.0.0.1", args.port)
+            finally:
+                server.terminate()
+                server.wait()
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(result, out, indent=2)
+            out.write("\n")
+    failures = []
+    if result["total"]["errors"]:
+        failures.append(f"{result['total']['errors']} requests failed")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            failures += compare(result, json.load(baseline), args.metrics, args.max_regression)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Per-request cost of the /metrics middleware, and a check of the exposition it renders.
+
+Times a minimal ASGI app called bare and wrapped in ``RequestMetrics``,
+so the difference is what recording adds to each request. Then drives a
+mix of real routes through ``main.app``, parses ``/metrics`` and checks
+that every sample line is well formed, histogram buckets are cumulative,
+and each route's histogram count equals its request counters. Exits
+non-zero if a check fails or recording costs more than
+``--max-overhead-us``.
+
+    python -m benchmarks.metrics --requests 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+import main as server
+from benchmarks.asgi import call
+from metrics import Registry, RequestMetrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def endpoint():
+    pass
+
+
+async def plain_app(scope, receive, send):
+    # What routing leaves in the scope for a matched route
+    scope["endpoint"] = endpoint
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def noop_send(message):
+    pass
+
+
+async def noop_receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def per_request_ns(app, requests: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/"}, noop_receive, noop_send)
+    return (time.perf_counter_ns() - started) / requests
+
+
+async def overhead(args) -> float:
+    wrapped = RequestMetrics(plain_app, Registry())
+    bare, recorded = [], []
+    for _ in range(args.rounds):
+        bare.append(await per_request_ns(plain_app, args.requests))
+        recorded.append(await per_request_ns(wrapped, args.requests))
+    bare_ns, recorded_ns = min(bare), min(recorded)
+    print(f"bare app {bare_ns / 1000:6.2f} us/request, with RequestMetrics {recorded_ns / 1000:6.2f} us/request: "
+          f"{(recorded_ns - bare_ns) / 1000:.2f} us recording overhead")
+    return (recorded_ns - bare_ns) / 1000
+
+
+def check_exposition(text: str) -> list:
+    failures = []
+    requests = defaultdict(int)
+    buckets = defaultdict(list)
+    counts = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        if match is None:
+            failures.append(f"malformed sample: {line}")
+            continue
+        name, label_text, value = match.groups()
+        float(value)
+        found = dict(LABEL.findall(label_text or ""))
+        key = (found.get("method"), found.get("route"))
+        if name == "http_requests_total":
+            requests[key] += int(value)
+        elif name == "http_request_duration_seconds_bucket":
+            buckets[key].append(int(value))
+        elif name == "http_request_duration_seconds_count":
+            counts[key] = int(value)
+    for key, series in buckets.items():
+        if series != sorted(series):
+            failures.append(f"{key}: buckets are not cumulative")
+        if series[-1] != counts.get(key) or counts.get(key) != requests.get(key):
+            failures.append(f"{key}: +Inf {series[-1]}, count {counts.get(key)}, requests {requests.get(key)}")
+    return failures
+
+
+async def exposition(args) -> list:
+    headers = {"content-type": "application/json"}
+    mix = [
+        ("GET", "/api/user?session_id=m1", None, b""),
+        ("GET", "/api/quests", None, b""),
+        ("POST", "/api/complete_quest?session_id=m1", headers, json.dumps({"quest_id": 1}).encode()),
+        ("GET", "/api/leaderboard/level", None, b""),
+        ("GET", "/api/leaderboard/unknown", None, b""),
+        ("GET", "/api/ai_chat/jobs/missing", None, b""),
+        ("GET", "/no/such/route", None, b""),
+    ]
+    for i in range(args.mix_rounds):
+        for method, url, request_headers, body in mix:
+            await call(server.app, method, url, request_headers, body)
+    started = time.perf_counter()
+    status, response_headers, body = await call(server.app, "GET", "/metrics")
+    render_ms = (time.perf_counter() - started) * 1000
+    text = body.decode()
+    print(f"/metrics: {status}, {len(text.splitlines())} lines, {len(server.metrics_registry.routes)} series, "
+          f"rendered in {render_ms:.2f} ms")
+    failures = [] if status == 200 else [f"/metrics answered {status}"]
+    if not response_headers.get("content-type", "").startswith("text/plain; version=0.0.4"):
+        failures.append(f"content-type {response_headers.get('content-type')}")
+    for route in ("/api/leaderboard/{metric}", "/api/ai_chat/jobs/{job_id}", "unmatched"):
+        if f'route="{route}"' not in text:
+            failures.append(f"no series for {route}")
+    return failures + check_exposition(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--mix-rounds", type=int, default=200)
+    parser.add_argument("--max-overhead-us", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cost = asyncio.run(overhead(args))
+    failures = asyncio.run(exposition(args))
+    if cost > args.max_overhead_us:
+        failures.append(f"recording costs {cost:.2f} us per request")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Cost of the sampling profiler when off, and what it collects when on.
+
+Times a minimal ASGI app bare and wrapped in ``SampledRequests`` with the
+profiler off, then drives a mix of routes through ``main.app`` with the
+profiler on (every ``/api/complete_quest`` request sampled, others at
+``--sample-rate``), dumps the collapsed stacks and prints the frames that
+took the most samples. Exits non-zero if the dump is malformed, misses
+the handler, or the off cost exceeds ``--max-off-us``.
+
+    python -m benchmarks.profiler --seconds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+
+import main as server
+from benchmarks.asgi import call
+from benchmarks.metrics import noop_receive, noop_send
+from profiler import Profiler, SampledRequests
+
+FOLDED = re.compile(r"^(?:GET|POST) [^;]+(?:;[^;]+)* \d+$")
+HEADERS = {"content-type": "application/json"}
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def per_request_ns(app, requests: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/"}, noop_receive, noop_send)
+    return (time.perf_counter_ns() - started) / requests
+
+
+async def off_cost(args) -> float:
+    wrapped = SampledRequests(plain_app, Profiler())
+    bare, off = [], []
+    for _ in range(args.rounds):
+        bare.append(await per_request_ns(plain_app, args.requests))
+        off.append(await per_request_ns(wrapped, args.requests))
+    cost = (min(off) - min(bare)) / 1000
+    print(f"bare app {min(bare) / 1000:6.2f} us/request, profiler off {min(off) / 1000:6.2f} us/request: {cost:.2f} us")
+    return cost
+
+
+async def drive(seconds: float) -> int:
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        session = f"p{done % 50}"
+        for method, url, body in (
+            ("GET", f"/api/user?session_id={session}", b""),
+            ("POST", f"/api/complete_quest?session_id={session}", json.dumps({"quest_id": done % 6 + 1}).encode()),
+            ("POST", f"/api/toggle_goal?session_id={session}",
+             json.dumps({"goal_id": "goal_1", "completed": done % 2 == 0}).encode()),
+            ("GET", "/api/quests", b""),
+        ):
+            await call(server.app, method, url, HEADERS, body)
+            done += 1
+    return done
+
+
+async def profile(args, directory: str) -> list:
+    profiler = server.profiler
+    profiler.directory = directory
+    off = await drive(args.seconds)
+    profiler.configure(args.sample_rate, {"/api/complete_quest": 1.0})
+    profiler.start()
+    on = await drive(args.seconds)
+    profiler.stop()
+    result = profiler.dump()
+    print(f"{off / args.seconds:7.0f} req/s off, {on / args.seconds:7.0f} req/s on; "
+          f"{profiler.sampled_requests} requests sampled, {result['samples']} samples in {result['stacks']} stacks")
+
+    failures = []
+    with open(result["path"], encoding="utf-8") as folded:
+        lines = folded.read().splitlines()
+    failures += [f"malformed line: {line[:120]}" for line in lines if not FOLDED.match(line)]
+    leaves, handlers = Counter(), Counter()
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        frames = stack.split(";")
+        leaves[frames[-1]] += int(count)
+        handlers[frames[0]] += int(count)
+    print("samples by route: " + ", ".join(f"{route} {count}" for route, count in handlers.most_common()))
+    print("hottest frames:")
+    for frame, count in leaves.most_common(args.top):
+        print(f"  {count:6d}  {frame}")
+    if not any("complete_quest (main.py" in line for line in lines):
+        failures.append("no sample inside the complete_quest handler")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--max-off-us", type=float, default=1.0)
+    args = parser.parse_args()
+
+    cost = asyncio.run(off_cost(args))
+    with tempfile.TemporaryDirectory() as directory:
+        failures = asyncio.run(profile(args, directory))
+    if cost > args.max_off_us:
+        failures.append(f"profiler off costs {cost:.2f} us per request")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Idle SSE connections per process, burst coalescing and slow consumers.
+
+Opens ``--connections`` /api/events streams in-process, measures the Python
+heap they hold (uvicorn's per-socket buffers come on top), then checks that
+a burst of awards reaches every subscriber of the session as one delta,
+that a stalled consumer holds nothing queued while changes keep coming,
+and that closed streams unsubscribe. Exits non-zero if a check fails.
+
+    python -m benchmarks.push --connections 10000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+os.environ.setdefault("PUSH_HEARTBEAT", "0")
+
+from main import QUESTS, app, change_feed, mutation_engine
+
+
+class Connection:
+    """One open /api/events request driven straight through the ASGI app."""
+
+    def __init__(self, session_id: str, stalled: bool = False):
+        self.session_id = session_id
+        self.frames = []
+        self.received = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.unstall = asyncio.Event()
+        if not stalled:
+            self.unstall.set()
+        self.task = None
+
+    def open(self, target=app):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/events",
+            "raw_path": b"/api/events",
+            "query_string": f"session_id={self.session_id}".encode(),
+            "headers": [],
+            "client": ("127.0.0.1", 50000),
+            "server": ("127.0.0.1", 8000),
+        }
+        self.task = asyncio.ensure_future(target(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not hasattr(self, "_requested"):
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            # The first frame always goes through; a stalled client then stops reading.
+            if self.frames:
+                await self.unstall.wait()
+            self.frames.append(message["body"])
+            self.received.set()
+
+    def events(self, start: int = 0):
+        return [frame for frame in self.frames[start:] if frame.startswith(b"id:")]
+
+
+async def idle_app(scope, receive, send):
+    # Holds a request open doing nothing: what the driver itself costs per connection.
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b": ok\n\n", "more_body": True})
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def heap_per_connection(sessions, count, target) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    connections = [Connection(sessions[i % len(sessions)]) for i in range(count)]
+    for connection in connections:
+        connection.open(target)
+    await asyncio.gather(*(connection.received.wait() for connection in connections))
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return connections, held
+
+
+async def run(args) -> list:
+    failures = []
+    sessions = [f"push-{i}" for i in range(args.sessions)]
+
+    # Pages log in before they subscribe.
+    for session_id in sessions:
+        mutation_engine.apply(session_id, "login", None)
+
+    # Leave out what this driver allocates for its own bookkeeping.
+    idle, driver = await heap_per_connection(sessions, args.connections, idle_app)
+    for connection in idle:
+        connection.closed.set()
+    await asyncio.gather(*(connection.task for connection in idle))
+    del idle
+
+    connections, held = await heap_per_connection(sessions, args.connections, app)
+    held -= driver
+    print(f"{args.connections} idle streams: {held / 1024 / 1024:.1f} MiB, "
+          f"{held / args.connections:.0f} bytes/connection, {change_feed.stats()}")
+    if len(change_feed) != args.connections:
+        failures.append("not every stream subscribed")
+
+    # A burst of awards on one session reaches each of its streams as one delta.
+    # The first burst after measuring the heap pays for its teardown, so warm up on another session.
+    for quest in QUESTS[:args.burst]:
+        mutation_engine.apply(sessions[1], "complete_quest", quest["id"])
+    await asyncio.sleep(change_feed.coalesce * 4)
+    target = sessions[0]
+    watchers = [c for c in connections if c.session_id == target]
+    seen = {id(connection): len(connection.frames) for connection in watchers}
+    for connection in watchers:
+        connection.received.clear()
+    started = time.perf_counter()
+    for quest in QUESTS[:args.burst]:
+        mutation_engine.apply(target, "complete_quest", quest["id"])
+    await asyncio.gather(*(connection.received.wait() for connection in watchers))
+    latency = (time.perf_counter() - started) * 1000
+    await asyncio.sleep(change_feed.coalesce * 4)
+    deltas = [len(connection.events(seen[id(connection)])) for connection in watchers]
+    print(f"burst of {args.burst} awards -> {max(deltas)} event(s) per stream "
+          f"on {len(watchers)} streams in {latency:.1f} ms (coalesce window {change_feed.coalesce * 1000:.0f} ms)")
+    if max(deltas) != 1:
+        failures.append(f"burst was not coalesced: {deltas}")
+
+    # A stalled consumer keeps nothing queued; it catches up with one delta.
+    slow = Connection("push-slow", stalled=True)
+    slow.open()
+    await slow.received.wait()
+    mutation_engine.apply("push-slow", "select_career", "data_scientist")
+    await asyncio.sleep(change_feed.coalesce * 2)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(args.slow_changes):
+        mutation_engine.apply("push-slow", "select_goal", f"slow_goal_{i}")
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(change_feed.coalesce * 2)
+    gc.collect()
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    slow.received.clear()
+    slow.unstall.set()
+    await slow.received.wait()
+    await asyncio.sleep(change_feed.coalesce * 4)
+    print(f"stalled consumer: {args.slow_changes} changes grew the heap by {growth / 1024:.0f} KiB "
+          f"(session state included), caught up with {len(slow.events(1))} event(s)")
+    # The frame already in flight when the consumer stalled, then one delta for everything since.
+    if len(slow.events(1)) > 2:
+        failures.append("stalled consumer received a backlog instead of a coalesced delta")
+
+    for connection in [*connections, slow]:
+        connection.closed.set()
+    await asyncio.gather(*(connection.task for connection in [*connections, slow]))
+    if len(change_feed):
+        failures.append(f"{len(change_feed)} streams still subscribed after disconnect")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--slow-changes", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
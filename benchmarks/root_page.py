@@ -0,0 +1,64 @@
+"""Bytes on the wire and requests/sec for the page, first visit and repeat visit.
+
+The baseline inlines style.css and script.js into the HTML and sends it
+uncompressed on every load, as the page used to be served.
+
+    python -m benchmarks.root_page --duration 3
+"""
+import argparse
+import asyncio
+import os
+
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+
+from main import ASSETS_DIR, app, assets
+from benchmarks.asgi import call, requests_per_second
+
+
+def inline_page() -> str:
+    with open(os.path.join(ASSETS_DIR, "index.html"), encoding="utf-8") as source:
+        html = source.read()
+    for name, tag in (("style.css", '<link rel="stylesheet" href="{}">'), ("script.js", '<script src="{}"></script>')):
+        with open(os.path.join(ASSETS_DIR, name), encoding="utf-8") as source:
+            inline = "<style>\n{}</style>" if name.endswith(".css") else "<script>\n{}</script>"
+            html = html.replace(tag.format(name), inline.format(source.read()))
+    return html
+
+
+def uncached_app():
+    # The page as it was served: a fresh HTMLResponse per hit, everything inline.
+    baseline = FastAPI()
+    content = inline_page()
+
+    @baseline.get("/")
+    async def read_root():
+        return HTMLResponse(content=content)
+
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    gzip = {"Accept-Encoding": "gzip"}
+    first_visit = [("GET", url, gzip, b"") for url in ["/", *assets.manifest.values()]]
+    # A returning browser revalidates the shell and reuses its immutable assets.
+    _, headers, _ = asyncio.run(call(app, "GET", "/", gzip))
+    repeat_visit = [("GET", "/", {**gzip, "If-None-Match": headers["etag"]}, b"")]
+
+    scenarios = [
+        ("before", uncached_app(), [("GET", "/", gzip, b"")]),
+        ("first visit", app, first_visit),
+        ("repeat visit", app, repeat_visit),
+    ]
+    for name, target, requests in scenarios:
+        rps, size = requests_per_second(target, requests, args.duration)
+        per_visit = rps / len(requests)
+        print(f"{name:<14} {per_visit:9.0f} visits/s  {size * len(requests):8.0f} bytes per visit")
+
+
+if __name__ == "__main__":
+    main()
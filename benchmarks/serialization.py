@@ -0,0 +1,111 @@
+"""UserData response encoding: FastAPI's generic path vs. json_response.
+
+First checks that json_response produces exactly the bytes FastAPI would
+(``jsonable_encoder`` + ``JSONResponse``) for randomized sessions,
+including ids outside the catalogs, non-ASCII text and values of the
+wrong type; exits non-zero on any difference. Then times each path.
+
+    python -m benchmarks.serialization --sessions 2000
+"""
+import argparse
+import random
+import sys
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from main import BADGES, GOALS, QUESTS, new_user_data
+from responses import json_bytes, json_response, orjson
+from state import SessionState
+
+TEXT = ["", "data_scientist", "Инженер данных", 'quote " and \\ backslash', "tab\tnew\nline", "emoji 🚀", " "]
+
+
+def random_state(rng: random.Random) -> SessionState:
+    state = new_user_data()
+    state.level, state.xp, state.coins = rng.randint(1, 50), rng.randint(0, 10**6), rng.randint(0, 2**40)
+    for quest in rng.sample(QUESTS, rng.randint(0, len(QUESTS))):
+        state.add_completed_quest(quest["id"])
+    goals = [goal["id"] for term in GOALS.values() for goal in term]
+    for goal_id in rng.sample(goals, rng.randint(0, len(goals))):
+        state.add_selected_goal(goal_id)
+        if rng.random() < 0.5:
+            state.add_completed_goal(goal_id)
+    for badge in rng.sample(BADGES, rng.randint(0, len(BADGES))):
+        state.add_badge(badge)
+    if rng.random() < 0.3:
+        # Ids the catalogs do not know, kept in SessionState.extras
+        state.add_completed_quest(10**6 + rng.randint(0, 99))
+        state.add_badge(rng.choice(TEXT) or "legacy")
+        state.set_skill_level(rng.choice(TEXT) or "Cobol", rng.randint(0, 300))
+    if rng.random() < 0.05:
+        # Wrong types must still encode the way the generic encoder does
+        state.add_completed_quest("not-an-int")
+        state.set_skill_level("Fortran", 1.5)
+    state.career_path = rng.choice([None, *TEXT])
+    state.last_login = rng.choice(TEXT)
+    return state
+
+
+def fastapi_body(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def response_bodies(states: List[SessionState]) -> List[dict]:
+    """The response shapes that embed a UserData: full, wrapped, delta and batch."""
+    contents = []
+    for state in states:
+        user_data = state.to_dict()
+        contents.append(user_data)
+        contents.append({"success": True, "user_data": user_data})
+        contents.append({"success": True, "version": state.version, "since_version": 0, "changes": {"xp": state.xp},
+                         "added": {"badges": user_data["badges"]}, "removed": {}})
+    contents.append({"results": [{"success": True}, None],
+                     "sessions": {f"s{i}": s.to_dict() for i, s in enumerate(states[:50])}})
+    return contents
+
+
+def count_mismatches(contents: List[dict]) -> int:
+    """Bodies that json_response or json_bytes encode differently from FastAPI."""
+    return sum(
+        json_response(content).body != fastapi_body(content) or json_bytes(content) != fastapi_body(content)
+        for content in contents
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    states = [random_state(rng) for _ in range(args.sessions)]
+    contents = response_bodies(states)
+    mismatches = count_mismatches(contents)
+    print(f"byte-identical check ({'orjson' if orjson else 'stdlib'}): {len(contents)} bodies, {mismatches} mismatches")
+
+    bodies = [{"success": True, "user_data": state.to_dict()} for state in states]
+    paths = [
+        ("jsonable_encoder + JSONResponse", lambda body: JSONResponse(jsonable_encoder(body))),
+        ("json_bytes + Response", lambda body: Response(content=json_bytes(body), media_type="application/json")),
+        (f"json_response ({'orjson' if orjson else 'stdlib'})", json_response),
+    ]
+    for name, encode in paths:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for body in bodies:
+                encode(body)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<32} {elapsed / (args.rounds * len(bodies)) * 1e6:7.1f} us/response")
+    print(f"average body: {sum(len(json_bytes(body)) for body in bodies) / len(bodies):.0f} bytes")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare p99 latency of the plain dict store with the write-behind SessionStore.
+
+Run from the repository root:
+
+    python -m benchmarks.session_store --ops 200000 --sessions 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from main import QUESTS, new_user_data, session_store
+from storage import SessionStore, create_backend
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def write_heavy(get, mark_dirty, ops, sessions, seed):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(ops):
+        session_id = f"bench-{rng.randrange(sessions)}"
+        quest = rng.choice(QUESTS)
+        start = time.perf_counter_ns()
+        user_data = get(session_id)
+        user_data.xp += quest["xp"]
+        user_data.coins += quest["coins"]
+        user_data.total_xp_earned += quest["xp"]
+        user_data.total_coins_earned += quest["coins"]
+        mark_dirty(session_id)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def run_dict(args):
+    store = {}
+
+    def get(session_id):
+        if session_id not in store:
+            store[session_id] = new_user_data()
+        return store[session_id]
+
+    return write_heavy(get, lambda session_id: None, args.ops, args.sessions, args.seed)
+
+
+def run_store(args, path):
+    store = SessionStore(
+        create_backend(args.backend, path),
+        factory=new_user_data,
+        dumps=session_store.dumps,
+        loads=session_store.loads,
+        flush_interval=args.flush_interval,
+        max_entries=args.max_entries,
+    )
+    store.start()
+    try:
+        return write_heavy(store.get, store.mark_dirty, args.ops, args.sessions, args.seed)
+    finally:
+        started = time.perf_counter()
+        store.stop()
+        print(f"  final flush + close: {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(f"  cache: {store.stats()}")
+
+
+def report(name, samples):
+    print(
+        f"{name:<12} p50={percentile(samples, 50) / 1000:8.2f}us "
+        f"p99={percentile(samples, 99) / 1000:8.2f}us "
+        f"max={max(samples) / 1000:10.2f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--backend", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--max-entries", type=int, default=0, help="cache cap; 0 = unbounded")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report("dict", run_dict(args))
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = run_store(args, os.path.join(tmp, "sessions.db"))
+    report(f"store/{args.backend}", samples)
+
+
+if __name__ == "__main__":
+    main()
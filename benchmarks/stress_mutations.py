@@ -0,0 +1,156 @@
+"""Fire thousands of parallel awards at a few sessions and check exact totals.
+
+Exits non-zero if any session's XP, coins, quest count or version differs
+from what the submitted operations must produce. With ``--flush`` the
+background flusher writes sessions to the backend while the awards run, and
+every row it writes must be a consistent state, never a half-applied award.
+
+    python -m benchmarks.stress_mutations --ops 20000 --threads 64
+    python -m benchmarks.stress_mutations --flush --max-entries 4
+    python -m benchmarks.stress_mutations --no-locks   # shows lost updates
+"""
+import argparse
+import contextlib
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import MutationEngine
+from main import GOALS, QUESTS, catalog, new_user_data, rule_set
+from state import SessionState
+from storage import MemoryBackend, SessionStore
+
+
+def build_ops(args):
+    rng = random.Random(args.seed)
+    goal_ids = [g["id"] for category in GOALS.values() for g in category]
+    ops = []
+    for _ in range(args.ops):
+        session_id = f"stress-{rng.randrange(args.sessions)}"
+        if rng.random() < 0.6:
+            ops.append((session_id, "complete_quest", (rng.choice(QUESTS)["id"],)))
+        else:
+            ops.append((session_id, "toggle_goal", (rng.choice(goal_ids), True)))
+    return ops
+
+
+def expected_totals(ops):
+    quests = {q["id"]: q for q in QUESTS}
+    goals = {g["id"]: g for category in GOALS.values() for g in category}
+    seen = {}
+    for session_id, name, args in ops:
+        seen.setdefault(session_id, set()).add((name, args[0]))
+    totals = {}
+    for session_id, items in seen.items():
+        xp = coins = quest_count = 0
+        for name, item_id in items:
+            if name == "complete_quest":
+                xp += quests[item_id]["xp"]
+                coins += quests[item_id]["coins"]
+                quest_count += 1
+            else:
+                xp += goals[item_id]["xp_reward"]
+                coins += goals[item_id]["coins_reward"]
+        totals[session_id] = (xp, coins, quest_count, len(items))
+    return totals
+
+
+class CheckingBackend(MemoryBackend):
+    """Counts written rows whose totals do not match their quests and goals."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows_written = 0
+        self.torn = []
+
+    def save_many(self, rows):
+        rows = list(rows)
+        for session_id, raw in rows:
+            self.rows_written += 1
+            problem = row_problem(json.loads(raw))
+            if problem:
+                self.torn.append((session_id, problem))
+        super().save_many(rows)
+
+
+def row_problem(data):
+    quests = {q["id"]: q for q in QUESTS}
+    goals = {g["id"]: g for category in GOALS.values() for g in category}
+    xp = sum(quests[q]["xp"] for q in data["completed_quests"])
+    xp += sum(goals[g]["xp_reward"] for g in data["completed_goals"])
+    coins = sum(quests[q]["coins"] for q in data["completed_quests"])
+    coins += sum(goals[g]["coins_reward"] for g in data["completed_goals"])
+    expected = (xp, coins, len(data["completed_quests"]), len(data["completed_quests"]) + len(data["completed_goals"]))
+    actual = (data["total_xp_earned"], data["total_coins_earned"], data["total_quests_completed"], data["version"])
+    return None if actual == expected else f"expected {expected}, got {actual}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--max-entries", type=int, default=0, help="cache cap, to stress eviction")
+    parser.add_argument("--no-locks", action="store_true", help="disable the lock stripes")
+    parser.add_argument("--flush", action="store_true", help="run the flusher against a checking backend")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    backend = CheckingBackend() if args.flush else MemoryBackend()
+    codec = {"dumps": lambda state: state, "loads": lambda state: state}
+    if args.flush:
+        codec = {
+            "dumps": lambda state: json.dumps({**state.to_dict(), "version": state.version}),
+            "loads": lambda raw: SessionState.from_dict(json.loads(raw)),
+        }
+    store = SessionStore(
+        backend,
+        factory=new_user_data,
+        **codec,
+        flush_interval=0.0001,
+        batch_size=1,
+        max_entries=args.max_entries,
+    )
+    engine = MutationEngine(store, catalog, rule_set)
+    if args.no_locks:
+        engine._locks = [contextlib.nullcontext()]
+        store.lock_for = None
+
+    ops = build_ops(args)
+    # Switch threads as often as possible to provoke interleavings.
+    sys.setswitchinterval(1e-6)
+    started = time.perf_counter()
+    if args.flush:
+        store.start()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda op: engine.apply(op[0], op[1], *op[2]), ops))
+    elapsed = time.perf_counter() - started
+    if args.flush:
+        store.stop()
+
+    failures = 0
+    for session_id, (xp, coins, quest_count, version) in sorted(expected_totals(ops).items()):
+        state = store.get(session_id)
+        actual = (state.total_xp_earned, state.total_coins_earned, state.total_quests_completed, state.version)
+        if actual != (xp, coins, quest_count, version):
+            failures += 1
+            print(f"MISMATCH {session_id}: expected {(xp, coins, quest_count, version)}, got {actual}")
+        if args.flush:
+            stored = json.loads(backend.load(session_id))
+            if stored["version"] != version:
+                failures += 1
+                print(f"STALE ROW {session_id}: expected version {version}, got {stored['version']}")
+    if args.flush:
+        for session_id, problem in backend.torn[:10]:
+            print(f"TORN ROW {session_id}: {problem}")
+        print(f"{backend.rows_written} rows written by the flusher, {len(backend.torn)} torn")
+        failures += len(backend.torn)
+    print(f"{len(ops)} ops on {args.threads} threads in {elapsed:.2f}s ({len(ops) / elapsed:.0f} ops/s), "
+          f"{failures} mismatching sessions")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Response size and render time for long-tenured users: full user_data vs. deltas.
+
+Every award is rendered both ways; applying each delta to the client's
+previous copy must reproduce the full state, otherwise the run fails.
+
+    python -m benchmarks.user_delta --completed 500
+"""
+import argparse
+import random
+import sys
+import time
+
+from catalog import Catalog
+from engine import MutationEngine
+from main import BADGES, CAREER_PATHS, DEFAULT_SKILLS_PROGRESS, RULES, new_user_data, render_user_data
+from responses import json_bytes
+from rules import RuleSet
+from state import ID_FIELDS, SessionState, StateLayout
+from storage import MemoryBackend, SessionStore
+from benchmarks.session_store import percentile
+
+SKILLS = ["Python", "SQL", "Agile", "React", "Communication", "Presentations"]
+
+
+def apply_delta(user_data: dict, delta: dict) -> dict:
+    """What a client does with a delta response."""
+    result = dict(user_data)
+    result.update(delta["changes"])
+    for field, ids in delta["added"].items():
+        result[field] = result[field] + ids
+    for field, ids in delta["removed"].items():
+        gone = set(ids)
+        result[field] = [key for key in result[field] if key not in gone]
+    return result
+
+
+def same_state(a: dict, b: dict) -> bool:
+    # Id lists are sets; a client appends new ids, the server lists them in catalog order.
+    return all(
+        sorted(map(str, a[field])) == sorted(map(str, b[field])) if field in ID_FIELDS else a[field] == b[field]
+        for field in a
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quests", type=int, default=5000)
+    parser.add_argument("--completed", type=int, default=500)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    quests = [
+        {"id": i, "name": f"Quest {i}", "xp": rng.randint(50, 150), "coins": rng.randint(20, 80),
+         "skill": rng.choice(SKILLS), "type": "practice"}
+        for i in range(1, args.quests + 1)
+    ]
+    goals = {"short_term": [{"id": f"goal_{i}", "name": f"Goal {i}", "xp_reward": 100, "coins_reward": 50,
+                             "category": "progress"} for i in range(1, 501)]}
+    catalog = Catalog(CAREER_PATHS, quests, goals, RULES)
+    SessionState.layout = StateLayout(
+        list(catalog.quest_by_id), list(catalog.goal_by_id), BADGES,
+        [*DEFAULT_SKILLS_PROGRESS, *catalog.skills()],
+    )
+    store = SessionStore(MemoryBackend(), factory=new_user_data, dumps=lambda s: s, loads=lambda s: s)
+    engine = MutationEngine(store, catalog, RuleSet(catalog.rules, catalog, SessionState.layout))
+
+    order = rng.sample(range(1, args.quests + 1), args.quests)
+    for quest_id in order[:args.completed]:
+        engine.apply("veteran", "complete_quest", quest_id)
+    _, client = engine.apply("veteran", "login", None, render=render_user_data(0))
+    version, client = client["version"], client["user_data"]
+
+    full_render, delta_render = render_user_data(None), None
+    full_bytes, delta_bytes, full_ns, delta_ns = [], [], [], []
+    mismatches = 0
+    for i in range(args.ops):
+        if i % 3:
+            name, op_args = "complete_quest", (order[args.completed + i],)
+        else:
+            name, op_args = "toggle_goal", (f"goal_{rng.randint(1, 500)}", bool(rng.getrandbits(1)))
+        delta_render = render_user_data(version)
+        engine.apply("veteran", name, *op_args)
+        state = store.get("veteran")
+
+        start = time.perf_counter_ns()
+        body = json_bytes(full_render(state))
+        full_ns.append(time.perf_counter_ns() - start)
+        full_bytes.append(len(body))
+
+        start = time.perf_counter_ns()
+        rendered = delta_render(state)
+        body = json_bytes(rendered)
+        delta_ns.append(time.perf_counter_ns() - start)
+        delta_bytes.append(len(body))
+
+        if "user_data" in rendered:
+            client = rendered["user_data"]
+        else:
+            client = apply_delta(client, rendered)
+        version = rendered["version"]
+        if not same_state(client, state.to_dict()):
+            mismatches += 1
+
+    for label, sizes, times in (("full", full_bytes, full_ns), ("delta", delta_bytes, delta_ns)):
+        print(f"{label:<6} {sum(sizes) / len(sizes):9.0f} bytes/response  "
+              f"p50 {percentile(times, 50) / 1000:7.1f} us  p99 {percentile(times, 99) / 1000:7.1f} us")
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Measure requests/sec against `python main.py` as the worker count grows.
+
+Each run starts the server with WORKERS=n (shared SQLite session state
+when n > 1) and drives it from several client processes over loopback.
+
+    python -m benchmarks.workers --workers 1 2 4 --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_ready(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def client_thread(port, duration, sessions, seed, counts):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    deadline = time.monotonic() + duration
+    done = 0
+    while time.monotonic() < deadline:
+        session_id = f"w-{rng.randrange(sessions)}"
+        if rng.random() < 0.5:
+            conn.request("GET", f"/api/user?session_id={session_id}")
+        else:
+            body = json.dumps({"quest_id": rng.randint(1, 6)})
+            conn.request(
+                "POST",
+                f"/api/complete_quest?session_id={session_id}",
+                body=body,
+                headers={"Content-Type": "application/json"},
+            )
+        conn.getresponse().read()
+        done += 1
+    counts.append(done)
+
+
+def client_process(port, duration, threads, sessions, seed, queue):
+    counts = []
+    pool = [
+        threading.Thread(target=client_thread, args=(port, duration, sessions, seed * 1000 + i, counts))
+        for i in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    queue.put(sum(counts))
+
+
+def run(workers, args, db_path):
+    env = dict(os.environ, WORKERS=str(workers), PORT=str(args.port), SESSION_DB_PATH=db_path)
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(args.port)
+        queue = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(
+                target=client_process,
+                args=(args.port, args.duration, args.threads, args.sessions, i, queue),
+            )
+            for i in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        total = sum(queue.get() for _ in clients)
+        for client in clients:
+            client.join()
+        return total / args.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="connections per client process")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()}")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            rps = run(workers, args, os.path.join(tmp, "sessions.db"))
+        baseline = baseline or rps
+        print(f"workers={workers:<3} {rps:10.1f} req/s  x{rps / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
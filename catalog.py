@@ -0,0 +1,127 @@
+"""Quest, goal and career-path catalog with id and secondary indexes.
+
+A catalog can be loaded from a JSON file shaped like the API payloads::
+
+    {"career_paths": {...}, "quests": [...], "goals": {"short_term": [...], ...},
+     "rules": [...]}
+
+or from CSV files with one quest or goal per row (goal rows carry a
+``term`` column naming their group). ``rules`` holds the badge and
+level-up rules (see rules.py). Missing parts fall back to the built-in
+demo data. All indexes are built once, at load time.
+"""
+import csv
+import json
+from typing import Dict, List, Optional
+
+QUEST_INT_FIELDS = ("id", "xp", "coins")
+GOAL_INT_FIELDS = ("xp_reward", "coins_reward")
+
+
+class Catalog:
+    def __init__(
+        self,
+        career_paths: Dict[str, dict],
+        quests: List[dict],
+        goals: Dict[str, List[dict]],
+        rules: Optional[List[dict]] = None,
+    ):
+        self.career_paths = career_paths
+        self.quests = quests
+        self.goals = goals
+        self.rules = rules or []
+
+        self.quest_by_id: Dict[int, dict] = {}
+        self.quests_by_skill: Dict[str, List[dict]] = {}
+        self.quests_by_type: Dict[str, List[dict]] = {}
+        for quest in quests:
+            if quest["id"] in self.quest_by_id:
+                raise ValueError(f"Duplicate quest id: {quest['id']}")
+            self.quest_by_id[quest["id"]] = quest
+            self.quests_by_skill.setdefault(quest["skill"], []).append(quest)
+            self.quests_by_type.setdefault(quest["type"], []).append(quest)
+
+        self.goal_by_id: Dict[str, dict] = {}
+        self.goal_term: Dict[str, str] = {}
+        self.goals_by_category: Dict[str, List[dict]] = {}
+        for term, term_goals in goals.items():
+            for goal in term_goals:
+                if goal["id"] in self.goal_by_id:
+                    raise ValueError(f"Duplicate goal id: {goal['id']}")
+                self.goal_by_id[goal["id"]] = goal
+                self.goal_term[goal["id"]] = term
+                self.goals_by_category.setdefault(goal["category"], []).append(goal)
+
+    def quest(self, quest_id: int) -> Optional[dict]:
+        return self.quest_by_id.get(quest_id)
+
+    def goal(self, goal_id: str) -> Optional[dict]:
+        return self.goal_by_id.get(goal_id)
+
+    def find_quests(self, skill: Optional[str] = None, quest_type: Optional[str] = None) -> List[dict]:
+        if skill is None and quest_type is None:
+            return self.quests
+        if skill is None:
+            return self.quests_by_type.get(quest_type, [])
+        by_skill = self.quests_by_skill.get(skill, [])
+        if quest_type is None:
+            return by_skill
+        return [quest for quest in by_skill if quest["type"] == quest_type]
+
+    def find_goals(self, category: Optional[str] = None) -> Dict[str, List[dict]]:
+        if category is None:
+            return self.goals
+        grouped: Dict[str, List[dict]] = {}
+        for goal in self.goals_by_category.get(category, []):
+            grouped.setdefault(self.goal_term[goal["id"]], []).append(goal)
+        return grouped
+
+    def skills(self) -> List[str]:
+        """Every skill named by a career path or a quest, in catalog order."""
+        names = [skill for path in self.career_paths.values() for skill in path["skills"]]
+        names.extend(quest["skill"] for quest in self.quests)
+        return list(dict.fromkeys(names))
+
+
+def _read_csv(path: str, int_fields) -> List[dict]:
+    with open(path, newline="", encoding="utf-8") as source:
+        rows = list(csv.DictReader(source))
+    for row in rows:
+        for field in int_fields:
+            row[field] = int(row[field])
+    return rows
+
+
+def load_quests_csv(path: str) -> List[dict]:
+    return _read_csv(path, QUEST_INT_FIELDS)
+
+
+def load_goals_csv(path: str) -> Dict[str, List[dict]]:
+    goals: Dict[str, List[dict]] = {}
+    for row in _read_csv(path, GOAL_INT_FIELDS):
+        term = row.pop("term", None) or "short_term"
+        goals.setdefault(term, []).append(row)
+    return goals
+
+
+def load_catalog(
+    defaults: Catalog,
+    path: Optional[str] = None,
+    quests_csv: Optional[str] = None,
+    goals_csv: Optional[str] = None,
+) -> Catalog:
+    if not (path or quests_csv or goals_csv):
+        return defaults
+    career_paths, quests, goals, rules = defaults.career_paths, defaults.quests, defaults.goals, defaults.rules
+    if path:
+        with open(path, encoding="utf-8") as source:
+            data = json.load(source)
+        career_paths = data.get("career_paths", career_paths)
+        quests = data.get("quests", quests)
+        goals = data.get("goals", goals)
+        rules = data.get("rules", rules)
+    if quests_csv:
+        quests = load_quests_csv(quests_csv)
+    if goals_csv:
+        goals = load_goals_csv(goals_csv)
+    return Catalog(career_paths, quests, goals, rules)
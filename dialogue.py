@@ -0,0 +1,187 @@
+"""Data-driven replies for the AI assistant.
+
+The dialogue is loaded from a JSON file::
+
+    {"intents": [{"name": "greeting", "patterns": ["hi", "hello"], "response": {...}}, ...],
+     "fallback": {"type": "final_plan", "text": "... {message} ..."}}
+
+A pattern is one or more words and matches whole words only, so ``hi``
+matches "Hi there" but not "this". When several intents match, the one
+listed first wins. A response ``text`` may use ``{message}`` for the user's
+message (literal braces are doubled, as in ``str.format``). An optional
+``"context"`` list names the ``user_data`` fields replies depend on, which
+``ReplyCache`` then includes in its keys.
+
+All patterns are compiled into one trie keyed by word. Matching tokenizes
+the message once and walks the trie from each word, so the cost per
+message depends on its length and the longest pattern, not on how many
+intents there are.
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+WORD = re.compile(r"\w+")
+# Splits after each blank line, keeping it, so the sections join back into the text.
+SECTION_BREAK = re.compile(r"(?<=\n\n)(?=[^\n])")
+# Trie key marking the end of a pattern; never equal to a word.
+_END = None
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+def sections(text: str) -> List[str]:
+    """Split a reply text into paragraphs for streaming; ``"".join`` restores it."""
+    return SECTION_BREAK.split(text)
+
+
+class IntentMatcher:
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        """Build the trie from ``(pattern, priority)`` pairs; lower priority wins."""
+        self._root: dict = {}
+        self.depth = 0
+        for pattern, priority in patterns:
+            words = tokenize(pattern)
+            if not words:
+                raise ValueError(f"Intent pattern has no words: {pattern!r}")
+            node = self._root
+            for word in words:
+                node = node.setdefault(word, {})
+            if node.get(_END, priority) >= priority:
+                node[_END] = priority
+            self.depth = max(self.depth, len(words))
+
+    def match(self, text: str) -> Optional[int]:
+        """The best (lowest) priority of any pattern in ``text``, or None."""
+        tokens = tokenize(text)
+        root = self._root
+        best = None
+        for start in range(len(tokens)):
+            node = root
+            for token in tokens[start:start + self.depth]:
+                node = node.get(token)
+                if node is None:
+                    break
+                priority = node.get(_END)
+                if priority is not None and (best is None or priority < best):
+                    if priority == 0:
+                        return 0
+                    best = priority
+        return best
+
+
+class Dialogue:
+    def __init__(self, intents: List[dict], fallback: dict, context_fields: Iterable[str] = ()):
+        self.names = [intent["name"] for intent in intents]
+        self.responses = [intent["response"] for intent in intents]
+        self.fallback = fallback
+        # user_data fields the replies depend on; cached replies are keyed on their values
+        self.context_fields = tuple(context_fields)
+        self.matcher = IntentMatcher(
+            (pattern, priority) for priority, intent in enumerate(intents) for pattern in intent["patterns"]
+        )
+        # Responses whose text needs the message filled in; the rest are returned as they are.
+        self._templates: Dict[int, str] = {}
+        for response in (*self.responses, fallback):
+            text = response.get("text", "")
+            if text.format(message="") != text:
+                self._templates[id(response)] = text
+
+    def intent(self, message: str) -> Optional[str]:
+        priority = self.matcher.match(message)
+        return None if priority is None else self.names[priority]
+
+    def choose(self, message: str) -> dict:
+        """The reply for ``message`` before ``{message}`` is filled in."""
+        priority = self.matcher.match(message)
+        return self.fallback if priority is None else self.responses[priority]
+
+    def render(self, response: dict, message: str) -> dict:
+        template = self._templates.get(id(response))
+        if template is None:
+            return response
+        return {**response, "text": template.format(message=message)}
+
+    def respond(self, message: str) -> dict:
+        """The reply to ``message``. Shared between calls: treat it as read-only."""
+        return self.render(self.choose(message), message)
+
+    def options(self) -> List[str]:
+        """Every option the replies offer, i.e. the messages clients send most."""
+        seen = {}
+        for response in (*self.responses, self.fallback):
+            for option in response.get("options", ()):
+                seen.setdefault(option)
+        return list(seen)
+
+
+class ReplyCache:
+    """Bounded LRU of replies keyed by normalized message and user context.
+
+    Messages that tokenize the same share an entry, so "Hi!" and "hi" only
+    choose a reply once. A cached reply whose text quotes the message is
+    re-rendered when the wording differs. Prerendered messages are pinned
+    and never evicted.
+    """
+
+    def __init__(self, dialogue: Dialogue, max_entries: int = 10000):
+        self.dialogue = dialogue
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[dict, str, dict]]" = OrderedDict()
+        self._pinned: Dict[Hashable, Tuple[dict, str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _entry(self, message: str) -> Tuple[dict, str, dict]:
+        response = self.dialogue.choose(message)
+        return response, message, self.dialogue.render(response, message)
+
+    def prerender(self, messages: Iterable[str], context: Hashable = ()):
+        for message in messages:
+            self._pinned[(" ".join(tokenize(message)), context)] = self._entry(message)
+
+    def respond(self, message: str, context: Hashable = ()) -> dict:
+        key = (" ".join(tokenize(message)), context)
+        with self._lock:
+            entry = self._pinned.get(key)
+            if entry is None:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            entry = self._entry(message)
+            if self.max_entries:
+                with self._lock:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        response, rendered_for, rendered = entry
+        if rendered is response or rendered_for == message:
+            return rendered
+        return self.dialogue.render(response, message)
+
+
+def load_dialogue(path: str) -> Dialogue:
+    with open(path, encoding="utf-8") as source:
+        data = json.load(source)
+    return Dialogue(data.get("intents", []), data["fallback"], data.get("context", ()))
@@ -0,0 +1,212 @@
+"""Mutation engine: every award is applied to a session as one atomic step.
+
+Operations are plain functions registered by name in ``OPERATIONS``. They
+mutate a ``SessionState`` and return ``True`` when something changed.
+``MutationEngine.apply`` runs an operation while holding the session's lock
+stripe and the store transaction, bumps the session version on change and
+renders the response from the same consistent state. An operation that
+raises leaves the session as it was before it started. Sessions that
+track history remember the version before and after each change, so
+responses can carry deltas, and committed changes are published to the
+optional change feed and passed to read-side indexes (the leaderboard,
+analytics).
+"""
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+OPERATIONS: Dict[str, Callable[..., bool]] = {}
+
+
+def operation(name: str):
+    def register(func):
+        OPERATIONS[name] = func
+        return func
+    return register
+
+
+class MutationEngine:
+    """Applies operations under striped per-session locks.
+
+    A session always maps to the same lock, so concurrent requests for one
+    session are serialized while different sessions rarely share a stripe.
+    """
+
+    def __init__(self, store, catalog, rules, stripes: int = 64, ledger=None, feed=None, indexes=()):
+        self.store = store
+        self.catalog = catalog
+        self.rules = rules
+        self.ledger = ledger
+        self.feed = feed
+        # Each has update(session_id, state), called with the state of every committed change
+        self.indexes = tuple(indexes)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        # The store serializes sessions under the same locks, never mid-mutation
+        store.lock_for = self.lock_for
+
+    def lock_for(self, session_id: str) -> threading.Lock:
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    def apply(self, session_id: str, name: str, *args, render: Optional[Callable] = None):
+        """Run one operation atomically; return ``(changed, render(state))``."""
+        func = OPERATIONS[name]
+        with self.lock_for(session_id):
+            with self.store.transaction(session_id) as state:
+                state.remember()
+                saved, version = state.snapshot(), state.version
+                indexed = []
+                try:
+                    changed = func(self, state, *args)
+                    if changed:
+                        state.version += 1
+                        state.remember()
+                        if self.ledger is not None:
+                            record = self.ledger.record(session_id, state.version, name, args, state)
+                        for index in self.indexes:
+                            indexed.append(index)
+                            index.update(session_id, state)
+                except Exception:
+                    # Nothing half-applied may be cached, written back or left in an index
+                    state.restore(saved, version)
+                    for index in indexed:
+                        index.update(session_id, state)
+                    raise
+                if changed and self.ledger is not None:
+                    self.ledger.extend((record,))
+                result = changed, render(state) if render is not None else None
+            if changed and self.feed is not None:
+                self.feed.publish(session_id)
+            return result
+
+    def apply_many(self, session_id: str, operations: List[tuple], render: Optional[Callable] = None):
+        """Run ``(name, args)`` operations in order under one lock acquisition.
+
+        Returns ``([changed, ...], render(final state))``. If any operation
+        raises, none of them take effect.
+        """
+        funcs = [OPERATIONS[name] for name, _ in operations]
+        results = []
+        records = []
+        with self.lock_for(session_id):
+            with self.store.transaction(session_id) as state:
+                state.remember()
+                saved, version = state.snapshot(), state.version
+                indexed = []
+                try:
+                    for func, (name, args) in zip(funcs, operations):
+                        changed = func(self, state, *args)
+                        if changed:
+                            state.version += 1
+                            state.remember()
+                            if self.ledger is not None:
+                                # Built now so snapshots hold this version; queued once all succeed
+                                records.append(self.ledger.record(session_id, state.version, name, args, state))
+                        results.append(changed)
+                    if any(results):
+                        for index in self.indexes:
+                            indexed.append(index)
+                            index.update(session_id, state)
+                except Exception:
+                    state.restore(saved, version)
+                    for index in indexed:
+                        index.update(session_id, state)
+                    raise
+                if records:
+                    self.ledger.extend(records)
+                rendered = render(state) if render is not None else None
+            if any(results) and self.feed is not None:
+                self.feed.publish(session_id)
+            return results, rendered
+
+    def read(self, session_id: str, render: Callable):
+        """Render the session's current state under its lock, without changing it."""
+        with self.lock_for(session_id):
+            state = self.store.get(session_id)
+            rendered = render(state)
+            self.store.keep_history(session_id, state)
+            return rendered
+
+
+def update_daily_streak(user_data, now: Optional[datetime] = None):
+    now = now or datetime.now()
+    if user_data.last_login:
+        try:
+            last_login = datetime.fromisoformat(user_data.last_login)
+            if (now.date() - last_login.date()).days == 1:
+                user_data.daily_streak += 1
+            elif (now.date() - last_login.date()).days > 1:
+                user_data.daily_streak = 1
+        except:
+            user_data.daily_streak = 1
+    user_data.last_login = now.isoformat()
+
+
+@operation("login")
+def login(engine: MutationEngine, user_data, now: Optional[str] = None) -> bool:
+    # The ledger records the timestamp so that replay is deterministic.
+    update_daily_streak(user_data, datetime.fromisoformat(now) if now else None)
+    return True
+
+
+@operation("complete_quest")
+def complete_quest(engine: MutationEngine, user_data, quest_id: int) -> bool:
+    if user_data.has_completed_quest(quest_id):
+        return False
+    quest_data = engine.catalog.quest(quest_id)
+    if not quest_data:
+        return False
+
+    user_data.xp += quest_data["xp"]
+    user_data.coins += quest_data["coins"]
+    user_data.add_completed_quest(quest_id)
+    user_data.total_quests_completed += 1
+    user_data.total_xp_earned += quest_data["xp"]
+    user_data.total_coins_earned += quest_data["coins"]
+
+    # Level-up and badge rules
+    engine.rules.apply(user_data, ("quest_completed", "completed_quests", "xp", "coins"))
+    return True
+
+
+@operation("select_career")
+def select_career(engine: MutationEngine, user_data, career_path: str) -> bool:
+    changed = user_data.career_path != career_path
+    user_data.career_path = career_path
+    fired = engine.rules.apply(user_data, ("career_selected", "career_path"))
+    return changed or fired
+
+
+@operation("select_goal")
+def select_goal(engine: MutationEngine, user_data, goal_id: str) -> bool:
+    if not user_data.add_selected_goal(goal_id):
+        return False
+    engine.rules.apply(user_data, ("selected_goals",))
+    return True
+
+
+@operation("toggle_goal")
+def toggle_goal(engine: MutationEngine, user_data, goal_id: str, completed: bool) -> bool:
+    if not completed:
+        if not user_data.discard_completed_goal(goal_id):
+            return False
+        engine.rules.apply(user_data, ("completed_goals",))
+        return True
+    if not user_data.add_completed_goal(goal_id):
+        return False
+
+    # Find goal reward
+    g = engine.catalog.goal(goal_id)
+    if g:
+        user_data.xp += g["xp_reward"]
+        user_data.coins += g["coins_reward"]
+        user_data.total_xp_earned += g["xp_reward"]
+        user_data.total_coins_earned += g["coins_reward"]
+        engine.rules.apply(user_data, ("goal_rewarded", "completed_goals", "xp", "coins"))
+    else:
+        engine.rules.apply(user_data, ("completed_goals",))
+    return True
+
+
+@operation("ai_chat_bonus")
+def ai_chat_bonus(engine: MutationEngine, user_data) -> bool:
+    return engine.rules.apply(user_data, ("ai_chat",))
@@ -0,0 +1,230 @@
+"""Bounded background jobs for work that must not run on the event loop.
+
+``JobQueue.submit`` hands a call to a pool of ``workers`` threads and
+returns its ``Job`` at once. At most ``max_pending`` jobs may be queued or
+running; past that ``submit`` raises ``QueueFull``, so callers shed load
+instead of letting latency grow without bound. Submitting a key that is
+still queued or running returns the existing job rather than a new one.
+A job's slot is freed once its future settles, whether it ran or was
+cancelled before it could; callers waiting on a shared job should shield
+the future so giving up on it does not cancel it for everyone else.
+Finished jobs stay readable by id until ``keep_finished`` newer ones have
+finished.
+
+Jobs live in the process that runs them. With a ``SharedJobBoard`` each
+status change is also written to a SQLite table, so ``JobQueue.status``
+answers for jobs that another worker process owns.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "key", "status", "result", "error", "created", "started", "finished", "future")
+
+    def __init__(self, key: Hashable):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error: Optional[str] = None
+        self.created = time.monotonic()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> dict:
+        data = {"job_id": self.id, "status": self.status}
+        if self.started is not None:
+            data["queued_ms"] = round((self.started - self.created) * 1000, 1)
+        if self.finished is not None:
+            data["run_ms"] = round((self.finished - self.started) * 1000, 1)
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+# Status changes may reach the board out of order; a later stage never gives way to an earlier one.
+STAGES = {"queued": 0, "running": 1, "done": 2, "failed": 2, "cancelled": 2}
+
+
+class SharedJobBoard:
+    """Job statuses in a SQLite file that every worker process can read."""
+
+    def __init__(self, path: str, keep_finished: int = 10000, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.keep_finished = keep_finished
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._finished = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_jobs ("
+                "job_id TEXT PRIMARY KEY, stage INTEGER NOT NULL, data TEXT NOT NULL, finished REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ai_jobs_finished ON ai_jobs (finished)")
+            self._conn = conn
+        return self._conn
+
+    def publish(self, job: Job):
+        stage = STAGES[job.status]
+        finished = time.time() if stage == 2 else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO ai_jobs (job_id, stage, data, finished) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET stage = excluded.stage, data = excluded.data, "
+                "finished = excluded.finished WHERE excluded.stage >= ai_jobs.stage",
+                (job.id, stage, json.dumps(job.to_dict()), finished),
+            )
+            if finished is not None:
+                self._finished += 1
+                # Pruning walks keep_finished index entries, so it is done every hundredth finish
+                if self._finished % 100 == 0:
+                    conn.execute(
+                        "DELETE FROM ai_jobs WHERE finished < (SELECT finished FROM ai_jobs "
+                        "WHERE finished IS NOT NULL ORDER BY finished DESC LIMIT 1 OFFSET ?)",
+                        (self.keep_finished,),
+                    )
+
+    def lookup(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT data FROM ai_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 64,
+        keep_finished: int = 10000,
+        board: Optional[SharedJobBoard] = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.board = board
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+        self.publish_errors = 0
+        self._active: Dict[Hashable, Job] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(job.status == "running" for job in self._active.values())
+            return {
+                "workers": self.workers,
+                "queued": len(self._active) - running,
+                "running": running,
+                "finished": len(self._finished),
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "publish_errors": self.publish_errors,
+            }
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> Tuple[Job, bool]:
+        """Queue ``fn(*args)``; return the job and whether it is a new one."""
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job, False
+            if len(self._active) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{len(self._active)} jobs pending")
+            job = Job(key)
+            self._active[key] = job
+            self._jobs[job.id] = job
+            self.submitted += 1
+            # Under the lock, so a duplicate submit never sees a job without its future
+            job.future = self._executor.submit(self._run, job, fn, args)
+        # The slot is freed when the future settles, including when it is cancelled before it runs
+        job.future.add_done_callback(lambda future: self._release(job, future))
+        self._publish(job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """The job's ``to_dict()``, read from the board when another process owns it."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.board.lookup(job_id) if self.board is not None else None
+
+    def _publish(self, job: Job):
+        if self.board is None:
+            return
+        try:
+            self.board.publish(job)
+        except Exception:
+            # The job itself is unaffected; only other processes see its status late
+            self.publish_errors += 1
+
+    def _run(self, job: Job, fn: Callable, args: tuple):
+        job.started = time.monotonic()
+        job.status = "running"
+        self._publish(job)
+        try:
+            job.result = fn(*args)
+            job.status = "done"
+            return job.result
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            raise
+        finally:
+            job.finished = time.monotonic()
+            self._publish(job)
+
+    def _release(self, job: Job, future: Future):
+        if future.cancelled():
+            job.status = "cancelled"
+            self._publish(job)
+        with self._lock:
+            self.failed += job.status == "failed"
+            del self._active[job.key]
+            self._finished[job.id] = job
+            while len(self._finished) > self.keep_finished:
+                expired, _ = self._finished.popitem(last=False)
+                del self._jobs[expired]
+
+    def shutdown(self):
+        """Drop queued jobs and wait for running ones, whose side effects must land."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.board is not None:
+            self.board.close()
@@ -0,0 +1,160 @@
+"""Incrementally maintained rankings of sessions by score.
+
+Each ranked metric is a ``RankIndex``: a Fenwick tree counting members per
+score bucket, plus the members of each bucket. Buckets are exact below
+``EXACT`` and log-linear above it (``PRECISION`` significant bits, as in
+HdrHistogram), so a fixed tree of about 110k counters covers any 64-bit
+score. Moving a member and counting the members above a score are
+O(log buckets). The occupied buckets are also kept in a sorted list, which
+only changes when a bucket empties or fills, so top-K walks down from the
+highest bucket and only sorts the few distinct scores that share one.
+
+Members with equal scores share a rank (1 + how many score higher) and are
+listed in the order they reached that score.
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PRECISION = 12
+EXACT = 1 << PRECISION
+HALF = EXACT >> 1
+MAX_SHIFT = 64 - PRECISION
+SIZE = EXACT + MAX_SHIFT * HALF
+
+
+def bucket_of(score: int) -> int:
+    if score < EXACT:
+        return max(score, 0)
+    shift = score.bit_length() - PRECISION
+    if shift > MAX_SHIFT:
+        return SIZE - 1
+    return EXACT + (shift - 1) * HALF + (score >> shift) - HALF
+
+
+class RankIndex:
+    def __init__(self):
+        self.scores: Dict[str, int] = {}
+        self._tree = [0] * (SIZE + 1)
+        # bucket -> score -> members (a dict used as an insertion-ordered set)
+        self._buckets: Dict[int, Dict[int, Dict[str, None]]] = {}
+        self._occupied: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _add(self, bucket: int, delta: int):
+        tree = self._tree
+        i = bucket + 1
+        while i <= SIZE:
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        """Members in buckets ``0..bucket``."""
+        tree = self._tree
+        total = 0
+        i = bucket + 1
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, member: str, score: int):
+        old = self.scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._remove(member, old)
+        self.scores[member] = score
+        bucket = bucket_of(score)
+        by_score = self._buckets.get(bucket)
+        if by_score is None:
+            by_score = self._buckets[bucket] = {}
+            bisect.insort(self._occupied, bucket)
+        by_score.setdefault(score, {})[member] = None
+        self._add(bucket, 1)
+
+    def discard(self, member: str):
+        old = self.scores.pop(member, None)
+        if old is not None:
+            self._remove(member, old)
+
+    def _remove(self, member: str, score: int):
+        bucket = bucket_of(score)
+        by_score = self._buckets[bucket]
+        members = by_score[score]
+        del members[member]
+        if not members:
+            del by_score[score]
+            if not by_score:
+                del self._buckets[bucket]
+                del self._occupied[bisect.bisect_left(self._occupied, bucket)]
+        self._add(bucket, -1)
+
+    def count_above(self, score: int) -> int:
+        bucket = bucket_of(score)
+        above = len(self.scores) - self._prefix(bucket)
+        for other, members in self._buckets.get(bucket, {}).items():
+            if other > score:
+                above += len(members)
+        return above
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self.scores.get(member)
+        return None if score is None else self.count_above(score) + 1
+
+    def top(self, k: int) -> List[Tuple[int, str, int]]:
+        """``(rank, member, score)`` for the ``k`` highest scores."""
+        result = []
+        seen = 0
+        for bucket in reversed(self._occupied):
+            by_score = self._buckets[bucket]
+            for score in sorted(by_score, reverse=True):
+                rank = seen + 1
+                for member in by_score[score]:
+                    result.append((rank, member, score))
+                    if len(result) == k:
+                        return result
+                seen += len(by_score[score])
+        return result
+
+
+class Leaderboard:
+    """One ``RankIndex`` per metric, all updated together from a session's state."""
+
+    def __init__(self, metrics: Iterable[str]):
+        self.metrics = tuple(metrics)
+        self._indexes = {metric: RankIndex() for metric in self.metrics}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._indexes[self.metrics[0]]) if self.metrics else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"members": len(self), "metrics": len(self.metrics)}
+
+    def update(self, member: str, state):
+        with self._lock:
+            for metric, index in self._indexes.items():
+                index.set(member, getattr(state, metric))
+
+    def add_stored(self, member: str, state):
+        """Add a session read from storage unless a live change already ranked a newer copy."""
+        with self._lock:
+            if self.metrics and member in self._indexes[self.metrics[0]].scores:
+                return
+            for metric, index in self._indexes.items():
+                index.set(member, getattr(state, metric))
+
+    def top(self, metric: str, k: int) -> Tuple[int, List[Tuple[int, str, int]]]:
+        """The number of ranked members and the top ``k`` of them."""
+        index = self._indexes[metric]
+        with self._lock:
+            return len(index), index.top(k)
+
+    def position(self, metric: str, score: int) -> Tuple[int, int]:
+        """The rank ``score`` has and the number of ranked members."""
+        index = self._indexes[metric]
+        with self._lock:
+            return index.count_above(score) + 1, len(index)
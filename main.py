@@ -1,10 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import hmac
+import json
 import os
+import signal
+import threading
+import time
+
+from analytics import NUMERIC_FIELDS, Cohort
+from assets import IMMUTABLE_CACHE_CONTROL, AssetPipeline
+from catalog import Catalog, load_catalog
+from dialogue import ReplyCache, load_dialogue, sections
+from engine import MutationEngine
+from jobs import Job, JobQueue, QueueFull, SharedJobBoard
+from leaderboard import Leaderboard
+from ledger import Ledger
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LoopLag, Registry, RequestMetrics
+from profiler import Profiler, SampledRequests
+from push import ChangeFeed, EventStreamResponse, encode_frame
+from responses import EncodedPayload, PayloadCache, json_response, respond
+from rules import RuleSet
+from state import SessionState, StateLayout
+from storage import SessionStore, SharedSessionStore, create_backend
 
 app = FastAPI(title="Career Autopilot", version="1.0.0")
 
@@ -17,7 +40,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sampling profiler, off until switched on through /api/admin/profiler or SIGUSR2
+profiler = Profiler(
+    os.getenv("PROFILE_DIR", "profiles"),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0.1")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000,
+)
+app.add_middleware(SampledRequests, profiler=profiler)
+# Admin endpoints are only served when a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Per-route request counters and latency histograms, scraped from /metrics
+loop_lag = LoopLag(interval=float(os.getenv("METRICS_LAG_INTERVAL_MS", "500")) / 1000)
+metrics_registry = Registry(lag=loop_lag)
+app.add_middleware(RequestMetrics, registry=metrics_registry)
+
 # Data models
+# UserData is the public JSON shape of a session; sessions are stored as state.SessionState
 class UserData(BaseModel):
     level: int = 1
     xp: int = 0
@@ -47,6 +86,23 @@ class AIChatMessage(BaseModel):
 class CareerPathSelect(BaseModel):
     career_path: str
 
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None
+    route_rates: Optional[Dict[str, float]] = None
+    interval_ms: Optional[float] = None
+
+class BatchOperation(BaseModel):
+    op: str
+    session_id: Optional[str] = None
+    quest_id: Optional[int] = None
+    goal_id: Optional[str] = None
+    completed: Optional[bool] = None
+    career_path: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
 # Demo data
 CAREER_PATHS = {
     "Data Scientist": {
@@ -92,1353 +148,581 @@ GOALS = {
     ]
 }
 
-# Global user data storage
-user_data_store = {}
-
-def get_user_data(session_id: str = "default") -> UserData:
-    if session_id not in user_data_store:
-        user_data_store[session_id] = UserData(
-            skills_progress={
-                'Python': 65,
-                'SQL': 40,
-                'Machine Learning': 25,
-                'Communication': 70,
-                'Project Management': 35
-            },
-            last_login=datetime.now().isoformat()
-        )
-    return user_data_store[session_id]
-
-def update_daily_streak(user_data: UserData):
-    now = datetime.now()
-    if user_data.last_login:
-        try:
-            last_login = datetime.fromisoformat(user_data.last_login)
-            if (now.date() - last_login.date()).days == 1:
-                user_data.daily_streak += 1
-            elif (now.date() - last_login.date()).days > 1:
-                user_data.daily_streak = 1
-        except:
-            user_data.daily_streak = 1
-    user_data.last_login = now.isoformat()
-
-def ai_assistant_response(message: str, user_data: UserData) -> dict:
-    message_lower = message.lower()
-
-    if any(word in message_lower for word in ['hi', 'hello', 'hey']):
-        return {
-            "type": "question",
-            "text": "Hello! I'm your AI career assistant. Let's create your personal development plan. What career goal do you want to achieve in the next year?",
-            "options": [
-                "I want to become a Team Lead",
-                "I plan to switch to Data Science",
-                "I want promotion to Senior Developer",
-                "I'm interested in Product Management"
-            ]
-        }
-    elif "team lead" in message_lower:
-        return {
-            "type": "question",
-            "text": "Excellent! How many years of experience do you have in development?",
-            "options": [
-                "Less than 1 year",
-                "1-3 years",
-                "3-5 years",
-                "More than 5 years"
-            ]
-        }
-    elif "data science" in message_lower:
-        return {
-            "type": "question",
-            "text": "Great choice! What's your current experience in data analysis?",
-            "options": [
-                "Beginner, just starting",
-                "Have basic Python/SQL knowledge",
-                "Already worked with data in current role",
-                "Experienced in related field"
-            ]
-        }
-    else:
-        return {
-            "type": "final_plan",
-            "text": f"""
-🎯 **Your Career Development Plan:**
-
-Based on your interest in **{message}**, here's your personalized plan:
-
-**First Month: Foundation**
-• Complete core skill assessments
-• Identify knowledge gaps
-• Set specific milestones
-
-**Months 2-3: Skill Building**
-• Focused learning path
-• Practical projects
-• Mentor sessions
-
-**Months 4-6: Real-world Application**
-• Internal projects
-• Cross-team collaboration
-• Portfolio development
-
-🏆 **You earned:**
-• 150 career coins
-• 75 XP
-• Goal Setter badge 🎯
-
-Ready to begin your journey?
-            """
-        }
-
-# HTML frontend
-HTML_CONTENT = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Career Cosmos - Career Autopilot</title>
-    <style>
-        :root {
-            --space-black: #0A0A14;
-            --cosmic-purple: #6366F1;
-            --nebula-blue: #3B82F6;
-            --starlight-white: #F8FAFC;
-            --comet-cyan: #06B6D4;
-            --galaxy-gray: #1E293B;
-            --orbit-silver: #64748B;
-            --supernova-orange: #F59E0B;
-            --quantum-green: #10B981;
-        }
-
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            background: var(--space-black);
-            color: var(--starlight-white);
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            min-height: 100vh;
-            overflow-x: hidden;
-        }
-
-        /* Cosmic Background */
-        .cosmic-bg {
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            z-index: -1;
-            background:
-                radial-gradient(ellipse at 20% 50%, rgba(99, 102, 241, 0.1) 0%, transparent 50%),
-                radial-gradient(ellipse at 80% 20%, rgba(59, 130, 246, 0.1) 0%, transparent 50%),
-                radial-gradient(ellipse at 40% 80%, rgba(6, 182, 212, 0.05) 0%, transparent 50%);
-        }
-
-        .star {
-            position: absolute;
-            background: white;
-            border-radius: 50%;
-            animation: twinkle 4s infinite;
-        }
-
-        .star:nth-child(1) { top: 20%; left: 10%; width: 2px; height: 2px; animation-delay: 0s; }
-        .star:nth-child(2) { top: 60%; left: 80%; width: 3px; height: 3px; animation-delay: 1s; }
-        .star:nth-child(3) { top: 80%; left: 30%; width: 1px; height: 1px; animation-delay: 2s; }
-
-        @keyframes twinkle {
-            0%, 100% { opacity: 0.3; transform: scale(1); }
-            50% { opacity: 1; transform: scale(1.2); }
-        }
-
-        /* App Container */
-        .app-container {
-            display: flex;
-            min-height: 100vh;
-        }
-
-        /* Cosmic Navigation */
-        .cosmic-nav {
-            width: 280px;
-            background: rgba(10, 10, 20, 0.8);
-            backdrop-filter: blur(20px);
-            border-right: 1px solid rgba(99, 102, 241, 0.2);
-            padding: 30px 20px;
-            display: flex;
-            flex-direction: column;
-            position: relative;
-            overflow: hidden;
-        }
-
-        .cosmic-nav::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            height: 1px;
-            background: linear-gradient(90deg, transparent, var(--cosmic-purple), transparent);
-        }
-
-        .nav-brand {
-            text-align: center;
-            margin-bottom: 40px;
-        }
-
-        .logo-orb {
-            width: 60px;
-            height: 60px;
-            background: linear-gradient(135deg, var(--cosmic-purple), var(--nebula-blue));
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            margin: 0 auto 15px;
-            font-size: 24px;
-            box-shadow: 0 0 30px rgba(99, 102, 241, 0.4);
-            animation: float 6s ease-in-out infinite;
-        }
-
-        @keyframes float {
-            0%, 100% { transform: translateY(0px); }
-            50% { transform: translateY(-10px); }
-        }
-
-        .nav-brand h1 {
-            font-size: 24px;
-            font-weight: 700;
-            background: linear-gradient(135deg, var(--starlight-white), var(--comet-cyan));
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            margin-bottom: 5px;
-        }
-
-        .tagline {
-            font-size: 12px;
-            color: var(--orbit-silver);
-            font-weight: 300;
-        }
-
-        /* User Orb */
-        .user-orb {
-            text-align: center;
-            margin-bottom: 40px;
-            position: relative;
-        }
-
-        .user-avatar {
-            position: relative;
-            width: 100px;
-            height: 100px;
-            margin: 0 auto 15px;
-        }
-
-        .orbit {
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            border: 1px solid rgba(99, 102, 241, 0.3);
-            border-radius: 50%;
-            animation: spin 20s linear infinite;
-        }
-
-        .satellite {
-            position: absolute;
-            top: -5px;
-            left: 50%;
-            width: 10px;
-            height: 10px;
-            background: var(--comet-cyan);
-            border-radius: 50%;
-            transform: translateX(-50%);
-        }
-
-        .user-core {
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            width: 60px;
-            height: 60px;
-            background: linear-gradient(135deg, var(--galaxy-gray), var(--space-black));
-            border: 2px solid var(--cosmic-purple);
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 20px;
-            box-shadow: 0 0 20px rgba(99, 102, 241, 0.3);
-        }
-
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-
-        .level-badge {
-            background: linear-gradient(135deg, var(--cosmic-purple), var(--nebula-blue));
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 14px;
-            font-weight: 600;
-            display: inline-block;
-            margin-bottom: 8px;
-        }
-
-        .xp-display {
-            font-size: 12px;
-            color: var(--orbit-silver);
-        }
-
-        /* Navigation Constellation */
-        .nav-constellation {
-            flex-grow: 1;
-            display: flex;
-            flex-direction: column;
-            gap: 8px;
-        }
-
-        .nav-star {
-            display: flex;
-            align-items: center;
-            padding: 15px 20px;
-            border-radius: 12px;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-            background: rgba(30, 41, 59, 0.3);
-            border: 1px solid transparent;
-        }
-
-        .nav-star:hover {
-            background: rgba(99, 102, 241, 0.1);
-            border-color: rgba(99, 102, 241, 0.3);
-            transform: translateX(5px);
-        }
-
-        .nav-star.active {
-            background: rgba(99, 102, 241, 0.15);
-            border-color: var(--cosmic-purple);
-            box-shadow: 0 0 20px rgba(99, 102, 241, 0.2);
-        }
-
-        .star-icon {
-            font-size: 20px;
-            margin-right: 12px;
-            width: 24px;
-            text-align: center;
-        }
-
-        .nav-star span {
-            font-weight: 500;
-            font-size: 14px;
-        }
-
-        .star-trail {
-            position: absolute;
-            top: 50%;
-            right: 20px;
-            width: 6px;
-            height: 6px;
-            background: var(--cosmic-purple);
-            border-radius: 50%;
-            transform: translateY(-50%);
-            opacity: 0;
-            transition: opacity 0.3s ease;
-        }
-
-        .nav-star.active .star-trail {
-            opacity: 1;
-            animation: pulse 2s infinite;
-        }
-
-        @keyframes pulse {
-            0%, 100% { opacity: 1; transform: translateY(-50%) scale(1); }
-            50% { opacity: 0.5; transform: translateY(-50%) scale(1.5); }
-        }
-
-        /* Cosmic Stats */
-        .cosmic-stats {
-            margin-top: auto;
-            display: flex;
-            flex-direction: column;
-            gap: 20px;
-        }
-
-        .stat-comet {
-            text-align: center;
-            position: relative;
-            padding: 15px;
-            background: rgba(30, 41, 59, 0.5);
-            border-radius: 12px;
-            border: 1px solid rgba(99, 102, 241, 0.2);
-        }
-
-        .comet-head {
-            width: 20px;
-            height: 20px;
-            background: linear-gradient(135deg, var(--supernova-orange), var(--comet-cyan));
-            border-radius: 50%;
-            margin: 0 auto 10px;
-            position: relative;
-        }
-
-        .comet-head::after {
-            content: '';
-            position: absolute;
-            top: 50%;
-            right: -30px;
-            width: 30px;
-            height: 2px;
-            background: linear-gradient(90deg, var(--supernova-orange), transparent);
-            transform: translateY(-50%);
-        }
-
-        .comet-value {
-            font-size: 24px;
-            font-weight: 700;
-            color: var(--starlight-white);
-            margin-bottom: 5px;
-        }
-
-        .comet-label {
-            font-size: 12px;
-            color: var(--orbit-silver);
-        }
-
-        .progress-ring {
-            position: relative;
-            width: 80px;
-            height: 80px;
-            margin: 0 auto;
-        }
-
-        .ring-back {
-            fill: none;
-            stroke: var(--galaxy-gray);
-            stroke-width: 3;
-        }
-
-        .ring-front {
-            fill: none;
-            stroke: var(--cosmic-purple);
-            stroke-width: 3;
-            stroke-linecap: round;
-            transform: rotate(-90deg);
-            transform-origin: 50% 50%;
-            transition: stroke-dasharray 0.3s ease;
-        }
-
-        .ring-text {
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            font-size: 12px;
-            font-weight: 600;
-            color: var(--starlight-white);
-        }
-
-        /* Main Content */
-        .cosmic-main {
-            flex: 1;
-            padding: 30px;
-            overflow-y: auto;
-        }
-
-        .mission-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 40px;
-            padding-bottom: 20px;
-            border-bottom: 1px solid rgba(99, 102, 241, 0.2);
-        }
-
-        .header-orbit h2 {
-            font-size: 32px;
-            font-weight: 700;
-            background: linear-gradient(135deg, var(--starlight-white), var(--comet-cyan));
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-        }
-
-        .mission-time {
-            font-size: 14px;
-            color: var(--orbit-silver);
-            margin-top: 5px;
-        }
-
-        .signal-bars {
-            display: flex;
-            align-items: end;
-            gap: 3px;
-            height: 20px;
-        }
-
-        .bar {
-            width: 4px;
-            background: var(--quantum-green);
-            border-radius: 2px;
-            animation: signal 2s infinite;
-        }
-
-        .bar:nth-child(1) { height: 6px; animation-delay: 0s; }
-        .bar:nth-child(2) { height: 10px; animation-delay: 0.2s; }
-        .bar:nth-child(3) { height: 14px; animation-delay: 0.4s; }
-        .bar:nth-child(4) { height: 18px; animation-delay: 0.6s; }
-
-        @keyframes signal {
-            0%, 100% { opacity: 0.3; }
-            50% { opacity: 1; }
-        }
-
-        /* Cosmic Sections */
-        .cosmic-section {
-            display: none;
-        }
-
-        .cosmic-section.active {
-            display: block;
-        }
-
-        /* Constellation Grid */
-        .constellation-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 25px;
-        }
-
-        .constellation-node {
-            background: rgba(30, 41, 59, 0.6);
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(99, 102, 241, 0.2);
-            border-radius: 20px;
-            padding: 25px;
-            position: relative;
-            overflow: hidden;
-            transition: all 0.3s ease;
-        }
-
-        .constellation-node:hover {
-            border-color: var(--cosmic-purple);
-            transform: translateY(-5px);
-            box-shadow: 0 10px 30px rgba(99, 102, 241, 0.1);
-        }
-
-        .node-glow {
-            position: absolute;
-            top: -50%;
-            left: -50%;
-            width: 200%;
-            height: 200%;
-            background: radial-gradient(circle, rgba(99, 102, 241, 0.1) 0%, transparent 70%);
-            opacity: 0;
-            transition: opacity 0.3s ease;
-        }
-
-        .constellation-node:hover .node-glow {
-            opacity: 1;
-        }
-
-        .node-content h3 {
-            font-size: 18px;
-            font-weight: 600;
-            margin-bottom: 20px;
-            color: var(--starlight-white);
-        }
-
-        .main-node {
-            grid-column: 1 / -1;
-        }
-
-        /* Cosmic Notification */
-        .cosmic-notification {
-            position: fixed;
-            top: 20px;
-            right: 20px;
-            background: rgba(30, 41, 59, 0.9);
-            backdrop-filter: blur(10px);
-            border: 1px solid var(--cosmic-purple);
-            border-radius: 12px;
-            padding: 15px 20px;
-            display: flex;
-            align-items: center;
-            gap: 15px;
-            transform: translateX(400px);
-            transition: transform 0.3s ease;
-            z-index: 1000;
-        }
-
-        .cosmic-notification.show {
-            transform: translateX(0);
-        }
-
-        .notification-comet {
-            position: relative;
-            width: 30px;
-            height: 30px;
-        }
-
-        .comet-core {
-            width: 12px;
-            height: 12px;
-            background: var(--supernova-orange);
-            border-radius: 50%;
-            position: relative;
-            z-index: 2;
-        }
-
-        .comet-tail {
-            position: absolute;
-            top: 50%;
-            right: -20px;
-            width: 20px;
-            height: 2px;
-            background: linear-gradient(90deg, var(--supernova-orange), transparent);
-            transform: translateY(-50%);
-        }
-
-        .notification-message {
-            font-size: 14px;
-            font-weight: 500;
-        }
-
-        /* Responsive Design */
-        @media (max-width: 768px) {
-            .app-container {
-                flex-direction: column;
-            }
-
-            .cosmic-nav {
-                width: 100%;
-                height: auto;
-            }
-
-            .constellation-grid {
-                grid-template-columns: 1fr;
-            }
-        }
-
-        /* Dashboard specific styles */
-        .mission-stats {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 15px;
-            margin-bottom: 30px;
-        }
-
-        .mission-stat {
-            text-align: center;
-            padding: 20px;
-            background: rgba(30, 41, 59, 0.6);
-            border-radius: 12px;
-            border: 1px solid rgba(99, 102, 241, 0.2);
-        }
-
-        .mission-stat .stat-value {
-            font-size: 24px;
-            font-weight: 700;
-            color: var(--comet-cyan);
-            margin-bottom: 5px;
-        }
-
-        .mission-stat .stat-label {
-            font-size: 12px;
-            color: var(--orbit-silver);
-        }
-
-        .mission-list {
-            display: flex;
-            flex-direction: column;
-            gap: 10px;
-            margin-bottom: 30px;
-        }
-
-        .mission-item {
-            display: flex;
-            align-items: center;
-            gap: 15px;
-            padding: 15px;
-            background: rgba(255, 255, 255, 0.05);
-            border-radius: 8px;
-        }
-
-        .mission-icon {
-            font-size: 20px;
-        }
-
-        .mission-info {
-            flex: 1;
-        }
-
-        .mission-name {
-            font-weight: 500;
-            margin-bottom: 5px;
-        }
-
-        .mission-progress {
-            width: 100%;
-        }
-
-        .progress-bar {
-            height: 6px;
-            background: rgba(255, 255, 255, 0.1);
-            border-radius: 3px;
-            overflow: hidden;
-        }
+# Badge and level-up rules (see rules.py)
+RULES = [
+    {"level_up": 100, "on": ["quest_completed"]},
+    {"badge": "python_beginner", "when": {"completed_quests_with_skill": "Python"}},
+    {"badge": "active_learner", "when": {"completed_quests_at_least": 3}},
+    {"badge": "goal_setter", "on": ["career_selected"], "xp": 25, "coins": 50},
+    {"badge": "goal_setter", "on": ["goal_rewarded"]},
+    {"badge": "goal_setter", "on": ["ai_chat"], "xp": 50, "coins": 100},
+]
 
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, var(--comet-cyan), var(--cosmic-purple));
-            border-radius: 3px;
-            transition: width 0.3s ease;
-        }
+# Built-in data can be replaced by a JSON or CSV catalog
+catalog = load_catalog(
+    Catalog(CAREER_PATHS, QUESTS, GOALS, RULES),
+    path=os.getenv("CATALOG_PATH"),
+    quests_csv=os.getenv("CATALOG_QUESTS_CSV"),
+    goals_csv=os.getenv("CATALOG_GOALS_CSV"),
+)
 
-        .objectives-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 15px;
-        }
+BADGES = list(dict.fromkeys(rule["badge"] for rule in catalog.rules if "badge" in rule))
 
-        .objective-card {
-            background: rgba(255, 255, 255, 0.05);
-            border: 1px solid rgba(99, 102, 241, 0.2);
-            border-radius: 12px;
-            padding: 20px;
-            text-align: center;
-            transition: all 0.3s ease;
-        }
+DEFAULT_SKILLS_PROGRESS = {
+    'Python': 65,
+    'SQL': 40,
+    'Machine Learning': 25,
+    'Communication': 70,
+    'Project Management': 35
+}
 
-        .objective-card:hover {
-            border-color: var(--cosmic-purple);
-            transform: translateY(-2px);
-        }
+# Bit positions used by the compact per-session state
+SessionState.layout = StateLayout(
+    quest_ids=list(catalog.quest_by_id),
+    goal_ids=list(catalog.goal_by_id),
+    badges=BADGES,
+    skills=[*DEFAULT_SKILLS_PROGRESS, *catalog.skills()],
+)
 
-        .objective-icon {
-            font-size: 24px;
-            margin-bottom: 10px;
-        }
+# Compiled once; mutations only run the rules whose inputs changed
+SessionState.history_size = int(os.getenv("SESSION_DELTA_HISTORY", "8"))
+rule_set = RuleSet(catalog.rules, catalog, SessionState.layout)
+
+# Encoded catalog responses; clear this whenever the catalog is replaced
+catalog_payloads = PayloadCache()
+CATALOG_CACHE_CONTROL = f"public, max-age={int(os.getenv('CATALOG_CACHE_MAX_AGE', '300'))}"
+
+def new_user_data() -> SessionState:
+    user_data = SessionState()
+    for skill, level in DEFAULT_SKILLS_PROGRESS.items():
+        user_data.set_skill_level(skill, level)
+    user_data.last_login = datetime.now().isoformat()
+    return user_data
+
+def create_session_store():
+    backend = create_backend(
+        os.getenv("SESSION_BACKEND", "sqlite"),
+        os.getenv("SESSION_DB_PATH", "sessions.db"),
+    )
+    codec = {
+        "factory": new_user_data,
+        "dumps": lambda user_data: json.dumps({**user_data.to_dict(), "version": user_data.version}),
+        "loads": lambda raw: SessionState.from_dict(json.loads(raw)),
+    }
+    # Several worker processes share sessions through the SQLite file
+    if os.getenv("SESSION_SHARED") == "1":
+        return SharedSessionStore(
+            backend, **codec, history_entries=int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "100000"))
+        )
+    # Single process: cached in memory (LRU + idle TTL), flushed to the backend in the background
+    return SessionStore(
+        backend,
+        **codec,
+        flush_interval=float(os.getenv("SESSION_FLUSH_INTERVAL", "0.05")),
+        max_entries=int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "100000")),
+        max_bytes=int(os.getenv("SESSION_CACHE_MAX_BYTES", "0")),
+        ttl=float(os.getenv("SESSION_CACHE_TTL", "3600")),
+    )
+
+session_store = create_session_store()
+
+# Append-only record of every award; LEDGER_DIR="" turns it off
+ledger = Ledger(
+    os.getenv("LEDGER_DIR", "ledger"),
+    snapshot_every=int(os.getenv("LEDGER_SNAPSHOT_EVERY", "100")),
+    max_backlog=int(os.getenv("LEDGER_MAX_BACKLOG", "1000000")),
+) if os.getenv("LEDGER_DIR", "ledger") else None
+
+# Pushes state changes to open pages over server-sent events
+change_feed = ChangeFeed(
+    heartbeat=float(os.getenv("PUSH_HEARTBEAT", "15")),
+    coalesce=float(os.getenv("PUSH_COALESCE_MS", "50")) / 1000,
+)
 
-        .objective-text {
-            font-size: 14px;
-            font-weight: 500;
-        }
+# Rankings and cohort analytics, kept up to date by every committed change
+LEADERBOARD_METRICS = ("total_xp_earned", "total_coins_earned", "level", "daily_streak")
+leaderboard = Leaderboard(LEADERBOARD_METRICS)
+cohort = Cohort(SessionState.layout)
+
+def seed_indexes():
+    # Sessions stored before startup are added in the background
+    for session_id, raw in session_store.backend.scan():
+        state = SessionState.from_dict(json.loads(raw))
+        leaderboard.add_stored(session_id, state)
+        cohort.add_stored(session_id, state)
+
+# Indexes kept in step with the changes other workers write to the shared database
+REFRESHED_INDEXES = (leaderboard, cohort)
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "1"))
+indexes_stopping = threading.Event()
+
+def refresh_indexes():
+    # With several workers, the others' changes only reach this worker's indexes through the database.
+    # The first pass reads every session; later ones only the sessions written since.
+    seen = -1
+    while not indexes_stopping.is_set():
+        try:
+            for session_id, raw, changed in session_store.backend.changed_since(seen):
+                state = SessionState.from_dict(json.loads(raw))
+                for index in REFRESHED_INDEXES:
+                    index.update(session_id, state)
+                seen = changed
+        except Exception:
+            # Retried from the last session read on the next pass
+            pass
+        indexes_stopping.wait(INDEX_REFRESH_INTERVAL)
+
+def player_id(session_id: str) -> str:
+    # Session ids grant access to the session, so rankings show a stable pseudonym instead
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:12]
+
+mutation_engine = MutationEngine(
+    session_store, catalog, rule_set, ledger=ledger, feed=change_feed, indexes=(leaderboard, cohort)
+)
 
-        /* Loading states */
-        .loading {
-            text-align: center;
-            padding: 40px;
-            color: var(--orbit-silver);
-            font-style: italic;
-        }
+metrics_registry.register(
+    "session_store", session_store.stats,
+    counters=("hits", "misses", "evictions", "expirations", "spills", "transactions"),
+)
+metrics_registry.register("push", change_feed.stats, counters=("published",))
+metrics_registry.register("leaderboard", leaderboard.stats)
+metrics_registry.register("analytics", cohort.stats)
+if ledger is not None:
+    metrics_registry.register("ledger", ledger.stats, counters=("appended", "dropped", "write_errors"))
+
+def get_user_data(session_id: str = "default") -> SessionState:
+    return session_store.get(session_id)
+
+def render_user_data(since_version: Optional[int] = None):
+    """Render the full user_data, or only what changed since the client's version."""
+    def render(state: SessionState) -> dict:
+        if since_version is None:
+            return {"user_data": state.to_dict()}
+        # Only sessions whose clients ask for deltas pay for remembering versions
+        state.track_history()
+        # Version 0 means the client has nothing yet
+        delta = state.delta_since(since_version) if since_version > 0 else None
+        if delta is None:
+            return {"version": state.version, "user_data": state.to_dict()}
+        return {"version": state.version, "since_version": since_version, **delta}
+    return render
+
+# Assistant replies come from a data file; patterns are compiled into one matcher at startup
+DIALOGUE_PATH = os.getenv("DIALOGUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dialogue.json"))
+dialogue = load_dialogue(DIALOGUE_PATH)
+reply_cache = ReplyCache(dialogue, max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000")))
+
+def reply_context(user_data: SessionState) -> tuple:
+    return tuple(getattr(user_data, field) for field in dialogue.context_fields)
+
+# The options the assistant offers are most of what clients send back
+reply_cache.prerender(dialogue.options(), reply_context(new_user_data()))
+
+def ai_assistant_response(message: str, user_data: SessionState) -> dict:
+    return reply_cache.respond(message, reply_context(user_data))
+
+# Replies are produced on worker threads, so a slow generator never blocks the event loop
+ai_jobs = JobQueue(
+    workers=int(os.getenv("AI_JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("AI_JOB_MAX_PENDING", "64")),
+    # With several workers, job statuses are shared through the session database
+    board=SharedJobBoard(session_store.backend.path) if isinstance(session_store, SharedSessionStore) else None,
+)
+AI_GENERATOR_DELAY = float(os.getenv("AI_GENERATOR_DELAY_MS", "0")) / 1000
+metrics_registry.register("ai_replies", reply_cache.stats, counters=("hits", "misses", "evictions"))
+metrics_registry.register(
+    "ai_jobs", ai_jobs.stats, counters=("submitted", "deduplicated", "rejected", "failed", "publish_errors")
+)
 
-        .loading::after {
-            content: '';
-            display: inline-block;
-            width: 20px;
-            height: 20px;
-            border: 2px solid var(--orbit-silver);
-            border-top: 2px solid var(--cosmic-purple);
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin-left: 10px;
-        }
-    </style>
-</head>
-<body>
-    <div class="cosmic-bg">
-        <div class="star"></div>
-        <div class="star"></div>
-        <div class="star"></div>
-    </div>
-
-    <!-- Cosmic Notification -->
-    <div id="notification" class="cosmic-notification">
-        <div class="notification-comet">
-            <div class="comet-core"></div>
-            <div class="comet-tail"></div>
-        </div>
-        <div class="notification-message">Career Cosmos initialized!</div>
-    </div>
-
-    <div class="app-container">
-        <!-- Cosmic Navigation -->
-        <nav class="cosmic-nav">
-            <div class="nav-brand">
-                <div class="logo-orb">🚀</div>
-                <h1>Career Cosmos</h1>
-                <div class="tagline">Your Career Development Platform</div>
-            </div>
-
-            <div class="user-orb">
-                <div class="user-avatar">
-                    <div class="orbit">
-                        <div class="satellite"></div>
-                    </div>
-                    <div class="user-core">👨‍🚀</div>
-                </div>
-                <div class="user-info">
-                    <div class="level-badge">Level <span id="user-level">1</span></div>
-                    <div class="xp-display"><span id="user-xp">0</span> XP • <span id="user-coins">0</span> 🪙</div>
-                </div>
-            </div>
-
-            <div class="nav-constellation">
-                <div class="nav-star active" data-section="dashboard">
-                    <div class="star-icon">🌌</div>
-                    <span>Mission Control</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="profile">
-                    <div class="star-icon">👨‍🚀</div>
-                    <span>Astronaut Profile</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="galaxy">
-                    <div class="star-icon">🌠</div>
-                    <span>Career Galaxy</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="quests">
-                    <div class="star-icon">🎯</div>
-                    <span>Space Missions</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="goals">
-                    <div class="star-icon">⭐</div>
-                    <span>Stellar Goals</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="ai">
-                    <div class="star-icon">🤖</div>
-                    <span>AI Navigator</span>
-                    <div class="star-trail"></div>
-                </div>
-                <div class="nav-star" data-section="achievements">
-                    <div class="star-icon">🏆</div>
-                    <span>Cosmic Badges</span>
-                    <div class="star-trail"></div>
-                </div>
-            </div>
-
-            <div class="cosmic-stats">
-                <div class="stat-comet">
-                    <div class="progress-ring">
-                        <svg width="80" height="80">
-                            <circle class="ring-back" cx="40" cy="40" r="35"></circle>
-                            <circle id="xp-ring" class="ring-front" cx="40" cy="40" r="35"></circle>
-                        </svg>
-                        <div class="ring-text" id="xp-percent">0%</div>
-                    </div>
-                </div>
-                <div class="stat-comet">
-                    <div class="comet-head"></div>
-                    <div class="comet-value" id="total-quests">0</div>
-                    <div class="comet-label">Missions Completed</div>
-                </div>
-            </div>
-        </nav>
-
-        <!-- Main Content -->
-        <main class="cosmic-main">
-            <div class="mission-header">
-                <div class="header-orbit">
-                    <h2 id="page-title">Mission Control</h2>
-                    <div class="mission-time" id="current-date">Loading mission time...</div>
-                </div>
-                <div class="signal-bars">
-                    <div class="bar"></div>
-                    <div class="bar"></div>
-                    <div class="bar"></div>
-                    <div class="bar"></div>
-                </div>
-            </div>
-
-            <!-- Dashboard Section -->
-            <section id="dashboard" class="cosmic-section active">
-                <div class="constellation-grid">
-                    <div class="constellation-node main-node">
-                        <div class="node-glow"></div>
-                        <div class="node-content">
-                            <h3>Mission Statistics</h3>
-                            <div class="mission-stats" id="mission-stats">
-                                <div class="mission-stat">
-                                    <div class="stat-value">1</div>
-                                    <div class="stat-label">Current Orbit</div>
-                                </div>
-                                <div class="mission-stat">
-                                    <div class="stat-value">0</div>
-                                    <div class="stat-label">Missions Completed</div>
-                                </div>
-                                <div class="mission-stat">
-                                    <div class="stat-value">1</div>
-                                    <div class="stat-label">Consecutive Days</div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-
-                    <div class="constellation-node">
-                        <div class="node-glow"></div>
-                        <div class="node-content">
-                            <h3>Active Missions</h3>
-                            <div class="mission-list" id="active-missions">
-                                <div class="mission-item">
-                                    <div class="mission-icon">🎯</div>
-                                    <div class="mission-info">
-                                        <div class="mission-name">Skill Development</div>
-                                        <div class="mission-progress">
-                                            <div class="progress-bar">
-                                                <div class="progress-fill" style="width: 65%"></div>
-                                            </div>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-
-                    <div class="constellation-node">
-                        <div class="node-glow"></div>
-                        <div class="node-content">
-                            <h3>Current Objectives</h3>
-                            <div class="objectives-grid" id="objectives-grid">
-                                <div class="objective-card">
-                                    <div class="objective-icon">⭐</div>
-                                    <div class="objective-text">Reach Level 2</div>
-                                </div>
-                                <div class="objective-card">
-                                    <div class="objective-icon">🏆</div>
-                                    <div class="objective-text">Earn 3 Badges</div>
-                                </div>
-                                <div class="objective-card">
-                                    <div class="objective-icon">💫</div>
-                                    <div class="objective-text">Complete 5 Missions</div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </section>
-
-            <!-- Other Sections (simplified for demo) -->
-            <section id="profile" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>Astronaut Profile</h3>
-                        <div class="loading">Loading astronaut data...</div>
-                    </div>
-                </div>
-            </section>
-
-            <section id="galaxy" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>Career Galaxy</h3>
-                        <div class="loading">Exploring career paths...</div>
-                    </div>
-                </div>
-            </section>
-
-            <section id="quests" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>Space Missions</h3>
-                        <div class="loading">Scanning available missions...</div>
-                    </div>
-                </div>
-            </section>
-
-            <section id="goals" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>Stellar Goals</h3>
-                        <div class="loading">Aligning cosmic objectives...</div>
-                    </div>
-                </div>
-            </section>
-
-            <section id="ai" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>AI Navigator</h3>
-                        <div class="loading">Initializing AI assistant...</div>
-                    </div>
-                </div>
-            </section>
-
-            <section id="achievements" class="cosmic-section">
-                <div class="constellation-node main-node">
-                    <div class="node-content">
-                        <h3>Cosmic Badges</h3>
-                        <div class="loading">Loading achievements...</div>
-                    </div>
-                </div>
-            </section>
-        </main>
-    </div>
-
-    <script>
-        class CareerCosmos {
-            constructor() {
-                this.userData = null;
-                this.currentSection = 'dashboard';
-                this.init();
-            }
-
-            async init() {
-                await this.loadUserData();
-                this.setupEventListeners();
-                this.updateUI();
-                this.setupAnimations();
-                this.showNotification('Career Cosmos initialized! Ready for launch! 🚀');
-            }
-
-            async loadUserData() {
-                try {
-                    const response = await fetch('/api/user');
-                    if (!response.ok) throw new Error('API response not OK');
-                    this.userData = await response.json();
-                } catch (error) {
-                    console.error('Error loading user data:', error);
-                    // Fallback data
-                    this.userData = {
-                        level: 1,
-                        xp: 0,
-                        coins: 0,
-                        badges: [],
-                        completed_quests: [],
-                        career_path: null,
-                        skills_progress: {
-                            'Python': 65,
-                            'SQL': 40,
-                            'Machine Learning': 25,
-                            'Communication': 70,
-                            'Project Management': 35
-                        },
-                        selected_goals: [],
-                        completed_goals: [],
-                        daily_streak: 1,
-                        total_quests_completed: 0,
-                        total_xp_earned: 0,
-                        total_coins_earned: 0,
-                        last_login: new Date().toISOString()
-                    };
-                    this.showNotification('Using demo data - some features limited');
-                }
-            }
-
-            setupEventListeners() {
-                // Navigation
-                document.querySelectorAll('.nav-star').forEach(star => {
-                    star.addEventListener('click', (e) => {
-                        const section = e.currentTarget.getAttribute('data-section');
-                        this.navigateToSection(section);
-                    });
-                });
-            }
-
-            navigateToSection(section) {
-                // Update navigation
-                document.querySelectorAll('.nav-star').forEach(star => {
-                    star.classList.remove('active');
-                });
-                document.querySelector(`[data-section="${section}"]`).classList.add('active');
-
-                // Update sections
-                document.querySelectorAll('.cosmic-section').forEach(sec => {
-                    sec.classList.remove('active');
-                });
-                document.getElementById(section).classList.add('active');
-
-                // Update title
-                const titles = {
-                    'dashboard': 'Mission Control',
-                    'profile': 'Astronaut Profile',
-                    'galaxy': 'Career Galaxy',
-                    'quests': 'Space Missions',
-                    'goals': 'Stellar Goals',
-                    'ai': 'AI Navigator',
-                    'achievements': 'Cosmic Badges'
-                };
-                document.getElementById('page-title').textContent = titles[section] || 'Career Cosmos';
-
-                this.currentSection = section;
-            }
-
-            updateUI() {
-                if (!this.userData) return;
-
-                // Update user info
-                document.getElementById('user-level').textContent = this.userData.level;
-                document.getElementById('user-xp').textContent = this.userData.xp;
-                document.getElementById('user-coins').textContent = this.userData.coins;
-
-                // Update progress ring
-                this.updateProgressRing();
-
-                // Update mission stats
-                this.updateMissionStats();
-
-                // Update date
-                this.updateMissionTime();
-            }
-
-            updateProgressRing() {
-                if (!this.userData) return;
-
-                const xpNeeded = this.userData.level * 100;
-                const progressPercent = (this.userData.xp / xpNeeded) * 100;
-                const circumference = 2 * Math.PI * 35;
-                const offset = circumference - (progressPercent / 100) * circumference;
-
-                const ring = document.getElementById('xp-ring');
-                const percentText = document.getElementById('xp-percent');
-
-                if (ring && percentText) {
-                    ring.style.strokeDasharray = `${circumference} ${circumference}`;
-                    ring.style.strokeDashoffset = offset;
-                    percentText.textContent = `${Math.round(progressPercent)}%`;
-                }
-            }
-
-            updateMissionStats() {
-                const missionStats = document.getElementById('mission-stats');
-                if (missionStats && this.userData) {
-                    missionStats.innerHTML = `
-                        <div class="mission-stat">
-                            <div class="stat-value">${this.userData.level}</div>
-                            <div class="stat-label">Current Orbit</div>
-                        </div>
-                        <div class="mission-stat">
-                            <div class="stat-value">${this.userData.total_quests_completed || 0}</div>
-                            <div class="stat-label">Missions Completed</div>
-                        </div>
-                        <div class="mission-stat">
-                            <div class="stat-value">${this.userData.daily_streak}</div>
-                            <div class="stat-label">Consecutive Days</div>
-                        </div>
-                    `;
-                }
-
-                // Update total quests in sidebar
-                const totalQuests = document.getElementById('total-quests');
-                if (totalQuests) {
-                    totalQuests.textContent = this.userData.total_quests_completed || 0;
-                }
-            }
-
-            updateMissionTime() {
-                const now = new Date();
-                const options = {
-                    weekday: 'long',
-                    year: 'numeric',
-                    month: 'long',
-                    day: 'numeric',
-                    hour: '2-digit',
-                    minute: '2-digit'
-                };
-                document.getElementById('current-date').textContent = 
-                    `Mission Time: ${now.toLocaleDateString('en-US', options)}`;
-            }
-
-            setupAnimations() {
-                // Add stars to background
-                this.createStars();
-            }
-
-            createStars() {
-                const cosmicBg = document.querySelector('.cosmic-bg');
-                for (let i = 0; i < 20; i++) {
-                    const star = document.createElement('div');
-                    star.className = 'star';
-                    star.style.top = `${Math.random() * 100}%`;
-                    star.style.left = `${Math.random() * 100}%`;
-                    star.style.width = `${Math.random() * 3 + 1}px`;
-                    star.style.height = star.style.width;
-                    star.style.animationDelay = `${Math.random() * 4}s`;
-                    cosmicBg.appendChild(star);
-                }
-            }
-
-            showNotification(message) {
-                const notification = document.getElementById('notification');
-                const messageEl = notification.querySelector('.notification-message');
-
-                messageEl.textContent = message;
-                notification.classList.add('show');
-
-                setTimeout(() => {
-                    notification.classList.remove('show');
-                }, 4000);
-            }
-        }
+def generate_reply(session_id: str, message: str) -> dict:
+    if AI_GENERATOR_DELAY:
+        # Stand-in for a heavier generator
+        time.sleep(AI_GENERATOR_DELAY)
+    response = ai_assistant_response(message, get_user_data(session_id))
+    mutation_engine.apply(session_id, "ai_chat_bonus")
+    return response
 
-        // Initialize the application
-        document.addEventListener('DOMContentLoaded', () => {
-            new CareerCosmos();
-        });
-    </script>
-</body>
-</html>
-"""
+def submit_reply(session_id: str, message: str) -> Tuple[Job, bool]:
+    # The same message from the same session while its reply is pending joins that job
+    try:
+        return ai_jobs.submit((session_id, message), generate_reply, session_id, message)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="AI assistant is busy", headers={"Retry-After": "1"})
+
+async def ai_assistant_stream(job: Job) -> AsyncIterator[dict]:
+    """The reply in parts once its job has produced it: everything but the text first, then the text section by section."""
+    response = await asyncio.shield(asyncio.wrap_future(job.future))
+    yield {key: value for key, value in response.items() if key != "text"}
+    for section in sections(response.get("text", "")):
+        yield {"text": section}
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def toggle_profiler():
+    # SIGUSR2: start profiling, or stop and write out what was collected
+    if profiler.enabled:
+        profiler.stop()
+        profiler.dump()
+    else:
+        profiler.start()
+
+# HTML frontend: index.html is the shell, its CSS and JS are served as hashed assets
+ASSETS_DIR = os.getenv("ASSETS_DIR", os.path.dirname(os.path.abspath(__file__)))
+assets = AssetPipeline(ASSETS_DIR, ("style.css", "script.js"))
+with open(os.path.join(ASSETS_DIR, "index.html"), encoding="utf-8") as index_file:
+    HTML_CONTENT = assets.render(index_file.read())
+
+# Encoded once; clients revalidate with the content-hash ETag on every load
+ROOT_PAGE = EncodedPayload(HTML_CONTENT.encode("utf-8"), "text/html", encodings=("gzip", "deflate"))
+ROOT_CACHE_CONTROL = "no-cache"
+
+@app.on_event("startup")
+async def start_session_store():
+    session_store.start()
+    if ledger is not None:
+        ledger.start()
+    change_feed.start()
+    loop_lag.start()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, toggle_profiler)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # No SIGUSR2 on this platform, or not on the main thread; the admin endpoint still works
+        pass
+    if isinstance(session_store, SharedSessionStore):
+        # Its first pass seeds every index
+        threading.Thread(target=refresh_indexes, name="index-refresh", daemon=True).start()
+    else:
+        threading.Thread(target=seed_indexes, name="index-seed", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_session_store():
+    indexes_stopping.set()
+    change_feed.stop()
+    loop_lag.stop()
+    if profiler.enabled:
+        profiler.stop()
+        profiler.dump()
+    ai_jobs.shutdown()
+    if ledger is not None:
+        ledger.stop()
+    session_store.stop()
 
 # Routes
 @app.get("/")
-async def read_root():
-    return HTMLResponse(content=HTML_CONTENT)
+async def read_root(request: Request):
+    return respond(request, ROOT_PAGE, ROOT_CACHE_CONTROL)
+
+@app.get("/static/{filename}")
+async def get_asset(request: Request, filename: str):
+    payload = assets.payload(filename)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return respond(request, payload, IMMUTABLE_CACHE_CONTROL)
 
 @app.get("/api/user")
-async def get_user(session_id: str = "default"):
+async def get_user(session_id: str = "default", since_version: Optional[int] = None):
     try:
-        user_data = get_user_data(session_id)
-        update_daily_streak(user_data)
-        return user_data
+        _, rendered = mutation_engine.apply(
+            session_id, "login", datetime.now().isoformat(), render=render_user_data(since_version)
+        )
+        return json_response(rendered["user_data"] if since_version is None else rendered)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user data: {str(e)}")
 
+@app.get("/api/events")
+async def user_events(request: Request, session_id: str = "default", since_version: int = 0):
+    # EventSource resends the last event id when it reconnects
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since_version = int(last_event_id)
+    read = lambda version: mutation_engine.read(session_id, render_user_data(version))
+    return EventStreamResponse(
+        change_feed, session_id, since_version, read,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/api/career_paths")
-async def get_career_paths():
+async def get_career_paths(request: Request):
     try:
-        return CAREER_PATHS
+        payload = catalog_payloads.get(
+            "career_paths", lambda: EncodedPayload.from_json(catalog.career_paths)
+        )
+        return respond(request, payload, CATALOG_CACHE_CONTROL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching career paths: {str(e)}")
 
 @app.get("/api/quests")
-async def get_quests():
+async def get_quests(request: Request, skill: Optional[str] = None, type: Optional[str] = None):
     try:
-        return QUESTS
+        # Unknown filter values share one empty payload, which keeps the cache bounded
+        if (skill is None or skill in catalog.quests_by_skill) and (type is None or type in catalog.quests_by_type):
+            key = ("quests", skill, type)
+            build = lambda: EncodedPayload.from_json(catalog.find_quests(skill, type))
+        else:
+            key = ("quests", "unknown")
+            build = lambda: EncodedPayload.from_json([])
+        return respond(request, catalog_payloads.get(key, build), CATALOG_CACHE_CONTROL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching quests: {str(e)}")
 
 @app.get("/api/goals")
-async def get_goals():
+async def get_goals(request: Request, category: Optional[str] = None):
     try:
-        return GOALS
+        if category is not None and category not in catalog.goals_by_category:
+            category = ""
+        payload = catalog_payloads.get(
+            ("goals", category), lambda: EncodedPayload.from_json(catalog.find_goals(category))
+        )
+        return respond(request, payload, CATALOG_CACHE_CONTROL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching goals: {str(e)}")
 
 @app.post("/api/complete_quest")
-async def complete_quest(quest: QuestCompletion, session_id: str = "default"):
+async def complete_quest(quest: QuestCompletion, session_id: str = "default", since_version: Optional[int] = None):
     try:
-        user_data = get_user_data(session_id)
-
-        if quest.quest_id not in user_data.completed_quests:
-            quest_data = next((q for q in QUESTS if q["id"] == quest.quest_id), None)
-            if quest_data:
-                user_data.xp += quest_data["xp"]
-                user_data.coins += quest_data["coins"]
-                user_data.completed_quests.append(quest.quest_id)
-                user_data.total_quests_completed += 1
-                user_data.total_xp_earned += quest_data["xp"]
-                user_data.total_coins_earned += quest_data["coins"]
-
-                # Level up check
-                xp_needed = user_data.level * 100
-                if user_data.xp >= xp_needed:
-                    user_data.level += 1
-                    user_data.xp = 0
-
-                # Badge checks
-                if quest_data["skill"] == "Python" and "python_beginner" not in user_data.badges:
-                    user_data.badges.append("python_beginner")
-
-                if len(user_data.completed_quests) >= 3 and "active_learner" not in user_data.badges:
-                    user_data.badges.append("active_learner")
-
-                return {"success": True, "user_data": user_data}
-
+        success, rendered = mutation_engine.apply(
+            session_id, "complete_quest", quest.quest_id, render=render_user_data(since_version)
+        )
+        if success:
+            return json_response({"success": True, **rendered})
         return {"success": False, "message": "Quest already completed or not found"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error completing quest: {str(e)}")
 
 @app.post("/api/select_career")
-async def select_career(request: CareerPathSelect, session_id: str = "default"):
+async def select_career(request: CareerPathSelect, session_id: str = "default", since_version: Optional[int] = None):
     try:
-        user_data = get_user_data(session_id)
-        user_data.career_path = request.career_path
-        
-        # Award badge for selecting career path
-        if "goal_setter" not in user_data.badges:
-            user_data.badges.append("goal_setter")
-            user_data.coins += 50
-            user_data.xp += 25
-            
-        return {"success": True, "user_data": user_data}
+        _, rendered = mutation_engine.apply(
+            session_id, "select_career", request.career_path, render=render_user_data(since_version)
+        )
+        return json_response({"success": True, **rendered})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error selecting career path: {str(e)}")
 
 @app.post("/api/select_goal")
-async def select_goal(goal_id: str, session_id: str = "default"):
+async def select_goal(goal_id: str, session_id: str = "default", since_version: Optional[int] = None):
     try:
-        user_data = get_user_data(session_id)
-        if goal_id not in user_data.selected_goals:
-            user_data.selected_goals.append(goal_id)
-        return {"success": True, "user_data": user_data}
+        _, rendered = mutation_engine.apply(
+            session_id, "select_goal", goal_id, render=render_user_data(since_version)
+        )
+        return json_response({"success": True, **rendered})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error selecting goal: {str(e)}")
 
 @app.post("/api/toggle_goal")
-async def toggle_goal(goal: GoalUpdate, session_id: str = "default"):
+async def toggle_goal(goal: GoalUpdate, session_id: str = "default", since_version: Optional[int] = None):
     try:
-        user_data = get_user_data(session_id)
-
-        if goal.completed and goal.goal_id not in user_data.completed_goals:
-            user_data.completed_goals.append(goal.goal_id)
-
-            # Find goal reward
-            reward_given = False
-            for category in GOALS.values():
-                for g in category:
-                    if g["id"] == goal.goal_id:
-                        user_data.xp += g["xp_reward"]
-                        user_data.coins += g["coins_reward"]
-                        user_data.total_xp_earned += g["xp_reward"]
-                        user_data.total_coins_earned += g["coins_reward"]
-                        reward_given = True
-                        
-                        if "goal_setter" not in user_data.badges:
-                            user_data.badges.append("goal_setter")
-                        break
-                if reward_given:
-                    break
-
-        elif not goal.completed and goal.goal_id in user_data.completed_goals:
-            user_data.completed_goals.remove(goal.goal_id)
-
-        return {"success": True, "user_data": user_data}
+        _, rendered = mutation_engine.apply(
+            session_id, "toggle_goal", goal.goal_id, goal.completed, render=render_user_data(since_version)
+        )
+        return json_response({"success": True, **rendered})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error toggling goal: {str(e)}")
 
 @app.post("/api/ai_chat")
-async def ai_chat(message: AIChatMessage, session_id: str = "default"):
+async def ai_chat(message: AIChatMessage, session_id: str = "default", stream: bool = False):
+    job, _ = submit_reply(session_id, message.message)
+    if stream:
+        try:
+            return StreamingResponse(
+                ai_chat_events(job),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error in AI chat: {str(e)}")
     try:
-        user_data = get_user_data(session_id)
-        response = ai_assistant_response(message.message, user_data)
+        # Shielded: a client that disconnects must not cancel a reply other requests may be waiting on
+        return await asyncio.shield(asyncio.wrap_future(job.future))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in AI chat: {str(e)}")
 
-        # Award for first AI interaction
-        if "goal_setter" not in user_data.badges:
-            user_data.badges.append("goal_setter")
-            user_data.coins += 100
-            user_data.xp += 50
+@app.post("/api/ai_chat/jobs", status_code=202)
+async def create_ai_chat_job(message: AIChatMessage, session_id: str = "default"):
+    job, _ = submit_reply(session_id, message.message)
+    return job.to_dict()
 
-        return response
+@app.get("/api/ai_chat/jobs/{job_id}")
+async def get_ai_chat_job(job_id: str):
+    try:
+        # Jobs another worker owns are read from the shared job board
+        status = ai_jobs.status(job_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error in AI chat: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching job: {str(e)}")
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+async def ai_chat_events(job: Job) -> AsyncIterator[bytes]:
+    # Opened before the reply exists so the client sees the first byte at once
+    yield b": reply\n\n"
+    try:
+        async for part in ai_assistant_stream(job):
+            yield encode_frame("text" if "text" in part else "reply", part)
+    except Exception as e:
+        yield encode_frame("error", {"detail": f"Error in AI chat: {str(e)}"})
+        return
+    yield encode_frame("done", {})
+
+# Arguments each batchable operation takes from a BatchOperation
+BATCH_ARGUMENTS = {
+    "complete_quest": ("quest_id",),
+    "toggle_goal": ("goal_id", "completed"),
+    "select_goal": ("goal_id",),
+    "select_career": ("career_path",),
+}
+
+@app.post("/api/batch")
+async def batch(request: BatchRequest, session_id: str = "default"):
+    try:
+        results: List[Optional[dict]] = [None] * len(request.operations)
+        # Group by session, keeping each session's operations in request order
+        grouped: Dict[str, List[tuple]] = {}
+        for index, item in enumerate(request.operations):
+            fields = BATCH_ARGUMENTS.get(item.op)
+            if fields is None:
+                results[index] = {"success": False, "message": f"Unknown operation: {item.op}"}
+                continue
+            args = tuple(getattr(item, field) for field in fields)
+            if None in args:
+                results[index] = {"success": False, "message": f"{item.op} requires {', '.join(fields)}"}
+                continue
+            grouped.setdefault(item.session_id or session_id, []).append((index, item.op, args))
+
+        sessions = {}
+        for target, items in grouped.items():
+            # Each session's operations apply all or nothing; a failed group leaves the others committed
+            try:
+                changes, sessions[target] = mutation_engine.apply_many(
+                    target, [(op, args) for _, op, args in items], render=SessionState.to_dict
+                )
+            except Exception as e:
+                for index, _, _ in items:
+                    results[index] = {"success": False, "message": f"Error applying operations: {str(e)}"}
+                continue
+            for (index, op, _), changed in zip(items, changes):
+                if op == "complete_quest" and not changed:
+                    results[index] = {"success": False, "message": "Quest already completed or not found"}
+                else:
+                    results[index] = {"success": True}
+
+        return json_response({"results": results, "sessions": sessions})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error applying batch: {str(e)}")
+
+@app.get("/api/leaderboard/{metric}")
+async def get_leaderboard(metric: str, limit: int = 10):
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    try:
+        total, entries = leaderboard.top(metric, max(0, min(limit, 100)))
+        return {
+            "metric": metric,
+            "total": total,
+            "entries": [
+                {"rank": rank, "player": player_id(session_id), "score": score}
+                for rank, session_id, score in entries
+            ],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching leaderboard: {str(e)}")
+
+@app.get("/api/leaderboard/{metric}/me")
+async def get_my_rank(metric: str, session_id: str = "default"):
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    try:
+        score = getattr(get_user_data(session_id), metric)
+        rank, total = leaderboard.position(metric, score)
+        return {"metric": metric, "player": player_id(session_id), "score": score, "rank": rank, "total": total}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching rank: {str(e)}")
+
+@app.get("/api/analytics/summary")
+async def get_analytics_summary():
+    try:
+        return cohort.summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
+@app.get("/api/analytics/histogram/{field}")
+async def get_analytics_histogram(field: str, bins: int = 20):
+    if field not in NUMERIC_FIELDS:
+        raise HTTPException(status_code=404, detail="Unknown field")
+    try:
+        return cohort.histogram(field, max(1, min(bins, 200)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
+@app.get("/api/analytics/completion")
+async def get_analytics_completion():
+    try:
+        return cohort.completion({quest_id: quest["name"] for quest_id, quest in catalog.quest_by_id.items()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
+@app.get("/metrics")
+async def get_metrics():
+    try:
+        return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering metrics: {str(e)}")
+
+@app.get("/api/admin/profiler")
+async def get_profiler(request: Request):
+    require_admin(request)
+    return profiler.stats()
+
+@app.post("/api/admin/profiler")
+async def set_profiler(settings: ProfilerSettings, request: Request):
+    require_admin(request)
+    try:
+        interval = settings.interval_ms / 1000 if settings.interval_ms is not None else None
+        profiler.configure(settings.sample_rate, settings.route_rates, interval)
+        if settings.enabled is True:
+            profiler.start()
+        elif settings.enabled is False:
+            profiler.stop()
+        return profiler.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error configuring profiler: {str(e)}")
+
+@app.post("/api/admin/profiler/dump")
+async def dump_profile(request: Request):
+    require_admin(request)
+    try:
+        return profiler.dump()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error writing profile: {str(e)}")
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "sessions": session_store.stats(),
+        "push": change_feed.stats(),
+        "ai_replies": reply_cache.stats(),
+        "ai_jobs": ai_jobs.stats(),
+        "leaderboard": leaderboard.stats(),
+        "analytics": cohort.stats(),
+        "ledger": ledger.stats() if ledger is not None else None,
+    }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    port = int(os.getenv("PORT", "8000"))
+    workers = int(os.getenv("WORKERS", "1"))
+    # Open /api/events streams never finish on their own; cut them off so shutdown can flush
+    shutdown_timeout = int(os.getenv("SHUTDOWN_TIMEOUT", "5"))
+    if workers > 1:
+        # Worker processes re-import this module and pick up the shared store
+        os.environ["SESSION_SHARED"] = "1"
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, timeout_graceful_shutdown=shutdown_timeout)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port, timeout_graceful_shutdown=shutdown_timeout)
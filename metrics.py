@@ -0,0 +1,232 @@
+"""Request metrics and gauges in the Prometheus text format.
+
+``RequestMetrics`` is a plain ASGI middleware: it times every HTTP request
+from the moment it enters the app until its last body chunk is sent, and
+counts it under the route template it matched (``/api/leaderboard/{metric}``,
+not the concrete path), its method and its response status, so the 500s a
+handler turns its errors into are counted apart from its successes. Requests
+that match no route share the ``unmatched`` route.
+
+Everything is recorded on the event loop thread, which is the only thread
+that runs ASGI code, so the counters are plain ints and lists without
+locks. A request costs two ``perf_counter_ns`` calls, one dict lookup,
+a ``bisect`` into the fixed histogram bounds and a few integer additions.
+
+Gauges are read when ``/metrics`` is scraped: the ``stats()`` of each
+registered source, resident memory, and the event loop lag measured by
+``LoopLag``, a task that sleeps a fixed interval and records how late it
+wakes up.
+"""
+import asyncio
+import bisect
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Starlette appends "; charset=utf-8" to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+UNMATCHED = "unmatched"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in pairs)
+
+
+def resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak rather than current, but available everywhere resource is (kilobytes on Linux)
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Histogram:
+    """Fixed-bucket histogram of nanosecond observations, exposed in seconds."""
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.bounds = [int(bound * 1e9) for bound in buckets]
+        # One count per bucket plus +Inf; not cumulative until rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+
+    def observe(self, ns: int):
+        # Prometheus buckets are "less than or equal to" their bound
+        self.counts[bisect.bisect_left(self.bounds, ns)] += 1
+        self.total += ns
+
+    def samples(self, name: str, pairs: Tuple[Tuple[str, str], ...]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*self.bounds, None], self.counts):
+            cumulative += count
+            le = "+Inf" if bound is None else repr(bound / 1e9)
+            lines.append(f"{name}_bucket{{{labels((*pairs, ('le', le)))}}} {cumulative}")
+        selector = f"{{{labels(pairs)}}}" if pairs else ""
+        lines.append(f"{name}_sum{selector} {self.total / 1e9}")
+        lines.append(f"{name}_count{selector} {cumulative}")
+        return lines
+
+
+class RouteStats:
+    __slots__ = ("method", "route", "statuses", "latency")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+
+class LoopLag:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last = 0.0
+        self.histogram = Histogram(LAG_BUCKETS)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        interval_ns = int(self.interval * 1e9)
+        while True:
+            started = time.perf_counter_ns()
+            await asyncio.sleep(self.interval)
+            lag = max(0, time.perf_counter_ns() - started - interval_ns)
+            self.last = lag / 1e9
+            self.histogram.observe(lag)
+
+
+class Registry:
+    """Request counters, plus the gauge sources read at scrape time."""
+
+    def __init__(self, namespace: str = "app", lag: Optional[LoopLag] = None):
+        self.namespace = namespace
+        self.lag = lag
+        # (method, endpoint) -> stats; endpoint is the route's handler, or None when nothing matched
+        self.routes: Dict[Tuple[str, Optional[Callable]], RouteStats] = {}
+        self.exceptions = 0
+        self._sources: List[Tuple[str, Callable[[], dict], Tuple[str, ...]]] = []
+
+    def register(self, name: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        """Expose each number in ``stats()`` as ``<namespace>_<name>_<key>``; keys in ``counters`` only grow."""
+        self._sources.append((name, stats, tuple(counters)))
+
+    def route_stats(self, scope: Scope) -> RouteStats:
+        method = scope["method"]
+        endpoint = scope.get("endpoint")
+        stats = self.routes.get((method, endpoint))
+        if stats is None:
+            route = UNMATCHED
+            app = scope.get("app")
+            for candidate in getattr(app, "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint and endpoint is not None:
+                    route = candidate.path
+                    break
+            stats = self.routes[(method, endpoint)] = RouteStats(method, route)
+        return stats
+
+    def render(self) -> str:
+        ns = self.namespace
+        lines = [
+            "# HELP http_requests_total Requests by route template, method and response status.",
+            "# TYPE http_requests_total counter",
+        ]
+        routes = sorted(self.routes.values(), key=lambda stats: (stats.route, stats.method))
+        for stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(
+                    f"http_requests_total{{{labels((('method', stats.method), ('route', stats.route), ('status', status)))}}} {count}"
+                )
+        lines += [
+            "# HELP http_request_duration_seconds Time from a request's arrival to its last response byte.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for stats in routes:
+            lines += stats.latency.samples("http_request_duration_seconds", (("method", stats.method), ("route", stats.route)))
+        lines += [
+            "# HELP http_request_exceptions_total Requests whose handler raised past every exception handler.",
+            "# TYPE http_request_exceptions_total counter",
+            f"http_request_exceptions_total {self.exceptions}",
+            "# HELP process_resident_memory_bytes Resident memory of this process.",
+            "# TYPE process_resident_memory_bytes gauge",
+            f"process_resident_memory_bytes {resident_bytes()}",
+        ]
+        if self.lag is not None:
+            lines += [
+                "# HELP event_loop_lag_seconds How late the latest event loop probe woke up.",
+                "# TYPE event_loop_lag_seconds gauge",
+                f"event_loop_lag_seconds {self.lag.last}",
+                "# HELP event_loop_lag_distribution_seconds How late each event loop probe woke up.",
+                "# TYPE event_loop_lag_distribution_seconds histogram",
+                *self.lag.histogram.samples("event_loop_lag_distribution_seconds", ()),
+            ]
+        for name, stats, counters in self._sources:
+            for key, value in stats().items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    metric = f"{ns}_{name}_{key}_total"
+                    kind = "counter"
+                else:
+                    metric = f"{ns}_{name}_{key}"
+                    kind = "gauge"
+                lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """ASGI middleware recording every HTTP request into a ``Registry``."""
+
+    def __init__(self, app: ASGIApp, registry: Registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter_ns()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        except Exception:
+            self.registry.exceptions += 1
+            raise
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            # Routing has filled in scope["endpoint"] by now
+            stats = self.registry.routes.get((scope["method"], scope.get("endpoint")))
+            if stats is None:
+                stats = self.registry.route_stats(scope)
+            latency = stats.latency
+            latency.counts[bisect.bisect_left(latency.bounds, elapsed)] += 1
+            latency.total += elapsed
+            statuses = stats.statuses
+            statuses[status] = statuses.get(status, 0) + 1
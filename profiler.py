@@ -0,0 +1,185 @@
+"""Sampling profiler for requests, switched on and off at runtime.
+
+While the ``Profiler`` is on, ``SampledRequests`` picks a fraction of
+requests (``sample_rate``, or a per-route rate) and marks the coroutine
+frame it runs them under. A background thread looks at every thread's
+stack each ``interval`` seconds; a stack passing through a marked frame
+is counted under that request's route, from the marker down to the
+innermost call. Stacks are aggregated in collapsed ("folded") form, one
+line per distinct stack with its sample count::
+
+    POST /api/complete_quest;run_endpoint_function (routing.py:190);complete_quest (main.py:401);... 12
+
+which ``flamegraph.pl`` and speedscope read as is. ``dump`` writes the
+lines collected so far to a file under ``directory`` and starts over.
+
+Samples are only taken while a sampled request is actually running, so
+the profile shows where the event loop spends its time on those routes
+(validation, the handler, encoding), not time spent waiting. Work handed
+to other threads (AI replies on the job queue) is not attributed. The
+sampler needs the GIL to look, so while the loop is busy it gets in about
+once per ``sys.getswitchinterval()``, and more often wherever the loop
+thread releases the GIL (system calls, waiting on a lock); with other
+busy threads around, those spots are over-represented.
+
+When the profiler is off, a request costs one attribute check.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, Optional, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+UNMATCHED = "unmatched"
+
+
+def route_of(scope: Scope) -> str:
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            return route.path
+    return UNMATCHED
+
+
+class Profiler:
+    def __init__(self, directory: str = "profiles", sample_rate: float = 0.1, interval: float = 0.001):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        # Route template -> fraction of its requests to sample, overriding sample_rate
+        self.route_rates: Dict[str, float] = {}
+        self.interval = interval
+        self.enabled = False
+        self.samples = 0
+        self.sampled_requests = 0
+        self._max_rate = sample_rate
+        # id() of each sampled request's marker frame -> (the frame, "METHOD /route")
+        self._active: Dict[int, Tuple[FrameType, str]] = {}
+        self._stacks: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "route_rates": dict(self.route_rates),
+            "interval_ms": self.interval * 1000,
+            "sampled_requests": self.sampled_requests,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+        }
+
+    def configure(self, sample_rate: Optional[float] = None, route_rates: Optional[Dict[str, float]] = None,
+                  interval: Optional[float] = None):
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if route_rates is not None:
+            self.route_rates = {route: min(max(rate, 0.0), 1.0) for route, rate in route_rates.items()}
+        if interval is not None and interval > 0:
+            self.interval = interval
+        self._max_rate = max([self.sample_rate, *self.route_rates.values()])
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def choose(self, scope: Scope) -> Optional[str]:
+        """The label to profile this request under, or None to let it run unsampled."""
+        # Most requests are turned away before their route is looked up
+        top = self._max_rate
+        if top <= 0 or random.random() >= top:
+            return None
+        route = route_of(scope)
+        rate = self.route_rates.get(route, self.sample_rate)
+        if rate < top and random.random() * top >= rate:
+            return None
+        self.sampled_requests += 1
+        return f"{scope['method']} {route}"
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        active = self._active
+        if not active:
+            return
+        stacks = []
+        for frame in sys._current_frames().values():
+            names = []
+            while frame is not None:
+                marked = active.get(id(frame))
+                if marked is not None:
+                    names.append(marked[1])
+                    stacks.append(";".join(reversed(names)))
+                    break
+                names.append(self._label(frame.f_code))
+                frame = frame.f_back
+        if stacks:
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += len(stacks)
+
+    def dump(self) -> dict:
+        """Write the stacks collected so far in collapsed format and start over."""
+        with self._lock:
+            stacks, self._stacks = self._stacks, Counter()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as out:
+            for stack, count in sorted(stacks.items()):
+                out.write(f"{stack} {count}\n")
+        os.replace(path + ".tmp", path)
+        return {"path": path, "stacks": len(stacks), "samples": sum(stacks.values())}
+
+
+class SampledRequests:
+    """ASGI middleware marking the requests a ``Profiler`` samples."""
+
+    def __init__(self, app: ASGIApp, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        profiler = self.profiler
+        label = profiler.choose(scope) if profiler.enabled and scope["type"] == "http" else None
+        if label is None:
+            await self.app(scope, receive, send)
+            return
+        # The sampler recognizes this coroutine's frame on the stack while the request runs.
+        # Holding the frame keeps its id from being reused by another frame meanwhile.
+        frame = sys._getframe()
+        marker = id(frame)
+        profiler._active[marker] = (frame, label)
+        del frame
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            del profiler._active[marker]
@@ -0,0 +1,220 @@
+"""Server-sent events pushing session state changes to open pages.
+
+A connection is one ``Subscriber`` registered under its session id.
+``ChangeFeed.publish`` only wakes that session's subscribers;
+it never queues anything. A woken stream waits ``coalesce`` seconds, then
+renders one delta from the version it last sent to the current one, so a
+burst of changes becomes a single event and a slow consumer (blocked in
+``send`` by transport backpressure) simply gets a bigger delta later
+instead of an ever-growing queue.
+
+Events look like::
+
+    id: 12
+    event: delta
+    data: {"version":12,"since_version":9,"changes":{...},"added":{...},"removed":{...}}
+
+``snapshot`` events carry the full ``user_data`` instead; they are sent
+first when the client has no version, and whenever the version it has is
+no longer known. The event id lets ``EventSource`` resume with
+``Last-Event-ID`` after a reconnect. One shared ticker wakes every stream
+each ``heartbeat`` seconds to send a comment line, which keeps proxies
+from closing idle connections without a timer per connection.
+
+``EventStreamResponse`` replaces Starlette's ``StreamingResponse``, whose
+task group per connection costs more than everything else a stream holds;
+for the same reason subscribers are slotted objects around a bare future
+rather than ``asyncio.Event``s, and idle streams hold no rendered state.
+"""
+import asyncio
+import json
+from typing import Callable, Dict, Optional, Set
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+PING = b": ping\n\n"
+
+
+def encode_frame(event: str, data, event_id: Optional[int] = None) -> bytes:
+    data = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+def encode_event(rendered: dict) -> bytes:
+    kind = "snapshot" if "user_data" in rendered else "delta"
+    return encode_frame(kind, rendered, rendered["version"])
+
+
+class Subscriber:
+    __slots__ = ("pending", "waiter")
+
+    def __init__(self):
+        self.pending = False
+        self.waiter: Optional[asyncio.Future] = None
+
+    def wake(self):
+        self.pending = True
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self):
+        """Return once woken; wakes since the last call are collapsed into one."""
+        if not self.pending:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        self.pending = False
+
+
+class ChangeFeed:
+    def __init__(self, heartbeat: float = 15.0, coalesce: float = 0.05):
+        self.heartbeat = heartbeat
+        self.coalesce = coalesce
+        self.published = 0
+        self.closing = False
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self), "sessions": len(self._subscribers), "published": self.published}
+
+    def subscribe(self, session_id: str) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber()
+        self._subscribers.setdefault(session_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, session_id: str, subscriber: Subscriber):
+        subscribers = self._subscribers.get(session_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[session_id]
+
+    def publish(self, session_id: str):
+        """Wake the session's streams; safe to call from any thread."""
+        if session_id not in self._subscribers:
+            return
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake(session_id)
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake, session_id)
+
+    def _wake(self, session_id: str):
+        for subscriber in self._subscribers.get(session_id, ()):
+            subscriber.wake()
+
+    def _wake_all(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.wake()
+
+    def start(self):
+        self.closing = False
+        if self._ticker is None and self.heartbeat:
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+
+    def stop(self):
+        """Stop the heartbeat and end every open stream, so shutdown is not held up."""
+        self.closing = True
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        self._wake_all()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            self._wake_all()
+
+    async def serve(
+        self,
+        session_id: str,
+        since_version: int,
+        read: Callable[[int], dict],
+        receive: Receive,
+        send: Send,
+        start: dict,
+    ):
+        """Send SSE frames for one connection until the client goes away.
+
+        ``read(version)`` renders the session relative to ``version`` (see
+        ``render_user_data`` in main.py) under the session's lock.
+        """
+        subscriber = self.subscribe(session_id)
+        disconnected = False
+
+        async def watch():
+            nonlocal disconnected
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected = True
+            subscriber.wake()
+
+        watcher = asyncio.get_running_loop().create_task(watch())
+        try:
+            await send(start)
+            version = await self._send_update(read, since_version, send, initial=True)
+            while True:
+                await subscriber.wait()
+                if self.coalesce and not (disconnected or self.closing):
+                    await asyncio.sleep(self.coalesce)
+                    subscriber.pending = False
+                if disconnected:
+                    return
+                if self.closing:
+                    break
+                version = await self._send_update(read, version, send)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            self.unsubscribe(session_id, subscriber)
+
+    @staticmethod
+    async def _send_update(read: Callable[[int], dict], version: int, send: Send, initial: bool = False) -> int:
+        # Kept out of serve() so that nothing rendered stays referenced while a stream idles.
+        rendered = read(version)
+        if rendered["version"] == version and (version or not initial):
+            # Nothing new; a client that is already up to date only needs to know it is connected.
+            frame = PING
+        else:
+            frame = encode_event(rendered)
+        await send({"type": "http.response.body", "body": frame, "more_body": True})
+        return rendered["version"]
+
+
+class EventStreamResponse(Response):
+    media_type = "text/event-stream"
+
+    def __init__(
+        self,
+        feed: ChangeFeed,
+        session_id: str,
+        since_version: int,
+        read: Callable[[int], dict],
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.feed = feed
+        self.session_id = session_id
+        self.since_version = since_version
+        self.read = read
+        self.status_code = 200
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        start = {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+        await self.feed.serve(self.session_id, self.since_version, self.read, receive, send, start)
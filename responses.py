@@ -0,0 +1,163 @@
+"""Pre-encoded responses with strong ETags and pre-compressed variants.
+
+Payloads that only change when the data behind them changes (the catalog
+endpoints) are encoded once into an ``EncodedPayload``: the identity bytes,
+optional gzip/deflate variants and a content-hash ETag per variant.
+``respond`` picks the best variant the client accepts and answers
+conditional requests with 304, without touching the JSON encoder.
+
+Per-request bodies that embed a ``UserData`` go through ``json_response``,
+which skips ``jsonable_encoder`` and produces exactly the bytes
+``JSONResponse`` would.
+"""
+import gzip
+import hashlib
+import json
+import zlib
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # optional: fast_json_bytes falls back to the stdlib encoder
+    orjson = None
+
+# Variants smaller than this are not worth compressing.
+MIN_COMPRESS_BYTES = 512
+
+
+def json_bytes(content) -> bytes:
+    """Encode like Starlette's JSONResponse, so cached and live bodies match."""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def fast_json_bytes(content) -> bytes:
+    """Encode like ``json_bytes``; for bodies without floats, such as UserData.
+
+    orjson produces the same bytes as the stdlib encoder for strings, ints,
+    bools, None, lists and dicts with string keys, about ten times faster.
+    Anything it rejects (ints beyond 64 bits, other key types) falls back.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:  # includes orjson.JSONEncodeError
+            pass
+    return json_bytes(content)
+
+
+def json_response(content) -> Response:
+    """Skip FastAPI's jsonable_encoder and response validation for plain-data bodies."""
+    return Response(content=fast_json_bytes(content), media_type="application/json")
+
+
+def _deflate(body: bytes) -> bytes:
+    return zlib.compress(body, 9)
+
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda body: gzip.compress(body, 9, mtime=0),
+    "deflate": _deflate,
+}
+
+
+class EncodedPayload:
+    __slots__ = ("body", "media_type", "etag", "variants")
+
+    def __init__(self, body: bytes, media_type: str, encodings: Iterable[str] = ("gzip",)):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.variants: Dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in encodings:
+                compressed = COMPRESSORS[encoding](body)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    @classmethod
+    def from_json(cls, content, encodings: Iterable[str] = ("gzip",)) -> "EncodedPayload":
+        return cls(json_bytes(content), "application/json", encodings)
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    result: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        result[name.strip().lower()] = quality
+    return result
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: a W/ prefix does not matter.
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # Strong ETags must differ between the identity and compressed bytes.
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def respond(request: Request, payload: EncodedPayload, cache_control: str) -> Response:
+    headers = {"Cache-Control": cache_control}
+    body = payload.body
+    encoding = None
+    if payload.variants:
+        headers["Vary"] = "Accept-Encoding"
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        encoding = max(
+            (name for name in payload.variants if accepted.get(name, 0) > 0),
+            key=lambda name: (accepted[name], -len(payload.variants[name])),
+            default=None,
+        )
+        if encoding is not None:
+            body = payload.variants[encoding]
+            headers["Content-Encoding"] = encoding
+    headers["ETag"] = variant_etag(payload.etag, encoding)
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=payload.media_type, headers=headers)
+
+
+class PayloadCache:
+    """Encoded payloads keyed by request shape, built on first use."""
+
+    def __init__(self):
+        self._payloads: Dict[Hashable, EncodedPayload] = {}
+
+    def get(self, key: Hashable, build: Callable[[], EncodedPayload]) -> EncodedPayload:
+        payload = self._payloads.get(key)
+        if payload is None:
+            payload = self._payloads[key] = build()
+        return payload
+
+    def clear(self):
+        self._payloads.clear()
@@ -0,0 +1,109 @@
+"""Declarative badge and level-up rules, compiled once and evaluated incrementally.
+
+A rule is plain data::
+
+    {"badge": "active_learner", "when": {"completed_quests_at_least": 3}}
+    {"badge": "goal_setter", "on": ["career_selected"], "xp": 25, "coins": 50}
+    {"level_up": 100, "on": ["quest_completed"]}
+
+``when`` conditions must all hold; each condition implies the state field
+it reads as a dependency. ``on`` adds event names (or extra fields) the
+rule depends on. A badge rule awards its badge once, together with its
+optional ``xp``/``coins`` bonus. A ``level_up`` rule raises the level when
+``xp >= level * level_up`` and resets xp.
+
+Mutations report the fields and events they touched to ``RuleSet.apply``,
+which runs only the rules depending on them (in definition order) and
+re-runs rules depending on whatever those rules changed in turn.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Fields whose value is a set of ids; "<field>_at_least" counts members.
+COUNTED_FIELDS = ("badges", "completed_quests", "selected_goals", "completed_goals")
+
+
+def _quest_skill_condition(skill: str, catalog, layout):
+    mask = 0
+    for quest in catalog.quests_by_skill.get(skill, ()):
+        mask |= 1 << layout.quest_bits[quest["id"]]
+    return "completed_quests", lambda state: bool(state.completed_quests & mask)
+
+
+def _compile_condition(key: str, value, catalog, layout):
+    if key == "completed_quests_with_skill":
+        return _quest_skill_condition(value, catalog, layout)
+    if key.endswith("_at_least"):
+        field = key[:-len("_at_least")]
+        if field in COUNTED_FIELDS:
+            return field, lambda state: state.count(field) >= value
+        return field, lambda state: getattr(state, field) >= value
+    raise ValueError(f"Unknown rule condition: {key}")
+
+
+class Rule:
+    __slots__ = ("order", "badge", "conditions", "xp", "coins", "level_up", "dependencies")
+
+    def __init__(self, order: int, spec: dict, catalog, layout):
+        self.order = order
+        self.badge: Optional[str] = spec.get("badge")
+        self.xp = spec.get("xp", 0)
+        self.coins = spec.get("coins", 0)
+        self.level_up = spec.get("level_up")
+        if (self.badge is None) == (self.level_up is None):
+            raise ValueError(f"Rule needs exactly one of badge or level_up: {spec}")
+        self.conditions: List[Callable] = []
+        self.dependencies: Set[str] = set(spec.get("on", ()))
+        for key, value in spec.get("when", {}).items():
+            field, condition = _compile_condition(key, value, catalog, layout)
+            self.dependencies.add(field)
+            self.conditions.append(condition)
+        if not self.dependencies:
+            raise ValueError(f"Rule depends on nothing and would never run: {spec}")
+
+    def fire(self, state) -> Optional[Set[str]]:
+        """Apply the rule if it holds; return the fields it changed."""
+        if self.level_up is not None:
+            if state.xp >= state.level * self.level_up:
+                state.level += 1
+                state.xp = 0
+                return {"level", "xp"}
+            return None
+        if state.has_badge(self.badge):
+            return None
+        for condition in self.conditions:
+            if not condition(state):
+                return None
+        state.add_badge(self.badge)
+        changed = {"badges"}
+        if self.xp or self.coins:
+            state.xp += self.xp
+            state.coins += self.coins
+            changed.update(("xp", "coins"))
+        return changed
+
+
+class RuleSet:
+    def __init__(self, specs: Iterable[dict], catalog, layout):
+        self.rules = [Rule(order, spec, catalog, layout) for order, spec in enumerate(specs)]
+        self._by_dependency: Dict[str, List[Rule]] = {}
+        for rule in self.rules:
+            for dependency in rule.dependencies:
+                self._by_dependency.setdefault(dependency, []).append(rule)
+
+    def apply(self, state, changed: Iterable[str]) -> bool:
+        """Run the rules that depend on ``changed``; return True if any fired."""
+        by_dependency = self._by_dependency
+        pending = changed
+        fired = False
+        # Every badge rule fires at most once, so this terminates well before the bound.
+        for _ in range(len(self.rules) + 1):
+            candidates = {rule for name in pending for rule in by_dependency.get(name, ())}
+            if not candidates:
+                break
+            pending = set()
+            for rule in sorted(candidates, key=lambda rule: rule.order):
+                effects = rule.fire(state)
+                if effects:
+                    fired = True
+                    pending |= effects
+        return fired
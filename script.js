@@ -2,32 +2,51 @@ class CareerCosmos {
     constructor() {
         this.userData = null;
         this.currentSection = 'dashboard';
-        this.aiState = null;
-        this.aiAnswers = {};
         this.init();
     }
 
     async init() {
-        try {
-            await this.loadUserData();
-            this.setupEventListeners();
+        await this.loadUserData();
+        this.setupEventListeners();
+        this.updateUI();
+        this.setupAnimations();
+        this.subscribeToUpdates();
+        this.showNotification('Career Cosmos initialized! Ready for launch! 🚀');
+    }
+
+    subscribeToUpdates() {
+        // Changes made in other tabs arrive as server-sent events instead of re-fetching /api/user
+        if (!window.EventSource) return;
+        const events = new EventSource('/api/events');
+        events.addEventListener('snapshot', (event) => {
+            this.userData = JSON.parse(event.data).user_data;
             this.updateUI();
-            this.setupAnimations();
-            this.showNotification('Career Cosmos initialized! Ready for launch!');
-        } catch (error) {
-            console.error('Error initializing Career Cosmos:', error);
+        });
+        events.addEventListener('delta', (event) => {
+            this.applyDelta(JSON.parse(event.data));
+            this.updateUI();
+        });
+    }
+
+    applyDelta(delta) {
+        if (!this.userData) return;
+        Object.assign(this.userData, delta.changes);
+        for (const [field, ids] of Object.entries(delta.added)) {
+            const current = this.userData[field] || [];
+            this.userData[field] = current.concat(ids.filter((id) => !current.includes(id)));
+        }
+        for (const [field, ids] of Object.entries(delta.removed)) {
+            this.userData[field] = (this.userData[field] || []).filter((id) => !ids.includes(id));
         }
     }
 
     async loadUserData() {
         try {
             const response = await fetch('/api/user');
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
+            if (!response.ok) throw new Error('API response not OK');
             this.userData = await response.json();
         } catch (error) {
-            console.error('Error loading cosmic data:', error);
+            console.error('Error loading user data:', error);
             // Fallback data
             this.userData = {
                 level: 1,
@@ -51,73 +70,65 @@ class CareerCosmos {
                 total_coins_earned: 0,
                 last_login: new Date().toISOString()
             };
-            this.showNotification('Using offline mode - some features limited');
+            this.showNotification('Using demo data - some features limited');
         }
     }
 
     setupEventListeners() {
-        // Navigation stars - безопасное добавление обработчиков
-        const navStars = document.querySelectorAll('.nav-star');
-        if (navStars.length > 0) {
-            navStars.forEach(star => {
-                star.addEventListener('click', (e) => {
-                    const section = e.currentTarget.getAttribute('data-section');
-                    this.navigateToSection(section);
-                });
+        // Navigation
+        document.querySelectorAll('.nav-star').forEach(star => {
+            star.addEventListener('click', (e) => {
+                const section = e.currentTarget.getAttribute('data-section');
+                this.navigateToSection(section);
             });
-        }
+        });
 
-        // AI Chat - проверка существования элементов
-        const sendButton = document.getElementById('send-ai-message');
-        const chatInput = document.getElementById('ai-chat-input');
-        
-        if (sendButton && chatInput) {
-            sendButton.addEventListener('click', () => this.sendAIMessage());
-            chatInput.addEventListener('keypress', (e) => {
-                if (e.key === 'Enter') this.sendAIMessage();
-            });
-        }
+        // AI Chat
+        document.getElementById('send-ai-message').addEventListener('click', () => this.sendAIMessage());
+        document.getElementById('ai-chat-input').addEventListener('keypress', (e) => {
+            if (e.key === 'Enter') this.sendAIMessage();
+        });
 
         // Quick questions
-        const quickQuestions = document.querySelectorAll('.quick-question');
-        if (quickQuestions.length > 0) {
-            quickQuestions.forEach(button => {
-                button.addEventListener('click', (e) => {
-                    const question = e.target.getAttribute('data-question');
-                    if (chatInput) {
-                        chatInput.value = question;
-                        this.sendAIMessage();
-                    }
-                });
+        document.querySelectorAll('.quick-question').forEach(button => {
+            button.addEventListener('click', (e) => {
+                const question = e.target.textContent;
+                document.getElementById('ai-chat-input').value = question;
+                this.sendAIMessage();
             });
-        }
+        });
 
-        // Cosmic background interactions
-        document.addEventListener('mousemove', this.handleMouseMove.bind(this));
+        // Mission buttons
+        document.querySelectorAll('.launch-btn').forEach(button => {
+            button.addEventListener('click', (e) => {
+                const missionName = e.target.closest('.space-mission').querySelector('.mission-name').textContent;
+                this.showNotification(`🚀 Launching mission: ${missionName}`);
+            });
+        });
+
+        // Galaxy selection
+        document.querySelectorAll('.select-galaxy').forEach(button => {
+            button.addEventListener('click', (e) => {
+                const galaxyName = e.target.closest('.career-galaxy').querySelector('.galaxy-name').textContent;
+                this.showNotification(`🌌 Now exploring: ${galaxyName} galaxy`);
+            });
+        });
     }
 
     navigateToSection(section) {
-        // Update active navigation
+        // Update navigation
         document.querySelectorAll('.nav-star').forEach(star => {
             star.classList.remove('active');
         });
-        
-        const activeNav = document.querySelector(`[data-section="${section}"]`);
-        if (activeNav) {
-            activeNav.classList.add('active');
-        }
+        document.querySelector(`[data-section="${section}"]`).classList.add('active');
 
-        // Update active section
-        document.querySelectorAll('.cosmic-section').forEach(sectionEl => {
-            sectionEl.classList.remove('active');
+        // Update sections
+        document.querySelectorAll('.cosmic-section').forEach(sec => {
+            sec.classList.remove('active');
         });
-        
-        const targetSection = document.getElementById(section);
-        if (targetSection) {
-            targetSection.classList.add('active');
-        }
+        document.getElementById(section).classList.add('active');
 
-        // Update page title
+        // Update title
         const titles = {
             'dashboard': 'Mission Control',
             'profile': 'Astronaut Profile',
@@ -127,46 +138,126 @@ class CareerCosmos {
             'ai': 'AI Navigator',
             'achievements': 'Cosmic Badges'
         };
-        
-        const pageTitle = document.getElementById('page-title');
-        if (pageTitle) {
-            pageTitle.textContent = titles[section] || 'Career Cosmos';
-        }
+        document.getElementById('page-title').textContent = titles[section] || 'Career Cosmos';
 
         this.currentSection = section;
-        this.loadSectionData(section);
     }
 
-    // Обновите метод updateSkills для корректного расчета progress ring
-    updateSkills() {
-        const skillsUniverse = document.getElementById('skills-universe');
-        if (!skillsUniverse || !this.userData.skills_progress) return;
-
-        let skillsHTML = '';
-        for (const [skill, progress] of Object.entries(this.userData.skills_progress)) {
-            const circumference = 2 * Math.PI * 25; // для радиуса 25
-            const offset = circumference - (progress / 100) * circumference;
-            
-            skillsHTML += `
-                <div class="skill-planet">
-                    <div class="planet-progress">
-                        <div class="progress-ring small">
-                            <svg width="60" height="60">
-                                <circle class="ring-back" cx="30" cy="30" r="25" stroke-width="3"></circle>
-                                <circle class="ring-front" cx="30" cy="30" r="25" stroke-width="3" 
-                                        style="stroke-dasharray: ${circumference}; stroke-dashoffset: ${offset}"></circle>
-                            </svg>
-                        </div>
-                        <div class="skill-name">${skill}</div>
+    updateUI() {
+        if (!this.userData) return;
+
+        // Update user info
+        document.getElementById('user-level').textContent = this.userData.level;
+        document.getElementById('user-xp').textContent = this.userData.xp;
+        document.getElementById('user-coins').textContent = this.userData.coins;
+
+        // Update profile section
+        document.getElementById('profile-level').textContent = this.userData.level;
+        document.getElementById('profile-streak').textContent = this.userData.daily_streak;
+
+        // Update progress ring
+        this.updateProgressRing();
+
+        // Update mission stats
+        this.updateMissionStats();
+
+        // Update date
+        this.updateMissionTime();
+    }
+
+    updateProgressRing() {
+        if (!this.userData) return;
+
+        const xpNeeded = this.userData.level * 100;
+        const progressPercent = (this.userData.xp / xpNeeded) * 100;
+        const circumference = 2 * Math.PI * 35;
+        const offset = circumference - (progressPercent / 100) * circumference;
+
+        const ring = document.getElementById('xp-ring');
+        const percentText = document.getElementById('xp-percent');
+
+        if (ring && percentText) {
+            ring.style.strokeDasharray = `${circumference} ${circumference}`;
+            ring.style.strokeDashoffset = offset;
+            percentText.textContent = `${Math.round(progressPercent)}%`;
+        }
+    }
+
+    updateMissionStats() {
+        const missionStats = document.getElementById('mission-stats');
+        if (missionStats && this.userData) {
+            missionStats.innerHTML = `
+                <div class="mission-stat">
+                    <div class="stat-value">${this.userData.level}</div>
+                    <div class="stat-label">Current Orbit</div>
+                </div>
+                <div class="mission-stat">
+                    <div class="stat-value">${this.userData.total_quests_completed || 0}</div>
+                    <div class="stat-label">Missions Completed</div>
+                </div>
+                <div class="mission-stat">
+                    <div class="stat-value">${this.userData.daily_streak}</div>
+                    <div class="stat-label">Consecutive Days</div>
+                </div>
+            `;
+        }
+
+        // Update total quests in sidebar
+        const totalQuests = document.getElementById('total-quests');
+        if (totalQuests) {
+            totalQuests.textContent = this.userData.total_quests_completed || 0;
+        }
+
+        // Update profile stats
+        const profileStats = document.getElementById('profile-stats');
+        if (profileStats) {
+            profileStats.innerHTML = `
+                <div class="profile-stat">
+                    <div class="stat-icon">🚀</div>
+                    <div class="stat-data">
+                        <div class="stat-value">${this.userData.total_quests_completed || 0}</div>
+                        <div class="stat-label">Missions Completed</div>
+                    </div>
+                </div>
+                <div class="profile-stat">
+                    <div class="stat-icon">⭐</div>
+                    <div class="stat-data">
+                        <div class="stat-value">${this.userData.badges?.length || 0}</div>
+                        <div class="stat-label">Badges Earned</div>
+                    </div>
+                </div>
+                <div class="profile-stat">
+                    <div class="stat-icon">💫</div>
+                    <div class="stat-data">
+                        <div class="stat-value">${this.userData.total_xp_earned || 0}</div>
+                        <div class="stat-label">Total XP</div>
+                    </div>
+                </div>
+                <div class="profile-stat">
+                    <div class="stat-icon">🪙</div>
+                    <div class="stat-data">
+                        <div class="stat-value">${this.userData.total_coins_earned || 0}</div>
+                        <div class="stat-label">Total Coins</div>
                     </div>
-                    <div class="skill-percent">${progress}%</div>
                 </div>
             `;
         }
-        skillsUniverse.innerHTML = skillsHTML;
     }
 
-    // Добавьте обработку ошибок в AI чат
+    updateMissionTime() {
+        const now = new Date();
+        const options = {
+            weekday: 'long',
+            year: 'numeric',
+            month: 'long',
+            day: 'numeric',
+            hour: '2-digit',
+            minute: '2-digit'
+        };
+        document.getElementById('current-date').textContent = 
+            `Mission Time: ${now.toLocaleDateString('en-US', options)}`;
+    }
+
     async sendAIMessage() {
         const input = document.getElementById('ai-chat-input');
         const message = input?.value.trim();
@@ -176,98 +267,65 @@ class CareerCosmos {
         this.addAIMessage(message, 'user');
         if (input) input.value = '';
 
-        try {
-            const response = await fetch('/api/ai_chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ message })
-            });
+        // Simulate AI response
+        setTimeout(() => {
+            const responses = [
+                "I'd recommend focusing on Python and SQL for data science. These are fundamental skills that will serve you well in any data-related role.",
+                "To advance to a team lead position, consider developing your communication and project management skills alongside technical expertise.",
+                "For frontend development, I suggest starting with HTML/CSS fundamentals, then moving to JavaScript and React. FreeCodeCamp and MDN Web Docs are excellent resources.",
+                "Your career growth plan looks promising! Remember to balance technical skills with soft skills like communication and teamwork."
+            ];
+            const randomResponse = responses[Math.floor(Math.random() * responses.length)];
+            this.addAIMessage(randomResponse, 'ai');
+        }, 1000);
+    }
 
-            if (!response.ok) {
-                throw new Error(`API error: ${response.status}`);
-            }
-
-            const data = await response.json();
-
-            if (data.type === 'question') {
-                this.addAIQuestion(data.text, data.options);
-            } else if (data.type === 'final_plan') {
-                this.addAIFinalPlan(data.text);
-                await this.loadUserData();
-                this.updateUI();
-            } else {
-                this.addAIMessage(data.text, 'ai');
-            }
-        } catch (error) {
-            console.error('Error sending AI message:', error);
-            this.addAIMessage('🚨 Cosmic communication disrupted! Mission control is experiencing technical difficulties. Please try again later.', 'ai');
-        }
+    addAIMessage(message, sender) {
+        const chatMessages = document.getElementById('ai-chat-messages');
+        const messageElement = document.createElement('div');
+        messageElement.className = `ai-message ${sender}-message`;
+        messageElement.innerHTML = `
+            <div class="message-avatar">${sender === 'user' ? '👨‍🚀' : '🤖'}</div>
+            <div class="message-content">${message}</div>
+        `;
+
+        chatMessages.appendChild(messageElement);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    // Обновите метод completeQuest для обработки ошибок
-    async completeQuest(questId) {
-        try {
-            const response = await fetch('/api/complete_quest', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ quest_id: questId })
-            });
+    setupAnimations() {
+        // Add stars to background
+        this.createStars();
+    }
 
-            if (!response.ok) {
-                throw new Error(`API error: ${response.status}`);
-            }
-
-            const result = await response.json();
-            if (result.success) {
-                this.userData = result.user_data;
-                this.updateUI();
-                this.showNotification('🎉 Mission accomplished! Stellar rewards received!');
-
-                // Refresh current section if it's quests
-                if (this.currentSection === 'quests') {
-                    this.updateQuests();
-                }
-            }
-        } catch (error) {
-            console.error('Error completing mission:', error);
-            this.showNotification('❌ Mission failed to transmit. Please check your connection.');
+    createStars() {
+        const cosmicBg = document.querySelector('.cosmic-bg');
+        for (let i = 0; i < 20; i++) {
+            const star = document.createElement('div');
+            star.className = 'star';
+            star.style.top = `${Math.random() * 100}%`;
+            star.style.left = `${Math.random() * 100}%`;
+            star.style.width = `${Math.random() * 3 + 1}px`;
+            star.style.height = star.style.width;
+            star.style.animationDelay = `${Math.random() * 4}s`;
+            cosmicBg.appendChild(star);
         }
     }
 
-    // Добавьте метод для безопасного показа уведомлений
     showNotification(message) {
-        try {
-            const notification = document.getElementById('notification');
-            const messageEl = notification?.querySelector('.notification-message');
-
-            if (notification && messageEl) {
-                messageEl.textContent = message;
-                notification.classList.add('show');
-
-                setTimeout(() => {
-                    notification.classList.remove('show');
-                }, 4000);
-            } else {
-                // Fallback: использовать alert если уведомление не найдено
-                alert(message);
-            }
-        } catch (error) {
-            console.error('Error showing notification:', error);
-            alert(message); // Fallback
-        }
+        const notification = document.getElementById('notification');
+        const messageEl = notification.querySelector('.notification-message');
+
+        messageEl.textContent = message;
+        notification.classList.add('show');
+
+        setTimeout(() => {
+            notification.classList.remove('show');
+        }, 4000);
     }
 }
 
-// Безопасная инициализация
+// Initialize the application
 document.addEventListener('DOMContentLoaded', () => {
-    try {
-        new CareerCosmos();
-    } catch (error) {
-        console.error('Failed to initialize Career Cosmos:', error);
-        alert('Career Cosmos failed to launch. Please refresh the page.');
-    }
+    new CareerCosmos();
 });
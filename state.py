@@ -0,0 +1,384 @@
+"""Compact per-session state.
+
+Sessions are held in memory as ``SessionState`` records: ``__slots__``
+fields, integer bitsets for completed quests, selected/completed goals and
+badges (indexed against the catalogs through a ``StateLayout``) and a
+fixed-width byte string for skill levels, interned so that sessions with
+the same skill levels share one object. They are converted to the public
+``UserData`` JSON shape only at the API boundary.
+
+Once a client asks for deltas, its session also remembers compact
+snapshots of its last few versions (in memory only), so a client that
+reports the version it last saw can be sent just what changed since then.
+See ``SessionState.track_history`` and ``SessionState.delta_since``.
+"""
+from itertools import compress
+from typing import Dict, Iterable, List, Optional
+
+# Marks a skill that has no recorded progress in the skills row.
+NO_SKILL = 255
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value: int) -> int:
+        return bin(value).count("1")
+
+
+class StateLayout:
+    """Bit positions for catalog ids, shared by every SessionState."""
+
+    def __init__(
+        self,
+        quest_ids: Iterable[int],
+        goal_ids: Iterable[str],
+        badges: Iterable[str],
+        skills: Iterable[str],
+    ):
+        self.quest_ids: List[int] = list(quest_ids)
+        self.goal_ids: List[str] = list(goal_ids)
+        self.badges: List[str] = list(badges)
+        self.skills: List[str] = list(dict.fromkeys(skills))
+        self.quest_bits: Dict[int, int] = {quest_id: i for i, quest_id in enumerate(self.quest_ids)}
+        self.goal_bits: Dict[str, int] = {goal_id: i for i, goal_id in enumerate(self.goal_ids)}
+        self.badge_bits: Dict[str, int] = {badge: i for i, badge in enumerate(self.badges)}
+        self.skill_slots: Dict[str, int] = {skill: i for i, skill in enumerate(self.skills)}
+        self._skill_rows: Dict[bytes, bytes] = {}
+        self.empty_skills = self.intern_skills(bytes([NO_SKILL]) * len(self.skills))
+
+    def intern_skills(self, row: bytes) -> bytes:
+        return self._skill_rows.setdefault(row, row)
+
+
+# bin() digits <-> one byte per bit, so masks convert in single C-level passes
+_DIGIT_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+_FLAG_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def _bits_to_ids(mask: int, ids: list) -> list:
+    length = mask.bit_length()
+    if length <= 64 or _popcount(mask) * 128 < length:
+        # Few bits set: peel them off one by one
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(ids[low.bit_length() - 1])
+            mask ^= low
+        return result
+    # Lowest bit first, one byte per bit
+    flags = bin(mask)[:1:-1].encode().translate(_DIGIT_FLAGS)
+    return list(compress(ids, flags))
+
+
+def _positions_to_bits(positions: List[int], size: int) -> int:
+    if size <= 64 or len(positions) * 64 < size:
+        mask = 0
+        for bit in positions:
+            mask |= 1 << bit
+        return mask
+    flags = bytearray(size)
+    for bit in positions:
+        flags[bit] = 1
+    return int(flags[::-1].translate(_FLAG_DIGITS), 2)
+
+
+# Fields captured by SessionState snapshots, in tuple order (extras come last).
+SNAPSHOT_FIELDS = (
+    "level",
+    "xp",
+    "coins",
+    "badges",
+    "completed_quests",
+    "career_path",
+    "skills",
+    "selected_goals",
+    "completed_goals",
+    "daily_streak",
+    "total_quests_completed",
+    "total_xp_earned",
+    "total_coins_earned",
+    "last_login",
+)
+
+# Bitset fields and the StateLayout list their bits index.
+ID_FIELDS = {
+    "badges": "badges",
+    "completed_quests": "quest_ids",
+    "selected_goals": "goal_ids",
+    "completed_goals": "goal_ids",
+}
+
+
+class SessionState:
+    __slots__ = (
+        "level",
+        "xp",
+        "coins",
+        "badges",
+        "completed_quests",
+        "career_path",
+        "skills",
+        "selected_goals",
+        "completed_goals",
+        "daily_streak",
+        "total_quests_completed",
+        "total_xp_earned",
+        "total_coins_earned",
+        "last_login",
+        "version",
+        "extras",
+        "history",
+    )
+
+    layout: StateLayout = StateLayout((), (), (), ())
+    # Versions kept for delta responses; older clients get a full snapshot.
+    history_size = 8
+
+    def __init__(self):
+        self.level = 1
+        self.xp = 0
+        self.coins = 0
+        self.badges = 0
+        self.completed_quests = 0
+        self.career_path: Optional[str] = None
+        self.skills = self.layout.empty_skills
+        self.selected_goals = 0
+        self.completed_goals = 0
+        self.daily_streak = 1
+        self.total_quests_completed = 0
+        self.total_xp_earned = 0
+        self.total_coins_earned = 0
+        self.last_login = ""
+        # Bumped on every committed change; not part of the UserData shape.
+        self.version = 0
+        # Ids that are not in the catalogs, keyed by field name, each an insertion-ordered
+        # dict used as a set (skills_progress maps skill -> level). Almost always None.
+        self.extras: Optional[Dict[str, dict]] = None
+        # version -> snapshot tuple, oldest first, once a client asked for deltas. Never persisted.
+        self.history: Optional[Dict[int, tuple]] = None
+
+    # Bitset helpers shared by the quest, goal and badge fields
+    def _has(self, field: str, bits: dict, key) -> bool:
+        bit = bits.get(key)
+        if bit is None:
+            return self.extras is not None and key in self.extras.get(field, ())
+        return bool(getattr(self, field) >> bit & 1)
+
+    def _add(self, field: str, bits: dict, key) -> bool:
+        if self._has(field, bits, key):
+            return False
+        bit = bits.get(key)
+        if bit is None:
+            if self.extras is None:
+                self.extras = {}
+            self.extras.setdefault(field, {})[key] = None
+        else:
+            setattr(self, field, getattr(self, field) | 1 << bit)
+        return True
+
+    def _discard(self, field: str, bits: dict, key) -> bool:
+        if not self._has(field, bits, key):
+            return False
+        bit = bits.get(key)
+        if bit is None:
+            del self.extras[field][key]
+        else:
+            setattr(self, field, getattr(self, field) & ~(1 << bit))
+        return True
+
+    def _ids(self, field: str, ids: list) -> list:
+        result = _bits_to_ids(getattr(self, field), ids)
+        if self.extras is not None:
+            result.extend(self.extras.get(field, ()))
+        return result
+
+    def count(self, field: str) -> int:
+        count = _popcount(getattr(self, field))
+        if self.extras is not None:
+            count += len(self.extras.get(field, ()))
+        return count
+
+    def has_badge(self, badge: str) -> bool:
+        return self._has("badges", self.layout.badge_bits, badge)
+
+    def add_badge(self, badge: str) -> bool:
+        return self._add("badges", self.layout.badge_bits, badge)
+
+    def has_completed_quest(self, quest_id: int) -> bool:
+        return self._has("completed_quests", self.layout.quest_bits, quest_id)
+
+    def add_completed_quest(self, quest_id: int) -> bool:
+        return self._add("completed_quests", self.layout.quest_bits, quest_id)
+
+    def completed_quest_count(self) -> int:
+        return self.count("completed_quests")
+
+    def has_selected_goal(self, goal_id: str) -> bool:
+        return self._has("selected_goals", self.layout.goal_bits, goal_id)
+
+    def add_selected_goal(self, goal_id: str) -> bool:
+        return self._add("selected_goals", self.layout.goal_bits, goal_id)
+
+    def has_completed_goal(self, goal_id: str) -> bool:
+        return self._has("completed_goals", self.layout.goal_bits, goal_id)
+
+    def add_completed_goal(self, goal_id: str) -> bool:
+        return self._add("completed_goals", self.layout.goal_bits, goal_id)
+
+    def discard_completed_goal(self, goal_id: str) -> bool:
+        return self._discard("completed_goals", self.layout.goal_bits, goal_id)
+
+    def _set_ids(self, field: str, bits: dict, size: int, keys: Iterable):
+        """Set a field from a whole id list at once, rather than one bitset rebuild per id."""
+        positions = []
+        for key in keys:
+            bit = bits.get(key)
+            if bit is not None:
+                positions.append(bit)
+            else:
+                if self.extras is None:
+                    self.extras = {}
+                self.extras.setdefault(field, {})[key] = None
+        setattr(self, field, _positions_to_bits(positions, size))
+
+    def skill_level(self, skill: str) -> Optional[int]:
+        slot = self.layout.skill_slots.get(skill)
+        if slot is None:
+            return self.extras.get("skills_progress", {}).get(skill) if self.extras else None
+        level = self.skills[slot]
+        return None if level == NO_SKILL else level
+
+    def set_skill_level(self, skill: str, level: int):
+        slot = self.layout.skill_slots.get(skill)
+        if slot is None or not 0 <= level < NO_SKILL:
+            if self.extras is None:
+                self.extras = {}
+            self.extras.setdefault("skills_progress", {})[skill] = level
+        else:
+            row = bytearray(self.skills)
+            row[slot] = level
+            self.skills = self.layout.intern_skills(bytes(row))
+
+    def skills_progress(self) -> Dict[str, int]:
+        skills = self.layout.skills
+        result = {skills[slot]: level for slot, level in enumerate(self.skills) if level != NO_SKILL}
+        if self.extras is not None:
+            result.update(self.extras.get("skills_progress", {}))
+        return result
+
+    # Snapshots and deltas between versions
+    def snapshot(self) -> tuple:
+        extras = None
+        if self.extras is not None:
+            extras = {field: type(values)(values) for field, values in self.extras.items()}
+        return tuple(getattr(self, field) for field in SNAPSHOT_FIELDS) + (extras,)
+
+    def restore(self, snapshot: tuple, version: int):
+        """Roll back to ``snapshot`` taken at ``version``, forgetting any versions after it."""
+        for field, value in zip(SNAPSHOT_FIELDS, snapshot):
+            setattr(self, field, value)
+        extras = snapshot[-1]
+        self.extras = {field: type(values)(values) for field, values in extras.items()} if extras else None
+        self.version = version
+        if self.history is not None:
+            for later in [v for v in self.history if v > version]:
+                del self.history[later]
+
+    def track_history(self):
+        """Start remembering versions for delta responses, from the current one on."""
+        if self.history is None:
+            self.history = {}
+            self.remember()
+
+    def remember(self):
+        """Keep a snapshot of the current version if versions are tracked, dropping the oldest beyond ``history_size``."""
+        if self.history is None or self.version in self.history:
+            return
+        self.history[self.version] = self.snapshot()
+        while len(self.history) > self.history_size:
+            del self.history[next(iter(self.history))]
+
+    def delta_since(self, version: int) -> Optional[dict]:
+        """What changed since ``version``, or None when that version is no longer known.
+
+        Returns ``{"changes": {field: value}, "added": {field: [ids]}, "removed": {field: [ids]}}``
+        where ``added``/``removed`` cover the id-list fields and ``changes`` everything else.
+        """
+        changes: Dict[str, object] = {}
+        added: Dict[str, list] = {}
+        removed: Dict[str, list] = {}
+        delta = {"changes": changes, "added": added, "removed": removed}
+        if version == self.version:
+            return delta
+        old = self.history.get(version) if self.history is not None else None
+        if old is None or version > self.version:
+            return None
+
+        layout = self.layout
+        old_extras = old[-1] or {}
+        for index, field in enumerate(SNAPSHOT_FIELDS):
+            before, after = old[index], getattr(self, field)
+            if field in ID_FIELDS:
+                ids = getattr(layout, ID_FIELDS[field])
+                gained = _bits_to_ids(after & ~before, ids)
+                lost = _bits_to_ids(before & ~after, ids)
+                old_extra = old_extras.get(field, ())
+                new_extra = self.extras.get(field, ()) if self.extras is not None else ()
+                gained.extend(key for key in new_extra if key not in old_extra)
+                lost.extend(key for key in old_extra if key not in new_extra)
+                if gained:
+                    added[field] = gained
+                if lost:
+                    removed[field] = lost
+            elif field == "skills":
+                new_extra = self.extras.get("skills_progress") if self.extras is not None else None
+                if after != before or new_extra != old_extras.get("skills_progress"):
+                    changes["skills_progress"] = self.skills_progress()
+            elif after != before:
+                changes[field] = after
+        return delta
+
+    # Conversion to and from the UserData JSON shape
+    def to_dict(self) -> dict:
+        layout = self.layout
+        return {
+            "level": self.level,
+            "xp": self.xp,
+            "coins": self.coins,
+            "badges": self._ids("badges", layout.badges),
+            "completed_quests": self._ids("completed_quests", layout.quest_ids),
+            "career_path": self.career_path,
+            "skills_progress": self.skills_progress(),
+            "selected_goals": self._ids("selected_goals", layout.goal_ids),
+            "completed_goals": self._ids("completed_goals", layout.goal_ids),
+            "daily_streak": self.daily_streak,
+            "total_quests_completed": self.total_quests_completed,
+            "total_xp_earned": self.total_xp_earned,
+            "total_coins_earned": self.total_coins_earned,
+            "last_login": self.last_login,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionState":
+        state = cls()
+        state.level = data.get("level", 1)
+        state.xp = data.get("xp", 0)
+        state.coins = data.get("coins", 0)
+        state.career_path = data.get("career_path")
+        state.daily_streak = data.get("daily_streak", 1)
+        state.total_quests_completed = data.get("total_quests_completed", 0)
+        state.total_xp_earned = data.get("total_xp_earned", 0)
+        state.total_coins_earned = data.get("total_coins_earned", 0)
+        state.last_login = data.get("last_login", "")
+        state.version = data.get("version", 0)
+        layout = state.layout
+        for field, bits, ids in (
+            ("badges", layout.badge_bits, layout.badges),
+            ("completed_quests", layout.quest_bits, layout.quest_ids),
+            ("selected_goals", layout.goal_bits, layout.goal_ids),
+            ("completed_goals", layout.goal_bits, layout.goal_ids),
+        ):
+            state._set_ids(field, bits, len(ids), data.get(field, ()))
+        for skill, level in data.get("skills_progress", {}).items():
+            state.set_skill_level(skill, level)
+        return state
@@ -0,0 +1,508 @@
+"""Session storage: pluggable backends behind a write-behind session cache."""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class MemoryBackend:
+    """Keeps serialized sessions in a dict. Nothing survives a restart."""
+
+    def __init__(self):
+        self._rows: Dict[str, str] = {}
+
+    def load(self, session_id: str) -> Optional[str]:
+        return self._rows.get(session_id)
+
+    def save_many(self, rows: Iterable[Tuple[str, str]]):
+        self._rows.update(rows)
+
+    def scan(self) -> Iterator[Tuple[str, str]]:
+        return iter(list(self._rows.items()))
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Stores serialized sessions in a SQLite database running in WAL mode."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._lock_file = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, changed INTEGER NOT NULL DEFAULT 0)"
+            )
+            if "changed" not in [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]:
+                try:
+                    conn.execute("ALTER TABLE sessions ADD COLUMN changed INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    # Another process added it first
+                    pass
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_changed ON sessions (changed)")
+            self._conn = conn
+        return self._conn
+
+    def load(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, rows: Iterable[Tuple[str, str]]):
+        rows = list(rows)
+        if not rows:
+            return
+        with self.transaction() as conn:
+            # Numbered under the write lock, so the numbers only grow in commit order
+            changed = conn.execute("SELECT IFNULL(MAX(changed), 0) + 1 FROM sessions").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO sessions (session_id, data, changed) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, changed = excluded.changed",
+                [(session_id, data, changed) for session_id, data in rows],
+            )
+
+    def scan(self) -> Iterator[Tuple[str, str]]:
+        """Every stored session, read on a connection of its own so loads are not held up."""
+        for session_id, data, _ in self.changed_since(-1):
+            yield session_id, data
+
+    def changed_since(self, changed: int) -> Iterator[Tuple[str, str, int]]:
+        """Sessions written after write number ``changed``, as ``(session_id, data, changed)``."""
+        query = "SELECT session_id, data, changed FROM sessions WHERE changed > ? ORDER BY changed"
+        if self.path == ":memory:":
+            with self._lock:
+                rows = self._connect().execute(query, (changed,)).fetchall()
+            yield from rows
+            return
+        self._connect()
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            yield from conn.execute(query, (changed,))
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run the block inside one write transaction.
+
+        BEGIN IMMEDIATE takes the database write lock up front, so the block
+        is serialized against writers in every process sharing the file.
+        Writers first queue on an flock()ed side file: SQLite's own busy
+        handler polls with millisecond sleeps, which collapses throughput
+        when several workers contend for short transactions.
+        Nested use joins the outer transaction.
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn.in_transaction:
+                yield conn
+                return
+            self._lock_writers()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            finally:
+                self._unlock_writers()
+
+    def _lock_writers(self):
+        if fcntl is None or self.path == ":memory:":
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.path + ".lock", "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def _unlock_writers(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+def create_backend(kind: str, path: str):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown session backend: {kind}")
+
+
+class SessionStore:
+    """Bounded in-memory session cache in front of a storage backend.
+
+    Reads are served from the cache. Mutated sessions are marked dirty and a
+    background thread flushes them to the backend in batches, so requests
+    never wait on disk.
+
+    The cache is kept in LRU order and capped by entry count and/or
+    approximate serialized bytes; sessions idle for longer than ``ttl``
+    seconds are evicted as well. Evicted sessions that still have unsaved
+    changes are spilled to the backend and reloaded transparently on their
+    next access.
+
+    ``lock_for`` maps a session id to the lock its mutations run under (the
+    ``MutationEngine`` sets it). Sessions are only serialized while holding
+    that lock, so a half-applied mutation is never written or spilled.
+    """
+
+    lock_for: Optional[Callable[[str], threading.Lock]] = None
+
+    def __init__(
+        self,
+        backend,
+        factory: Callable[[], object],
+        dumps: Callable[[object], str],
+        loads: Callable[[str], object],
+        flush_interval: float = 0.05,
+        batch_size: int = 500,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        ttl: float = 0,
+    ):
+        self.backend = backend
+        self.factory = factory
+        self.dumps = dumps
+        self.loads = loads
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.spills = 0
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._dirty = set()
+        # Serialized sessions that are not yet durable in the backend.
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._mutex = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._cache
+
+    @property
+    def approx_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        stats = {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "spills": self.spills,
+            "dirty": len(self._dirty),
+        }
+        # Sizes are only tracked when they bound the cache
+        if self.max_bytes:
+            stats["approx_bytes"] = self._bytes
+        return stats
+
+    def get(self, session_id: str):
+        with self._mutex:
+            item = self._cache.get(session_id)
+            if item is not None:
+                self.hits += 1
+                self._cache.move_to_end(session_id)
+                if self.ttl:
+                    self._touched[session_id] = time.monotonic()
+                return item
+            self.misses += 1
+            raw = self._pending.get(session_id)
+
+        # Backend I/O happens outside the mutex.
+        if raw is None:
+            raw = self.backend.load(session_id)
+
+        with self._mutex:
+            item = self._cache.get(session_id)
+            if item is not None:
+                # Another thread loaded it meanwhile.
+                return item
+            raw = self._pending.get(session_id, raw)
+            if raw is not None:
+                item = self.loads(raw)
+            else:
+                item = self.factory()
+                self._dirty.add(session_id)
+            self._cache[session_id] = item
+            if self.ttl:
+                self._touched[session_id] = time.monotonic()
+            if self.max_bytes:
+                size = len(raw) if raw is not None else len(self.dumps(item))
+                self._sizes[session_id] = size
+                self._bytes += size
+            self._evict()
+        return item
+
+    def keep_history(self, session_id: str, item):
+        # Cached sessions keep their history with them.
+        pass
+
+    def mark_dirty(self, session_id: str):
+        self._dirty.add(session_id)
+        if len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    @contextmanager
+    def transaction(self, session_id: str):
+        """Yield the session for mutation and mark it dirty afterwards."""
+        item = self.get(session_id)
+        try:
+            yield item
+        finally:
+            with self._mutex:
+                current = self._cache.get(session_id)
+                if current is None:
+                    # Evicted while the caller held it: spill the mutated copy.
+                    self._pending[session_id] = self.dumps(item)
+                else:
+                    if current is not item:
+                        self._cache[session_id] = item
+                    self._dirty.add(session_id)
+
+    def _evict(self):
+        if self.ttl:
+            deadline = time.monotonic() - self.ttl
+            # LRU order is also last-access order, so expired sessions sit at the front.
+            while len(self._cache) > 1:
+                session_id = next(iter(self._cache))
+                if self._touched[session_id] > deadline or not self._drop(session_id):
+                    break
+                self.expirations += 1
+        while len(self._cache) > 1 and (
+            (self.max_entries and len(self._cache) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            if not self._drop(next(iter(self._cache))):
+                break
+            self.evictions += 1
+
+    def _drop(self, session_id: str) -> bool:
+        # The mutex is held here, so waiting for the session's lock could deadlock;
+        # a session that is being mutated stays cached until a later eviction pass.
+        lock = self.lock_for(session_id) if self.lock_for is not None else None
+        if lock is not None and not lock.acquire(blocking=False):
+            return False
+        try:
+            with self._mutex:
+                item = self._cache.pop(session_id)
+                self._touched.pop(session_id, None)
+                self._bytes -= self._sizes.pop(session_id, 0)
+                if session_id in self._dirty:
+                    self._dirty.discard(session_id)
+                    self._pending[session_id] = self.dumps(item)
+                    self.spills += 1
+        finally:
+            if lock is not None:
+                lock.release()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _snapshot_next_dirty(self):
+        with self._mutex:
+            if not self._dirty:
+                return
+            session_id = next(iter(self._dirty))
+        # The session's lock keeps a mutation from being serialized half-applied. It is
+        # taken before the mutex, as mutations do; the mutex keeps an eviction from
+        # dropping the session between the checks and the serialization.
+        with self.lock_for(session_id) if self.lock_for is not None else nullcontext():
+            with self._mutex:
+                if session_id not in self._dirty:
+                    # Spilled by an eviction meanwhile
+                    return
+                self._dirty.discard(session_id)
+                item = self._cache.get(session_id)
+                if item is None:
+                    return
+                raw = self.dumps(item)
+                self._pending[session_id] = raw
+                size = self._sizes.get(session_id)
+                if size is not None:
+                    self._sizes[session_id] = len(raw)
+                    self._bytes += len(raw) - size
+
+    def flush(self):
+        with self._lock:
+            while self._dirty:
+                for _ in range(min(len(self._dirty), self.batch_size)):
+                    self._snapshot_next_dirty()
+                self._write_pending()
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._mutex:
+            rows = list(self._pending.items())
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            self.backend.save_many(batch)
+            # A newer spill may have replaced a row while it was being written; checking
+            # and deleting under the mutex keeps one landing in between from being lost.
+            with self._mutex:
+                for session_id, raw in batch:
+                    if self._pending.get(session_id) is raw:
+                        del self._pending[session_id]
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="session-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.backend.close()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep the flusher alive; unsaved sessions stay pending and are retried.
+                time.sleep(self.flush_interval)
+
+
+class SharedSessionStore:
+    """Session store for several worker processes sharing one SQLite file.
+
+    Nothing is cached between requests: every transaction reads the
+    session, lets the caller mutate it and writes it back while holding the
+    database write lock, so all workers see the same XP and coins. WAL mode
+    keeps readers in other processes unblocked while a write is in flight.
+
+    The one thing kept per process is the version ``history`` of sessions
+    whose clients asked for deltas: the last ``history_entries`` used, or
+    all of them for 0. Versions are bumped under the database write lock, so
+    a version this process remembered still names the same state after
+    another worker has moved the session on, and deltas can start from it.
+    """
+
+    def __init__(
+        self,
+        backend: SQLiteBackend,
+        factory: Callable[[], object],
+        dumps: Callable[[object], str],
+        loads: Callable[[str], object],
+        history_entries: int = 0,
+    ):
+        if not isinstance(backend, SQLiteBackend):
+            raise ValueError("Shared session state requires the sqlite backend")
+        self.backend = backend
+        self.factory = factory
+        self.dumps = dumps
+        self.loads = loads
+        self.history_entries = history_entries
+        self.transactions = 0
+        self._histories: "OrderedDict[str, dict]" = OrderedDict()
+        self._histories_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.backend.load(session_id) is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {"shared": 1, "transactions": self.transactions, "histories": len(self._histories)}
+
+    def get(self, session_id: str):
+        raw = self.backend.load(session_id)
+        item = self.loads(raw) if raw is not None else self.factory()
+        with self._histories_lock:
+            history = self._histories.get(session_id)
+        # A version newer than the stored row was never committed
+        if history and next(reversed(history)) <= item.version:
+            item.history = history
+        return item
+
+    def keep_history(self, session_id: str, item):
+        """Keep the item's version history for the session's next request in this process."""
+        if item.history is None:
+            return
+        with self._histories_lock:
+            self._histories[session_id] = item.history
+            self._histories.move_to_end(session_id)
+            while self.history_entries and len(self._histories) > self.history_entries:
+                self._histories.popitem(last=False)
+
+    def mark_dirty(self, session_id: str):
+        # Writes happen when the surrounding transaction commits.
+        pass
+
+    @contextmanager
+    def transaction(self, session_id: str):
+        try:
+            with self.backend.transaction():
+                item = self.get(session_id)
+                yield item
+                self.backend.save_many([(session_id, self.dumps(item))])
+        except BaseException:
+            # Versions remembered during a rolled-back transaction may be reused differently
+            with self._histories_lock:
+                self._histories.pop(session_id, None)
+            raise
+        self.transactions += 1
+        self.keep_history(session_id, item)
+
+    def flush(self):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.backend.close()
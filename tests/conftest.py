@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app module is imported by the checks; keep it off the working directory's files
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("LEDGER_DIR", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
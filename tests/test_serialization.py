@@ -0,0 +1,17 @@
+import random
+
+import pytest
+
+import responses
+from benchmarks.serialization import count_mismatches, random_state, response_bodies
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "stdlib"])
+def test_json_response_matches_fastapi_bytes(encoder, monkeypatch):
+    if encoder == "orjson" and responses.orjson is None:
+        pytest.skip("orjson is not installed")
+    if encoder == "stdlib":
+        monkeypatch.setattr(responses, "orjson", None)
+    rng = random.Random(11)
+    contents = response_bodies([random_state(rng) for _ in range(500)])
+    assert count_mismatches(contents) == 0